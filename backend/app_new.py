@@ -2,6 +2,9 @@ from flask import Flask, jsonify
 from flask_cors import CORS
 import pandas as pd
 
+from response_builder import item_labels, records, truncate_labels
+from tiers import classify, tier_of
+
 app = Flask(__name__)
 CORS(app)
 
@@ -116,26 +119,15 @@ def get_sales_transfer_ratio():
         
         # Calculate Sales Transfer Ratio (RETAIL SALES / RETAIL TRANSFERS)
         # Handle division by zero by setting ratio to 0 when transfers are 0
-        item_type_data['SALES_TRANSFER_RATIO'] = item_type_data.apply(
-            lambda row: row['RETAIL SALES'] / row['RETAIL TRANSFERS'] 
-            if row['RETAIL TRANSFERS'] > 0 else 0, axis=1
-        )
+        item_type_data['SALES_TRANSFER_RATIO'] = (
+            item_type_data['RETAIL SALES'] / item_type_data['RETAIL TRANSFERS']
+        ).where(item_type_data['RETAIL TRANSFERS'] > 0, 0)
         
         # Sort by ratio for better visualization
         item_type_data = item_type_data.sort_values('SALES_TRANSFER_RATIO', ascending=False)
         
         # Create efficiency categories based on ratio
-        def get_efficiency_category(ratio):
-            if ratio == 0:
-                return 'No Transfers'
-            elif 0.8 <= ratio <= 1.2:
-                return 'Efficient (0.8-1.2)'
-            elif ratio > 1.2:
-                return 'High Sales/Low Transfers'
-            else:
-                return 'Low Sales/High Transfers'
-        
-        item_type_data['EFFICIENCY_CATEGORY'] = item_type_data['SALES_TRANSFER_RATIO'].apply(get_efficiency_category)
+        item_type_data['EFFICIENCY_CATEGORY'] = classify(item_type_data['SALES_TRANSFER_RATIO'], 'transfer_efficiency_category')
         
         transfer_ratio_data = {
             'item_types': item_type_data['ITEM TYPE'].tolist(),
@@ -204,11 +196,7 @@ def get_sales_mix():
         sales_by_item = sales_by_item.sort_values('RETAIL SALES', ascending=False)
         
         # Identify top contributors (items with >5% share)
-        sales_by_item['CATEGORY'] = sales_by_item['PERCENTAGE'].apply(
-            lambda x: 'Major Contributor' if x >= 10 else 
-                     'Moderate Contributor' if x >= 5 else 
-                     'Minor Contributor'
-        )
+        sales_by_item['CATEGORY'] = classify(sales_by_item['PERCENTAGE'], 'item_share_category')
         
         sales_mix_data = {
             'item_types': sales_by_item['ITEM TYPE'].tolist(),
@@ -255,23 +243,10 @@ def get_top_selling_items():
         top_items = top_items.reset_index(drop=True)
         top_items['RANK'] = range(1, len(top_items) + 1)
         
-        def get_performance_tier(rank):
-            if rank <= 3:
-                return 'Star Performer'
-            elif rank <= 6:
-                return 'Strong Performer'
-            else:
-                return 'Good Performer'
-        
-        top_items['PERFORMANCE_TIER'] = top_items['RANK'].apply(get_performance_tier)
+        top_items['PERFORMANCE_TIER'] = classify(top_items['RANK'], 'performance_tier')
         
         # Create display labels combining item code and description (truncated)
-        top_items['DISPLAY_LABEL'] = top_items.apply(
-            lambda row: f"{row['ITEM CODE']} - {str(row['ITEM DESCRIPTION'])[:25]}..." 
-            if len(str(row['ITEM DESCRIPTION'])) > 25 
-            else f"{row['ITEM CODE']} - {str(row['ITEM DESCRIPTION'])}", 
-            axis=1
-        )
+        top_items['DISPLAY_LABEL'] = item_labels(top_items['ITEM CODE'], top_items['ITEM DESCRIPTION'], 25)
         
         # Reverse order for horizontal bar chart (top item at top)
         top_items = top_items.iloc[::-1].reset_index(drop=True)
@@ -331,19 +306,7 @@ def get_month_over_month_growth():
         min_growth = float(monthly_sales['growth_rate'].min())
         
         # Categorize growth trends
-        def get_growth_category(growth_rate):
-            if growth_rate > 10:
-                return 'High Growth'
-            elif 5 <= growth_rate <= 10:
-                return 'Moderate Growth'
-            elif -5 <= growth_rate < 5:
-                return 'Stable'
-            elif -10 <= growth_rate < -5:
-                return 'Moderate Decline'
-            else:
-                return 'Significant Decline'
-        
-        monthly_sales['growth_category'] = monthly_sales['growth_rate'].apply(get_growth_category)
+        monthly_sales['growth_category'] = classify(monthly_sales['growth_rate'], 'growth_trend_category')
         
         # Ensure all numeric values are JSON serializable
         monthly_sales['RETAIL SALES'] = monthly_sales['RETAIL SALES'].astype(float)
@@ -390,32 +353,8 @@ def get_inventory_turnover_rate():
             turnover_rate = 0
         
         # Define performance benchmarks
-        def get_performance_category(rate):
-            if rate >= 5.0:
-                return 'Excellent'
-            elif rate >= 3.0:
-                return 'Good'
-            elif rate >= 1.5:
-                return 'Average'
-            elif rate >= 0.5:
-                return 'Poor'
-            else:
-                return 'Critical'
-        
-        def get_performance_color(rate):
-            if rate >= 5.0:
-                return '#4CAF50'  # Green
-            elif rate >= 3.0:
-                return '#8BC34A'  # Light Green
-            elif rate >= 1.5:
-                return '#FFC107'  # Amber
-            elif rate >= 0.5:
-                return '#FF9800'  # Orange
-            else:
-                return '#F44336'  # Red
-        
-        performance_category = get_performance_category(turnover_rate)
-        performance_color = get_performance_color(turnover_rate)
+        performance_category = tier_of(turnover_rate, 'turnover_performance')
+        performance_color = tier_of(turnover_rate, 'turnover_performance', 'color')
         
         # Calculate additional metrics by item type for insights
         item_type_turnover = df.groupby('ITEM TYPE').agg({
@@ -423,10 +362,9 @@ def get_inventory_turnover_rate():
             'WAREHOUSE SALES': 'sum'
         }).reset_index()
         
-        item_type_turnover['TURNOVER_RATE'] = item_type_turnover.apply(
-            lambda row: row['RETAIL SALES'] / row['WAREHOUSE SALES'] 
-            if row['WAREHOUSE SALES'] > 0 else 0, axis=1
-        )
+        item_type_turnover['TURNOVER_RATE'] = (
+            item_type_turnover['RETAIL SALES'] / item_type_turnover['WAREHOUSE SALES']
+        ).where(item_type_turnover['WAREHOUSE SALES'] > 0, 0)
         
         item_type_turnover = item_type_turnover.sort_values('TURNOVER_RATE', ascending=False)
         
@@ -494,32 +432,8 @@ def get_sales_per_supplier():
         supplier_sales['RANK'] = range(1, len(supplier_sales) + 1)
         
         # Categorize suppliers by performance
-        def get_supplier_category(percentage):
-            if percentage >= 20:
-                return 'Major Partner'
-            elif percentage >= 10:
-                return 'Key Partner'
-            elif percentage >= 5:
-                return 'Important Partner'
-            elif percentage >= 1:
-                return 'Regular Partner'
-            else:
-                return 'Minor Partner'
-        
-        def get_supplier_color(percentage):
-            if percentage >= 20:
-                return '#1976D2'  # Dark Blue
-            elif percentage >= 10:
-                return '#2196F3'  # Blue
-            elif percentage >= 5:
-                return '#4CAF50'  # Green
-            elif percentage >= 1:
-                return '#FF9800'  # Orange
-            else:
-                return '#9E9E9E'  # Grey
-        
-        supplier_sales['CATEGORY'] = supplier_sales['PERCENTAGE'].apply(get_supplier_category)
-        supplier_sales['COLOR'] = supplier_sales['PERCENTAGE'].apply(get_supplier_color)
+        supplier_sales['CATEGORY'] = classify(supplier_sales['PERCENTAGE'], 'supplier_category')
+        supplier_sales['COLOR'] = classify(supplier_sales['PERCENTAGE'], 'supplier_category', 'color')
         
         # Get top suppliers for insights
         top_5_suppliers = supplier_sales.head(5)
@@ -532,22 +446,18 @@ def get_sales_per_supplier():
         total_suppliers = len(supplier_sales)
         
         # Create labels for treemap (truncate long supplier names)
-        supplier_sales['DISPLAY_NAME'] = supplier_sales['SUPPLIER'].apply(
-            lambda x: str(x)[:20] + '...' if len(str(x)) > 20 else str(x)
-        )
+        supplier_sales['DISPLAY_NAME'] = truncate_labels(supplier_sales['SUPPLIER'], 20)
         
         # Prepare treemap data
-        treemap_data = []
-        for _, row in supplier_sales.iterrows():
-            treemap_data.append({
-                'supplier': str(row['SUPPLIER']),
-                'display_name': str(row['DISPLAY_NAME']),
-                'sales': float(row['RETAIL SALES']),
-                'percentage': float(row['PERCENTAGE']),
-                'rank': int(row['RANK']),
-                'category': str(row['CATEGORY']),
-                'color': str(row['COLOR'])
-            })
+        treemap_data = records(supplier_sales, {
+            'supplier': ('SUPPLIER', str),
+            'display_name': ('DISPLAY_NAME', str),
+            'sales': ('RETAIL SALES', float),
+            'percentage': ('PERCENTAGE', float),
+            'rank': ('RANK', int),
+            'category': ('CATEGORY', str),
+            'color': ('COLOR', str)
+        })
         
         sales_per_supplier_data = {
             'suppliers': treemap_data,
@@ -601,36 +511,11 @@ def get_top_items_by_transfers():
         top_items['RANK'] = range(1, len(top_items) + 1)
         
         # Categorize items by logistics importance
-        def get_logistics_category(rank):
-            if rank <= 3:
-                return 'Critical Logistics'
-            elif rank <= 7:
-                return 'High Priority'
-            elif rank <= 12:
-                return 'Regular Transfer'
-            else:
-                return 'Low Priority'
-        
-        def get_logistics_color(rank):
-            if rank <= 3:
-                return '#F44336'  # Red for critical
-            elif rank <= 7:
-                return '#FF9800'  # Orange for high priority
-            elif rank <= 12:
-                return '#FFC107'  # Amber for regular
-            else:
-                return '#4CAF50'  # Green for low priority
-        
-        top_items['CATEGORY'] = top_items['RANK'].apply(get_logistics_category)
-        top_items['COLOR'] = top_items['RANK'].apply(get_logistics_color)
+        top_items['CATEGORY'] = classify(top_items['RANK'], 'logistics_category')
+        top_items['COLOR'] = classify(top_items['RANK'], 'logistics_category', 'color')
         
         # Create display labels combining item code and description (truncated)
-        top_items['DISPLAY_LABEL'] = top_items.apply(
-            lambda row: f"{row['ITEM CODE']} - {str(row['ITEM DESCRIPTION'])[:25]}..." 
-            if len(str(row['ITEM DESCRIPTION'])) > 25 
-            else f"{row['ITEM CODE']} - {str(row['ITEM DESCRIPTION'])}", 
-            axis=1
-        )
+        top_items['DISPLAY_LABEL'] = item_labels(top_items['ITEM CODE'], top_items['ITEM DESCRIPTION'], 25)
         
         # Calculate logistics insights
         top_5_transfers = float(top_items.head(5)['RETAIL TRANSFERS'].sum())
@@ -648,19 +533,16 @@ def get_top_items_by_transfers():
         item_type_transfers = item_type_transfers.sort_values('RETAIL TRANSFERS', ascending=False)
         
         top_items_data = {
-            'items': [
-                {
-                    'item_code': str(row['ITEM CODE']),
-                    'display_label': str(row['DISPLAY_LABEL']),
-                    'item_description': str(row['ITEM DESCRIPTION']),
-                    'retail_transfers': float(row['RETAIL TRANSFERS']),
-                    'percentage': float(row['PERCENTAGE']),
-                    'rank': int(row['RANK']),
-                    'category': str(row['CATEGORY']),
-                    'color': str(row['COLOR'])
-                }
-                for _, row in top_items.iterrows()
-            ],
+            'items': records(top_items, {
+                'item_code': ('ITEM CODE', str),
+                'display_label': ('DISPLAY_LABEL', str),
+                'item_description': ('ITEM DESCRIPTION', str),
+                'retail_transfers': ('RETAIL TRANSFERS', float),
+                'percentage': ('PERCENTAGE', float),
+                'rank': ('RANK', int),
+                'category': ('CATEGORY', str),
+                'color': ('COLOR', str)
+            }),
             'total_transfers': total_transfers,
             'total_items_with_transfers': len(item_transfers),
             'logistics_analytics': {
@@ -677,14 +559,11 @@ def get_top_items_by_transfers():
                 'transfers': float(top_items.iloc[0]['RETAIL TRANSFERS']),
                 'percentage': float(top_items.iloc[0]['PERCENTAGE'])
             },
-            'bottlenecks': [
-                {
-                    'item_code': str(row['ITEM CODE']),
-                    'transfers': float(row['RETAIL TRANSFERS']),
-                    'category': str(row['CATEGORY'])
-                }
-                for _, row in bottlenecks.iterrows()
-            ],
+            'bottlenecks': records(bottlenecks, {
+                'item_code': ('ITEM CODE', str),
+                'transfers': ('RETAIL TRANSFERS', float),
+                'category': ('CATEGORY', str)
+            }),
             'item_type_analysis': {
                 'categories': [str(x) for x in item_type_transfers.head(5)['ITEM TYPE'].tolist()],
                 'transfers': [float(x) for x in item_type_transfers.head(5)['RETAIL TRANSFERS'].tolist()]
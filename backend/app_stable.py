@@ -1,64 +1,400 @@
-from flask import Flask, jsonify, request
+from flask import Flask, g, jsonify, request
 from flask_cors import CORS
+import numpy as np
 import pandas as pd
 from datetime import datetime
+from functools import partial
+import gc
+import hmac
 import os
+import threading
+import time
+
+from sales_dataset import SalesDataset, source_version, touch_reload_marker
+from period_index import parse_period, period_label, row_periods
+from query_engine import MAX_FILTER_VALUES, QueryError, column_name, parse_query, query_key, result_label, run_query
+from result_cache import VersionedLRUCache
+from response_cache import cached_response
+from response_builder import item_labels
+from tiers import classify, tier_of
+from sales_aggregates import CUBE, CUBE_INDEX, MONTHLY_ROLLUP, cube_enabled, find_aggregate, monthly_rollup_of, rollup
+from item_rankings import ItemRanking, ranking_name
+from item_trends import ITEM_MONTHS, ItemMonthMatrix
+from parallel_aggregates import PARALLEL_PARTITIONS
+from seasonality import CHANNELS, SEASONALITY, Seasonality
+from range_index import RANGE_DIMENSIONS, RANGE_INDEX, RangeIndex
+from incremental_append import append_to_extract, read_append_rows
+from partitioned_store import PartitionCatalog, catalog_file
+from sales_schema import MEASURE_COLUMNS, memory_mb, read_sales_tsv, schema_variant
+from shared_frame import load_shared_frame, shared_enabled, shared_key
+from snapshot_cache import load_table, source_key, write_snapshot
+from streaming_ingest import fold_frame, folded_variant, read_folded_tsv, streaming_enabled
 
 app = Flask(__name__)
 CORS(app)
 
-# Load data once at startup to improve performance
-print("Loading filtered sales data (2024-2025 only)...")
-try:
-    # Try different paths for local vs Azure deployment
-    data_paths = [
-        '../Sales data - Filtered',        # Local development
-        'Sales data - Filtered',           # Azure deployment - root level
-        './Sales data - Filtered',         # Alternative path
-        '/home/site/wwwroot/Sales data - Filtered',  # Azure absolute path
-        os.path.join(os.path.dirname(os.path.dirname(__file__)), 'Sales data - Filtered')  # Relative to project root
-    ]
+# Try different paths for local vs Azure deployment
+DATA_PATHS = [
+    '../Sales data - Filtered',        # Local development
+    'Sales data - Filtered',           # Azure deployment - root level
+    './Sales data - Filtered',         # Alternative path
+    '/home/site/wwwroot/Sales data - Filtered',  # Azure absolute path
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), 'Sales data - Filtered')  # Relative to project root
+]
+
+# Directory of per-month/per-year partition files with a catalog.json
+# (see partitioned_store); when set it is used instead of the single extract
+PARTITION_DIR = os.environ.get('SALES_PARTITION_DIR', '')
+
+# Seconds clients are told to wait before retrying while the data loads
+RETRY_AFTER_SECONDS = int(os.environ.get('SALES_RETRY_AFTER', 5))
+
+# Endpoints that answer while the data is still loading
+READINESS_EXEMPT_PATHS = {'/api/test', '/api/health', '/api/health/ready', '/api/admin/reload'}
+
+# Seconds between checks of the source file for changes (0 disables the watcher)
+RELOAD_INTERVAL_SECONDS = int(os.environ.get('SALES_RELOAD_INTERVAL', 60))
+
+# Token required by the /api/admin endpoints; they are disabled when unset
+ADMIN_TOKEN = os.environ.get('SALES_ADMIN_TOKEN', '')
+
+# Answer endpoints from the pre-aggregated cube (see sales_aggregates); with
+# SALES_CUBE=0 every request groups the raw rows instead
+CUBE_ENABLED = cube_enabled()
+
+# Most item codes one /api/item_trend request may ask for
+MAX_TREND_ITEMS = int(os.environ.get('SALES_TREND_MAX_ITEMS', 100))
+
+# Longest moving window, in months, /api/range_totals computes
+MAX_RANGE_WINDOW = 36
+
+# /api/query results kept per dataset version (0 disables the cache)
+query_cache = VersionedLRUCache(int(os.environ.get('SALES_QUERY_CACHE_SIZE', 256)))
+# Serialized responses of the read-only endpoints, per dataset version (see response_cache)
+response_cache = VersionedLRUCache(int(os.environ.get('SALES_RESPONSE_CACHE_SIZE', 1024)),
+                                   int(os.environ.get('SALES_RESPONSE_CACHE_MB', 64)) << 20)
+
+# Data is loaded in a background thread so gunicorn can accept connections
+# immediately; data endpoints return 503 until data_state['status'] is 'ready'.
+# Reloads build a new SalesDataset off to the side and swap it in with one
+# assignment; requests pin the dataset they started with (see pinned_dataset).
+dataset = SalesDataset(pd.DataFrame())
+load_info = {}
+data_state = {
+    'status': 'loading',
+    'progress': 0.0,
+    'version': None,
+    'started_at': datetime.now().isoformat(),
+    'finished_at': None,
+    'reloading': False,
+    'error': None
+}
+reload_lock = threading.Lock()
+
+def set_load_progress(fraction):
+    data_state['progress'] = round(fraction, 3)
+
+def find_data_path():
+    if PARTITION_DIR:
+        return PARTITION_DIR if os.path.isdir(PARTITION_DIR) else None
+    for path in DATA_PATHS:
+        if os.path.exists(path):
+            return path
+    return None
+
+def version_of(path):
+    """A partition directory is versioned by its catalog, an extract by the file itself"""
+    return source_version(catalog_file(path) if os.path.isdir(path) else path)
+
+def source_reader():
+    """(reader, snapshot variant) for the extract; streaming mode folds it while reading"""
+    if streaming_enabled():
+        return partial(read_folded_tsv, progress=set_load_progress), folded_variant()
+    return read_sales_tsv, schema_variant()
+
+def build_dataset(path):
+    """Load the extract at path and build every derived structure for it"""
+    if os.path.isdir(path):
+        catalog = PartitionCatalog.open(path)
+        print(f"Partition catalog loaded from: {path} ({len(catalog.partitions)} {catalog.granularity} "
+              f"partitions, {catalog.total_rows:,} rows)")
+        new_dataset = SalesDataset(version=version_of(path), source_path=path, catalog=catalog,
+                                   load_info={'method': 'partitions', 'path': path})
+        # The cube is built one partition at a time; the partitions are not kept
+        new_dataset.load_info['derived_build_seconds'] = new_dataset.warm()
+        return new_dataset
+    
+    reader, variant = source_reader()
+    version = version_of(path)
+    if shared_enabled():
+        frame, info = load_shared_table(path, version, reader, variant)
+    else:
+        frame, info = load_table(path, reader=reader, variant=variant)
+    print(f"Data loaded from: {path} ({info['method']}, {info['seconds']:.2f}s)")
+    new_dataset = SalesDataset(frame, version=version, source_path=path, load_info=info)
+    info['derived_build_seconds'] = new_dataset.warm()
+    return new_dataset
+
+def load_shared_table(path, version, reader, variant):
+    """Map the frame shared by all workers, preparing it first if no worker has yet (see shared_frame)"""
+    start = time.perf_counter()
+    info = {}
     
-    df = None
-    for path in data_paths:
+    def build():
+        frame, table_info = load_table(path, reader=reader, variant=variant)
+        info.update(table_info)
+        return frame
+    
+    frame, method = load_shared_frame(shared_key(path, version, variant), build)
+    info.update(method=f'shared-{method}', seconds=round(time.perf_counter() - start, 3))
+    return frame, info
+
+def publish_dataset(new_dataset):
+    global dataset, load_info
+    dataset = new_dataset
+    load_info = new_dataset.load_info
+    for cache in (query_cache, response_cache):
+        cache.retain(new_dataset.version)
+
+def load_sales_data(force=True):
+    """Load or reload the sales extract and publish it as the current dataset.
+    
+    With force=False nothing happens when the source still matches the
+    published version. A failed reload keeps serving the previous version.
+    """
+    with reload_lock:
         try:
-            df = pd.read_csv(path, sep='\t')
-            print(f"Data loaded from: {path}")
-            break
-        except FileNotFoundError:
+            path = dataset.source_path or find_data_path()
+            if path is None:
+                raise FileNotFoundError("Could not find data file in any expected location")
+            if not force and version_of(path) == dataset.version:
+                return False
+            
+            print("Loading filtered sales data (2024-2025 only)...")
+            data_state['reloading'] = data_state['status'] == 'ready'
+            new_dataset = build_dataset(path)
+            if new_dataset.frame_loaded:
+                print(f"Filtered data loaded successfully! Shape: {new_dataset.frame.shape}, "
+                      f"memory: {memory_mb(new_dataset.frame)} MB, version: {new_dataset.version}")
+                print(f"Years included: {sorted(new_dataset.frame['YEAR'].unique())}")
+            publish_dataset(new_dataset)
+            data_state.update(status='ready', progress=1.0, version=new_dataset.version,
+                              finished_at=datetime.now().isoformat(), reloading=False, error=None)
+        except Exception as e:
+            print(f"Error loading filtered data: {e}")
+            if data_state['status'] == 'ready':
+                data_state.update(reloading=False, error=f"Reload failed, serving version {dataset.version}: {e}")
+            else:
+                data_state.update(status='failed', error=str(e), finished_at=datetime.now().isoformat())
+            return False
+    
+    # The previous frame is released once the requests pinned to it finish
+    gc.collect()
+    return True
+
+def append_sales_data(rows):
+    """Fold new rows into the published dataset and its maintained aggregates as a new version.
+    
+    The rows are written to the source first, so other workers (on their next
+    poll) and later restarts see them too. This worker publishes the appended
+    dataset under the new source version, so its watcher does not reload.
+    Returns the load info of the appended batch.
+    """
+    with reload_lock:
+        current = dataset
+        start = time.perf_counter()
+        path = current.source_path
+        snapshot_key, in_sync = None, True
+        # Only the columns the source has are written, and so kept in memory
+        if current.catalog is not None:
+            catalog = current.catalog.append(rows)
+            columns = catalog.columns()
+            rows = rows[columns] if columns is not None else rows
+        else:
+            catalog = None
+            # Rows another worker appended since the last load are not in this frame
+            in_sync = version_of(path) == current.version
+            rows = append_to_extract(path, rows)
+            if in_sync:
+                # Key the snapshot to the file as it is now, while it matches the appended frame
+                snapshot_key = source_key(path, source_reader()[1])
+            if streaming_enabled():
+                rows = fold_frame(rows)
+        
+        info = {'method': 'append', 'path': path, 'rows': len(rows), 'previous_version': current.version}
+        new_dataset = current.appended(rows, version=version_of(path), catalog=catalog,
+                                       load_info={**current.load_info, 'last_append': info})
+        new_dataset.warm()
+        info['seconds'] = round(time.perf_counter() - start, 3)
+        publish_dataset(new_dataset)
+        data_state.update(version=new_dataset.version, finished_at=datetime.now().isoformat())
+        print(f"Appended {len(rows):,} rows in {info['seconds']:.2f}s, version: {new_dataset.version}")
+    
+    if not in_sync:
+        # Published under the file's version but missing the other rows: rebuild from the file
+        threading.Thread(target=load_sales_data, name='sales-data-reload', daemon=True).start()
+    elif snapshot_key is not None and new_dataset.frame_loaded:
+        # Refresh the snapshot off the request path so a restart does not re-parse the extract
+        threading.Thread(target=write_snapshot, args=(path, new_dataset.frame, snapshot_key, info),
+                         name='sales-snapshot-writer', daemon=True).start()
+    return info
+
+def watch_source():
+    """Reload whenever the source file or its reload marker changes"""
+    while True:
+        time.sleep(RELOAD_INTERVAL_SECONDS)
+        if reload_lock.locked():
             continue
+        try:
+            load_sales_data(force=False)
+        except Exception as e:
+            print(f"Error checking sales data for changes: {e}")
+
+def pinned_dataset():
+    """Dataset pinned to this request, so a reload mid-request cannot mix versions"""
+    if 'dataset' not in g:
+        g.dataset = dataset
+    return g.dataset
+
+def rollup_source(period='ALL'):
+    """Rows that totals for a period are rolled up from.
     
-    if df is not None:
-        print(f"Filtered data loaded successfully! Shape: {df.shape}")
-        print(f"Years included: {sorted(df['YEAR'].unique())}")
-    else:
-        raise FileNotFoundError("Could not find data file in any expected location")
-        
-except Exception as e:
-    print(f"Error loading filtered data: {e}")
-    df = pd.DataFrame()  # Empty dataframe as fallback
+    That is a slice of the pinned dataset's cube through its period index,
+    or the raw rows filtered by mask when the cube is disabled; kept for the
+    rest of the request.
+    """
+    sources = g.setdefault('rollup_sources', {})
+    if period not in sources:
+        pinned = pinned_dataset()
+        if not CUBE_ENABLED:
+            sources[period] = filter_data_by_period(pinned.frame, period)
+        else:
+            cube, index = pinned.derived(CUBE), pinned.derived(CUBE_INDEX)
+            sources[period] = (index.slice(cube, parse_period(period)) if index is not None
+                               else filter_data_by_period(cube, period))
+    return sources[period]
 
-# Utility functions for period filtering
-def filter_data_by_period(data, period='MTD'):
-    """Filter data based on period: MTD (Month-to-Date) or YTD (Year-to-Date)"""
-    if len(data) == 0:
-        return data
+def totals(keys, measures=None, period='ALL'):
+    """Measures of the pinned dataset summed by keys for a period, dropping rows with a missing key.
     
-    current_date = datetime.now()
-    current_year = current_date.year
-    current_month = current_date.month
+    Period-less totals come from the smallest maintained aggregate covering
+    keys, anything else from the cube filtered to the period, rolled up on
+    the process pool when the cube is large enough to be partitioned (see
+    parallel_aggregates). All measures are rolled up once per keys and
+    period in a request, so the endpoints of one /api/batch share them;
+    callers get their own copy.
+    """
+    memo = g.setdefault('totals', {})
+    key = (tuple(keys), period)
+    if key not in memo:
+        pinned = pinned_dataset()
+        name = find_aggregate(keys) if CUBE_ENABLED and parse_period(period) is None else None
+        summary = pinned.derived(name) if name else None
+        # The partitions are of the source SALES_CUBE selects; skip them if CUBE_ENABLED was flipped since
+        partitions = pinned.derived(PARALLEL_PARTITIONS) if summary is None and CUBE_ENABLED == cube_enabled() else None
+        if summary is not None:
+            memo[key] = rollup(summary, keys)
+        else:
+            # None when a newer version loaded by another worker has removed the partition files
+            summed = partitions.rollup(keys, period_range=parse_period(period)) if partitions is not None else None
+            memo[key] = summed if summed is not None else rollup(rollup_source(period), keys)
+    summed = memo[key]
+    return summed[list(keys) + measures].copy() if measures else summed.copy()
+
+def item_ranking(keys, period='ALL'):
+    """Items grouped by keys with their totals for a period, ranked on demand (see item_rankings)"""
+    name = ranking_name(keys) if CUBE_ENABLED and parse_period(period) is None else None
+    ranking = pinned_dataset().derived(name) if name else None
+    return ranking if ranking is not None else ItemRanking(totals(keys, period=period), keys)
+
+def item_month_matrix():
+    """Item x month matrix of the pinned dataset (see item_trends)"""
+    pinned = pinned_dataset()
+    matrix = pinned.derived(ITEM_MONTHS) if CUBE_ENABLED else ItemMonthMatrix(pinned.frame)
+    if matrix is None:
+        raise KeyError("ITEM CODE, YEAR, MONTH not in the loaded data")
+    return matrix
+
+def range_index():
+    """Month-range prefix sums of the pinned dataset (see range_index)"""
+    pinned = pinned_dataset()
+    index = pinned.derived(RANGE_INDEX) if CUBE_ENABLED else RangeIndex(pinned.frame)
+    if index is None:
+        raise KeyError("YEAR, MONTH not in the loaded data")
+    return index
+
+def pinned_monthly_rollup():
+    """Monthly rollup of the pinned dataset (see sales_aggregates.monthly_rollup_of)"""
+    if 'monthly_rollup' not in g:
+        pinned = pinned_dataset()
+        g.monthly_rollup = pinned.derived(MONTHLY_ROLLUP) if CUBE_ENABLED else monthly_rollup_of(pinned.frame)
+    if g.monthly_rollup is None:
+        raise KeyError("YEAR, MONTH not in the loaded data")
+    return g.monthly_rollup
+
+def seasonality():
+    """YoY and seasonal figures of the pinned dataset (see seasonality)"""
+    if 'seasonality' not in g:
+        g.seasonality = (pinned_dataset().derived(SEASONALITY) if CUBE_ENABLED
+                         else Seasonality(pinned_monthly_rollup()['months']))
+    if g.seasonality is None:
+        raise KeyError("YEAR, MONTH not in the loaded data")
+    return g.seasonality
+
+def monthly_totals(period='ALL'):
+    """Per-month totals with TOTAL_SALES and PERIOD, sorted by month, as a copy the caller may extend"""
+    monthly = pinned_monthly_rollup()
+    return monthly['index'].slice(monthly['months'], parse_period(period)).copy()
+
+def grand_totals(period='ALL'):
+    """Sum of each measure and of TOTAL_SALES over a period of the pinned dataset"""
+    monthly = pinned_monthly_rollup()
+    period_range = parse_period(period)
+    if period_range is None:
+        return monthly['totals']
+    months = monthly['index'].slice(monthly['months'], period_range)
+    return {col: float(months[col].sum()) for col in monthly['totals']}
+
+# Not in parallel_aggregates' pool processes, which import this script as __mp_main__ when it is run directly
+if __name__ != '__mp_main__':
+    threading.Thread(target=load_sales_data, name='sales-data-loader', daemon=True).start()
+    if RELOAD_INTERVAL_SECONDS > 0:
+        threading.Thread(target=watch_source, name='sales-data-watcher', daemon=True).start()
+
+@app.before_request
+def require_data_ready():
+    """Answer data endpoints with a fast 503 until the background load has finished"""
+    if data_state['status'] == 'ready' or request.method == 'OPTIONS':
+        return None
+    if not request.path.startswith('/api/') or request.path in READINESS_EXEMPT_PATHS:
+        return None
     
-    if period == 'MTD':
-        # Month-to-Date: Current year and current month
-        filtered_data = data[(data['YEAR'] == current_year) & (data['MONTH'] == current_month)]
-    elif period == 'YTD':
-        # Year-to-Date: Current year, all months up to current month
-        filtered_data = data[(data['YEAR'] == current_year) & (data['MONTH'] <= current_month)]
-    else:
+    if data_state['status'] == 'failed':
+        return jsonify({'error': f"Data failed to load: {data_state['error']}", 'status': 'failed'}), 503
+    response = jsonify({'error': 'Data is still loading', 'status': 'loading', 'progress': data_state['progress']})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(RETRY_AFTER_SECONDS)
+    return response
+
+@app.before_request
+def validate_period():
+    """Reject a period query parameter that parse_period cannot read"""
+    try:
+        parse_period(request.args.get('period'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return None
+
+# Utility functions for period filtering
+def filter_data_by_period(data, period='MTD'):
+    """Filter unsorted data by mask to a period (see period_index.parse_period)"""
+    period_range = parse_period(period)
+    if len(data) == 0 or period_range is None:
         # Default: return all data
-        filtered_data = data
+        return data
     
-    return filtered_data
+    periods = row_periods(data)
+    return data[(periods >= period_range[0]) & (periods <= period_range[1])]
 
 def get_period_from_request():
     """Get period parameter from request, default to all data if not specified"""
@@ -66,26 +402,92 @@ def get_period_from_request():
 
 @app.route('/api/test', methods=['GET'])
 def test():
-    return jsonify({'message': 'Backend is working', 'data_loaded': len(df) > 0, 'records': len(df)})
+    return jsonify({
+        'message': 'Backend is working',
+        'data_loaded': len(dataset) > 0,
+        'records': len(dataset),
+        'data_status': data_state['status'],
+        'load_progress': data_state['progress'],
+        'load_error': data_state['error']
+    })
 
-@app.route('/api/kpi_data', methods=['GET'])
+@app.route('/api/health', methods=['GET'])
+def health():
+    """Liveness: the process is up, whatever the state of the data load"""
+    return jsonify({'status': 'healthy', 'data': data_state, 'records': len(dataset), 'load_info': load_info})
+
+@app.route('/api/health/ready', methods=['GET'])
+def health_ready():
+    """Readiness: 200 once the data is loaded, 503 while loading or after a failed load"""
+    status_code = 200 if data_state['status'] == 'ready' else 503
+    return jsonify({'ready': status_code == 200, 'data': data_state}), status_code
+
+@app.route('/api/admin/reload', methods=['POST'])
+def admin_reload():
+    """Rebuild the dataset in the background in every worker, then swap it in"""
+    if not ADMIN_TOKEN or not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    path = dataset.source_path or find_data_path()
+    if path is not None:
+        # Other workers see the new marker mtime on their next poll
+        touch_reload_marker(path)
+    threading.Thread(target=load_sales_data, name='sales-data-reload', daemon=True).start()
+    return jsonify({'message': 'Reload started', 'current_version': dataset.version}), 202
+
+@app.route('/api/admin/append', methods=['POST'])
+def admin_append():
+    """Append new rows (TSV body or 'file' upload with the extract header) as a new data version"""
+    if not ADMIN_TOKEN or not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), ADMIN_TOKEN):
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    body = request.files['file'].read() if 'file' in request.files else request.get_data()
+    if not body:
+        return jsonify({'error': 'No rows sent'}), 400
+    try:
+        rows = read_append_rows(body)
+        if len(rows) == 0:
+            return jsonify({'error': 'No rows sent'}), 400
+        info = append_sales_data(rows)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'message': 'Rows appended', 'version': dataset.version, 'append': info})
+
+# Read-only endpoints answer repeated requests from response_cache until the data changes
+cached = cached_response(response_cache, lambda: pinned_dataset().version)
+
+@app.route('/api/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({'version': dataset.version, 'responses': response_cache.stats(), 'queries': query_cache.stats()})
+
+# Dashboard KPIs by name, served one per route and together by /api/batch.
+# Each returns a plain dict, which Flask serializes like jsonify.
+DASHBOARD_ENDPOINTS = {}
+
+def dashboard_endpoint(name):
+    """Serve a KPI function at /api/<name>, cached, and register it for /api/batch"""
+    def register(compute):
+        DASHBOARD_ENDPOINTS[name] = compute
+        app.route(f'/api/{name}', methods=['GET'])(cached(compute))
+        return compute
+    return register
+
+@dashboard_endpoint('kpi_data')
 def get_kpi_data():
     try:
-        if len(df) == 0:
-            return jsonify({'error': 'No data available'})
+        data = pinned_dataset()
+        if len(data) == 0:
+            return {'error': 'No data available'}
         
         period = get_period_from_request()
         
         # Apply period filtering
-        if period in ['MTD', 'YTD']:
-            filtered_df = filter_data_by_period(df, period)
-            if len(filtered_df) == 0:
-                return jsonify({'error': f'No data available for {period} period'})
-        else:
-            filtered_df = df
+        monthly = monthly_totals(period)
+        if len(monthly) == 0:
+            return {'error': f'No data available for {period} period'}
             
-        latest_year = filtered_df['YEAR'].max()
-        latest_month = filtered_df[filtered_df['YEAR'] == latest_year]['MONTH'].max()
+        latest_year = monthly['YEAR'].max()
+        latest_month = monthly[monthly['YEAR'] == latest_year]['MONTH'].max()
 
         if latest_month == 1:
             previous_month = 12
@@ -94,8 +496,8 @@ def get_kpi_data():
             previous_month = latest_month - 1
             previous_year = latest_year
 
-        current_month_data = filtered_df[(filtered_df['YEAR'] == latest_year) & (filtered_df['MONTH'] == latest_month)]
-        previous_month_data = filtered_df[(filtered_df['YEAR'] == previous_year) & (filtered_df['MONTH'] == previous_month)]
+        current_month_data = monthly[(monthly['YEAR'] == latest_year) & (monthly['MONTH'] == latest_month)]
+        previous_month_data = monthly[(monthly['YEAR'] == previous_year) & (monthly['MONTH'] == previous_month)]
 
         current_retail_sales = float(current_month_data['RETAIL SALES'].sum())
         current_warehouse_sales = float(current_month_data['WAREHOUSE SALES'].sum())
@@ -114,19 +516,24 @@ def get_kpi_data():
                 'values': [previous_retail_sales, previous_warehouse_sales]
             }
         }
-        return jsonify(kpi_data)
+        return kpi_data
     except Exception as e:
-        return jsonify({'error': str(e)})
+        return {'error': str(e)}
 
-@app.route('/api/overall_sales_performance', methods=['GET'])
+@dashboard_endpoint('overall_sales_performance')
 def get_overall_sales_performance():
     try:
-        if len(df) == 0:
-            return jsonify({'error': 'No data available'})
+        if len(pinned_dataset()) == 0:
+            return {'error': 'No data available'}
         
-        total_retail_sales = float(df['RETAIL SALES'].sum())
-        total_retail_transfers = float(df['RETAIL TRANSFERS'].sum())
-        total_warehouse_sales = float(df['WAREHOUSE SALES'].sum())
+        period = get_period_from_request()
+        if len(rollup_source(period)) == 0:
+            return {'error': f'No data available for {period} period'}
+        
+        overall = grand_totals(period)
+        total_retail_sales = overall['RETAIL SALES']
+        total_retail_transfers = overall['RETAIL TRANSFERS']
+        total_warehouse_sales = overall['WAREHOUSE SALES']
         
         grand_total = total_retail_sales + total_retail_transfers + total_warehouse_sales
         
@@ -145,29 +552,31 @@ def get_overall_sales_performance():
                 'warehouse': warehouse_percentage
             }
         }
-        return jsonify(overall_performance_data)
+        return overall_performance_data
     except Exception as e:
-        return jsonify({'error': str(e)})
+        return {'error': str(e)}
 
-@app.route('/api/sales_mix', methods=['GET'])
+@dashboard_endpoint('sales_mix')
 def get_sales_mix():
     try:
-        if len(df) == 0:
-            return jsonify({'error': 'No data available'})
+        if len(pinned_dataset()) == 0:
+            return {'error': 'No data available'}
         
-        sales_by_item = df.groupby('ITEM TYPE')['RETAIL SALES'].sum().reset_index()
-        total_retail_sales = float(df['RETAIL SALES'].sum())
+        period = get_period_from_request()
+        if len(rollup_source(period)) == 0:
+            return {'error': f'No data available for {period} period'}
+        
+        sales_by_item = totals(['ITEM TYPE'], ['RETAIL SALES'], period)
+        total_retail_sales = grand_totals(period)['RETAIL SALES']
         
         if total_retail_sales == 0:
-            return jsonify({'error': 'No retail sales data available'})
+            return {'error': 'No retail sales data available'}
             
         sales_by_item['PERCENTAGE'] = (sales_by_item['RETAIL SALES'] / total_retail_sales * 100)
         sales_by_item = sales_by_item.sort_values('RETAIL SALES', ascending=False)
         
         # Create category classifications
-        sales_by_item['CATEGORY'] = sales_by_item['PERCENTAGE'].apply(
-            lambda x: 'Major Contributor' if x >= 30 else 'Moderate Contributor' if x >= 10 else 'Minor Contributor'
-        )
+        sales_by_item['CATEGORY'] = classify(sales_by_item['PERCENTAGE'], 'contribution_category')
         
         sales_mix_data = {
             'item_types': [str(x) for x in sales_by_item['ITEM TYPE'].tolist()],
@@ -179,24 +588,22 @@ def get_sales_mix():
             'top_percentage': float(sales_by_item.iloc[0]['PERCENTAGE']) if len(sales_by_item) > 0 else 0
         }
         
-        return jsonify(sales_mix_data)
+        return sales_mix_data
     except Exception as e:
-        return jsonify({'error': str(e)})
+        return {'error': str(e)}
 
-@app.route('/api/sales_by_area', methods=['GET'])
+@dashboard_endpoint('sales_by_area')
 def get_sales_by_area():
     try:
-        period = request.args.get('period', 'all')
-        filtered_df = filter_data_by_period(df, period)
-        
-        if len(filtered_df) == 0:
-            return jsonify({'error': 'No data available for the selected period'})
+        period = get_period_from_request()
+        if len(pinned_dataset()) == 0 or len(rollup_source(period)) == 0:
+            return {'error': 'No data available for the selected period'}
         
-        area_sales = filtered_df.groupby('AREA')['RETAIL SALES'].sum().reset_index()
+        area_sales = totals(['AREA'], ['RETAIL SALES'], period)
         area_sales = area_sales.sort_values('RETAIL SALES', ascending=False)
         
         if len(area_sales) == 0:
-            return jsonify({'error': 'No area sales data available'})
+            return {'error': 'No area sales data available'}
         
         total_retail_sales = float(area_sales['RETAIL SALES'].sum())
         area_sales['PERCENTAGE'] = (area_sales['RETAIL SALES'] / total_retail_sales * 100) if total_retail_sales > 0 else 0
@@ -210,46 +617,36 @@ def get_sales_by_area():
             'top_area_percentage': float(area_sales.iloc[0]['PERCENTAGE']) if len(area_sales) > 0 else 0
         }
         
-        return jsonify(sales_by_area_data)
+        return sales_by_area_data
     except Exception as e:
-        return jsonify({'error': str(e)})
+        return {'error': str(e)}
 
-@app.route('/api/top_selling_items', methods=['GET'])
+@dashboard_endpoint('top_selling_items')
 def get_top_selling_items():
     try:
-        if len(df) == 0:
-            return jsonify({'error': 'No data available'})
+        if len(pinned_dataset()) == 0:
+            return {'error': 'No data available'}
         
-        item_sales = df.groupby(['ITEM CODE', 'ITEM DESCRIPTION'])['RETAIL SALES'].sum().reset_index()
-        item_sales = item_sales[item_sales['RETAIL SALES'] > 0]
-        top_items = item_sales.sort_values('RETAIL SALES', ascending=False).head(10)
+        period = get_period_from_request()
+        if len(rollup_source(period)) == 0:
+            return {'error': f'No data available for {period} period'}
+        
+        ranking = item_ranking(['ITEM CODE', 'ITEM DESCRIPTION'], period)
+        top_items = ranking.top('RETAIL SALES', 10, positive=True)
         
         if len(top_items) == 0:
-            return jsonify({'error': 'No items with sales data found'})
+            return {'error': 'No items with sales data found'}
         
         top_10_total = float(top_items['RETAIL SALES'].sum())
-        total_retail_sales = float(df['RETAIL SALES'].sum())
+        total_retail_sales = grand_totals(period)['RETAIL SALES']
         top_10_percentage = (top_10_total / total_retail_sales * 100) if total_retail_sales > 0 else 0
         
-        top_items = top_items.reset_index(drop=True)
         top_items['RANK'] = range(1, len(top_items) + 1)
+        first_seller = ranking.first_positive('RETAIL SALES')
         
-        def get_performance_tier(rank):
-            if rank <= 3:
-                return 'Star Performer'
-            elif rank <= 6:
-                return 'Strong Performer'
-            else:
-                return 'Good Performer'
+        top_items['PERFORMANCE_TIER'] = classify(top_items['RANK'], 'performance_tier')
         
-        top_items['PERFORMANCE_TIER'] = top_items['RANK'].apply(get_performance_tier)
-        
-        top_items['DISPLAY_LABEL'] = top_items.apply(
-            lambda row: f"{row['ITEM CODE']} - {str(row['ITEM DESCRIPTION'])[:25]}..." 
-            if len(str(row['ITEM DESCRIPTION'])) > 25 
-            else f"{row['ITEM CODE']} - {str(row['ITEM DESCRIPTION'])}", 
-            axis=1
-        )
+        top_items['DISPLAY_LABEL'] = item_labels(top_items['ITEM CODE'], top_items['ITEM DESCRIPTION'], 25)
         
         top_items = top_items.iloc[::-1].reset_index(drop=True)
         
@@ -263,25 +660,25 @@ def get_top_selling_items():
             'top_10_total': top_10_total,
             'top_10_percentage': float(top_10_percentage),
             'total_retail_sales': total_retail_sales,
-            'best_item': str(item_sales.iloc[0]['ITEM CODE']) if len(item_sales) > 0 else 'N/A',
-            'best_sales': float(item_sales.iloc[0]['RETAIL SALES']) if len(item_sales) > 0 else 0
+            'best_item': str(first_seller['ITEM CODE']),
+            'best_sales': float(first_seller['RETAIL SALES'])
         }
         
-        return jsonify(top_selling_data)
+        return top_selling_data
     except Exception as e:
-        return jsonify({'error': f'Error processing data: {str(e)}'})
+        return {'error': f'Error processing data: {str(e)}'}
 
-@app.route('/api/sales_by_item_type', methods=['GET'])
+@dashboard_endpoint('sales_by_item_type')
 def get_sales_by_item_type():
     try:
-        if len(df) == 0:
-            return jsonify({'error': 'No data available'})
+        if len(pinned_dataset()) == 0:
+            return {'error': 'No data available'}
+        
+        period = get_period_from_request()
+        if len(rollup_source(period)) == 0:
+            return {'error': f'No data available for {period} period'}
         
-        item_type_sales = df.groupby('ITEM TYPE').agg({
-            'RETAIL SALES': 'sum',
-            'RETAIL TRANSFERS': 'sum', 
-            'WAREHOUSE SALES': 'sum'
-        }).reset_index()
+        item_type_sales = totals(['ITEM TYPE'], period=period)
         
         item_type_sales['TOTAL SALES'] = (
             item_type_sales['RETAIL SALES'] + 
@@ -299,50 +696,37 @@ def get_sales_by_item_type():
             'total_sales': [float(x) for x in item_type_sales['TOTAL SALES'].tolist()]
         }
         
-        return jsonify(sales_by_item_data)
+        return sales_by_item_data
     except Exception as e:
-        return jsonify({'error': str(e)})
+        return {'error': str(e)}
 
 # Sales Transfer Ratio - Efficiency KPI
-@app.route('/api/sales_transfer_ratio', methods=['GET'])
+@dashboard_endpoint('sales_transfer_ratio')
 def get_sales_transfer_ratio():
     try:
-        if len(df) == 0:
-            return jsonify({'error': 'No data available'})
+        if len(pinned_dataset()) == 0:
+            return {'error': 'No data available'}
+        
+        period = get_period_from_request()
+        if len(rollup_source(period)) == 0:
+            return {'error': f'No data available for {period} period'}
         
         # Calculate total retail sales and retail transfers
-        total_retail_sales = float(df['RETAIL SALES'].sum())
-        total_retail_transfers = float(df['RETAIL TRANSFERS'].sum())
+        overall = grand_totals(period)
+        total_retail_sales = overall['RETAIL SALES']
+        total_retail_transfers = overall['RETAIL TRANSFERS']
         
         # Calculate transfer ratio (transfers as % of total retail activity)
         total_retail_activity = total_retail_sales + total_retail_transfers
         transfer_ratio = (total_retail_transfers / total_retail_activity * 100) if total_retail_activity > 0 else 0
         
-        # Monthly breakdown
-        monthly_data = df.groupby(['YEAR', 'MONTH']).agg({
-            'RETAIL SALES': 'sum',
-            'RETAIL TRANSFERS': 'sum'
-        }).reset_index()
-        
+        # Monthly breakdown, already sorted by year and month
+        monthly_data = monthly_totals(period)
         monthly_data['TOTAL_ACTIVITY'] = monthly_data['RETAIL SALES'] + monthly_data['RETAIL TRANSFERS']
         monthly_data['TRANSFER_RATIO'] = (monthly_data['RETAIL TRANSFERS'] / monthly_data['TOTAL_ACTIVITY'] * 100).fillna(0)
-        monthly_data['PERIOD'] = monthly_data['YEAR'].astype(str) + '-' + monthly_data['MONTH'].astype(str).str.zfill(2)
-        
-        # Sort by year and month
-        monthly_data = monthly_data.sort_values(['YEAR', 'MONTH'])
         
         # Efficiency categories
-        def get_efficiency_level(ratio):
-            if ratio >= 25:
-                return 'High Efficiency'
-            elif ratio >= 15:
-                return 'Moderate Efficiency'
-            elif ratio >= 5:
-                return 'Low Efficiency'
-            else:
-                return 'Very Low Efficiency'
-        
-        monthly_data['EFFICIENCY_LEVEL'] = monthly_data['TRANSFER_RATIO'].apply(get_efficiency_level)
+        monthly_data['EFFICIENCY_LEVEL'] = classify(monthly_data['TRANSFER_RATIO'], 'efficiency_level')
         
         transfer_ratio_data = {
             'overall_transfer_ratio': float(transfer_ratio),
@@ -354,46 +738,28 @@ def get_sales_transfer_ratio():
             'monthly_retail_sales': [float(x) for x in monthly_data['RETAIL SALES'].tolist()],
             'monthly_retail_transfers': [float(x) for x in monthly_data['RETAIL TRANSFERS'].tolist()],
             'efficiency_levels': [str(x) for x in monthly_data['EFFICIENCY_LEVEL'].tolist()],
-            'efficiency_rating': get_efficiency_level(transfer_ratio),
+            'efficiency_rating': tier_of(transfer_ratio, 'efficiency_level'),
             'trend': 'Increasing' if len(monthly_data) > 1 and monthly_data.iloc[-1]['TRANSFER_RATIO'] > monthly_data.iloc[0]['TRANSFER_RATIO'] else 'Decreasing'
         }
         
-        return jsonify(transfer_ratio_data)
+        return transfer_ratio_data
     except Exception as e:
-        return jsonify({'error': f'Error calculating transfer ratio: {str(e)}'})
+        return {'error': f'Error calculating transfer ratio: {str(e)}'}
 
 # Month-over-Month Sales Growth - Trend KPI
-@app.route('/api/month_over_month_growth', methods=['GET'])
+@dashboard_endpoint('month_over_month_growth')
 def get_month_over_month_growth():
     try:
-        if len(df) == 0:
-            return jsonify({'error': 'No data available'})
+        data = pinned_dataset()
+        if len(data) == 0:
+            return {'error': 'No data available'}
         
         period = get_period_from_request()
         
-        # Apply period filtering
-        if period in ['MTD', 'YTD']:
-            filtered_df = filter_data_by_period(df, period)
-            if len(filtered_df) == 0:
-                return jsonify({'error': f'No data available for {period} period'})
-        else:
-            filtered_df = df
-        
-        # Calculate total sales by month
-        monthly_sales = filtered_df.groupby(['YEAR', 'MONTH']).agg({
-            'RETAIL SALES': 'sum',
-            'RETAIL TRANSFERS': 'sum',
-            'WAREHOUSE SALES': 'sum'
-        }).reset_index()
-        
-        monthly_sales['TOTAL_SALES'] = (
-            monthly_sales['RETAIL SALES'] + 
-            monthly_sales['RETAIL TRANSFERS'] + 
-            monthly_sales['WAREHOUSE SALES']
-        )
-        
-        monthly_sales['PERIOD'] = monthly_sales['YEAR'].astype(str) + '-' + monthly_sales['MONTH'].astype(str).str.zfill(2)
-        monthly_sales = monthly_sales.sort_values(['YEAR', 'MONTH'])
+        # Total sales by month, sorted by year and month
+        monthly_sales = monthly_totals(period)
+        if len(monthly_sales) == 0:
+            return {'error': f'No data available for {period} period'}
         
         # Calculate month-over-month growth
         monthly_sales['PREVIOUS_MONTH_SALES'] = monthly_sales['TOTAL_SALES'].shift(1)
@@ -407,24 +773,10 @@ def get_month_over_month_growth():
         growth_data = monthly_sales[1:].copy()
         
         if len(growth_data) == 0:
-            return jsonify({'error': 'Insufficient data for growth calculation'})
+            return {'error': 'Insufficient data for growth calculation'}
         
         # Growth trend categories
-        def get_growth_category(percent):
-            if percent >= 10:
-                return 'Strong Growth'
-            elif percent >= 5:
-                return 'Moderate Growth'
-            elif percent >= 0:
-                return 'Slight Growth'
-            elif percent >= -5:
-                return 'Slight Decline'
-            elif percent >= -10:
-                return 'Moderate Decline'
-            else:
-                return 'Strong Decline'
-        
-        growth_data['GROWTH_CATEGORY'] = growth_data['MOM_GROWTH_PERCENT'].apply(get_growth_category)
+        growth_data['GROWTH_CATEGORY'] = classify(growth_data['MOM_GROWTH_PERCENT'], 'growth_category')
         
         # Calculate average growth rate
         avg_growth_rate = float(growth_data['MOM_GROWTH_PERCENT'].mean())
@@ -448,26 +800,26 @@ def get_month_over_month_growth():
             'positive_growth_months': int(positive_months),
             'total_comparison_months': int(total_months),
             'trend_direction': 'Positive' if avg_growth_rate > 0 else 'Negative',
-            'latest_trend': get_growth_category(latest_growth)
+            'latest_trend': tier_of(latest_growth, 'growth_category')
         }
         
-        return jsonify(mom_growth_data)
+        return mom_growth_data
     except Exception as e:
-        return jsonify({'error': f'Error calculating month-over-month growth: {str(e)}'})
+        return {'error': f'Error calculating month-over-month growth: {str(e)}'}
 
 # Inventory Turnover Rate - Efficiency KPI
-@app.route('/api/inventory_turnover_rate', methods=['GET'])
+@dashboard_endpoint('inventory_turnover_rate')
 def get_inventory_turnover_rate():
     try:
-        if len(df) == 0:
-            return jsonify({'error': 'No data available'})
+        if len(pinned_dataset()) == 0:
+            return {'error': 'No data available'}
+        
+        period = get_period_from_request()
+        if len(rollup_source(period)) == 0:
+            return {'error': f'No data available for {period} period'}
         
         # Calculate turnover by item type (proxy for inventory categories)
-        item_turnover = df.groupby('ITEM TYPE').agg({
-            'RETAIL SALES': 'sum',
-            'RETAIL TRANSFERS': 'sum',
-            'WAREHOUSE SALES': 'sum'
-        }).reset_index()
+        item_turnover = totals(['ITEM TYPE'], period=period)
         
         item_turnover['TOTAL_MOVEMENT'] = (
             item_turnover['RETAIL SALES'] + 
@@ -476,40 +828,18 @@ def get_inventory_turnover_rate():
         )
         
         # Calculate average monthly movement per item type
-        unique_months = len(df.groupby(['YEAR', 'MONTH']))
+        monthly_turnover = monthly_totals(period)
+        unique_months = len(monthly_turnover)
         item_turnover['MONTHLY_AVG_MOVEMENT'] = item_turnover['TOTAL_MOVEMENT'] / unique_months if unique_months > 0 else 0
         
         # Sort by total movement
         item_turnover = item_turnover.sort_values('TOTAL_MOVEMENT', ascending=False)
         
         # Calculate turnover efficiency rating
-        def get_turnover_rating(monthly_avg):
-            if monthly_avg >= 50000:
-                return 'High Turnover'
-            elif monthly_avg >= 20000:
-                return 'Moderate Turnover'
-            elif monthly_avg >= 5000:
-                return 'Low Turnover'
-            else:
-                return 'Very Low Turnover'
-        
-        item_turnover['TURNOVER_RATING'] = item_turnover['MONTHLY_AVG_MOVEMENT'].apply(get_turnover_rating)
+        item_turnover['TURNOVER_RATING'] = classify(item_turnover['MONTHLY_AVG_MOVEMENT'], 'turnover_rating')
         
         # Calculate monthly turnover trends
-        monthly_turnover = df.groupby(['YEAR', 'MONTH']).agg({
-            'RETAIL SALES': 'sum',
-            'RETAIL TRANSFERS': 'sum',
-            'WAREHOUSE SALES': 'sum'
-        }).reset_index()
-        
-        monthly_turnover['TOTAL_TURNOVER'] = (
-            monthly_turnover['RETAIL SALES'] + 
-            monthly_turnover['RETAIL TRANSFERS'] + 
-            monthly_turnover['WAREHOUSE SALES']
-        )
-        
-        monthly_turnover['PERIOD'] = monthly_turnover['YEAR'].astype(str) + '-' + monthly_turnover['MONTH'].astype(str).str.zfill(2)
-        monthly_turnover = monthly_turnover.sort_values(['YEAR', 'MONTH'])
+        monthly_turnover['TOTAL_TURNOVER'] = monthly_turnover['TOTAL_SALES']
         
         # Overall metrics
         total_turnover = float(item_turnover['TOTAL_MOVEMENT'].sum())
@@ -538,33 +868,27 @@ def get_inventory_turnover_rate():
             'total_categories': int(len(item_turnover))
         }
         
-        return jsonify(turnover_data)
+        return turnover_data
     except Exception as e:
-        return jsonify({'error': f'Error calculating inventory turnover: {str(e)}'})
+        return {'error': f'Error calculating inventory turnover: {str(e)}'}
 
 # Sales per Supplier - Partnership KPI
-@app.route('/api/sales_per_supplier', methods=['GET'])
+@dashboard_endpoint('sales_per_supplier')
 def get_sales_per_supplier():
     try:
-        if len(df) == 0:
-            return jsonify({'error': 'No data available'})
+        data = pinned_dataset()
+        if len(data) == 0:
+            return {'error': 'No data available'}
         
         period = get_period_from_request()
         
         # Apply period filtering
-        if period in ['MTD', 'YTD']:
-            filtered_df = filter_data_by_period(df, period)
-            if len(filtered_df) == 0:
-                return jsonify({'error': f'No data available for {period} period'})
-        else:
-            filtered_df = df
+        period_rows = rollup_source(period)
+        if len(period_rows) == 0:
+            return {'error': f'No data available for {period} period'}
         
         # Calculate sales by supplier
-        supplier_sales = filtered_df.groupby('SUPPLIER').agg({
-            'RETAIL SALES': 'sum',
-            'RETAIL TRANSFERS': 'sum',
-            'WAREHOUSE SALES': 'sum'
-        }).reset_index()
+        supplier_sales = totals(['SUPPLIER'], period=period)
         
         supplier_sales['TOTAL_SALES'] = (
             supplier_sales['RETAIL SALES'] + 
@@ -580,19 +904,7 @@ def get_sales_per_supplier():
         supplier_sales['MARKET_SHARE'] = (supplier_sales['TOTAL_SALES'] / total_market_sales * 100) if total_market_sales > 0 else 0
         
         # Partnership performance tiers
-        def get_partnership_tier(market_share):
-            if market_share >= 15:
-                return 'Strategic Partner'
-            elif market_share >= 8:
-                return 'Key Partner'
-            elif market_share >= 3:
-                return 'Important Partner'
-            elif market_share >= 1:
-                return 'Regular Partner'
-            else:
-                return 'Minor Partner'
-        
-        supplier_sales['PARTNERSHIP_TIER'] = supplier_sales['MARKET_SHARE'].apply(get_partnership_tier)
+        supplier_sales['PARTNERSHIP_TIER'] = classify(supplier_sales['MARKET_SHARE'], 'partnership_tier')
         
         # Calculate average sales per supplier
         avg_sales_per_supplier = float(supplier_sales['TOTAL_SALES'].mean())
@@ -609,11 +921,7 @@ def get_sales_per_supplier():
         
         # Monthly trends for top suppliers (top 5)
         top_5_suppliers = supplier_sales.head(5)['SUPPLIER'].tolist()
-        monthly_supplier_trends = df[df['SUPPLIER'].isin(top_5_suppliers)].groupby(['YEAR', 'MONTH', 'SUPPLIER']).agg({
-            'RETAIL SALES': 'sum',
-            'RETAIL TRANSFERS': 'sum',
-            'WAREHOUSE SALES': 'sum'
-        }).reset_index()
+        monthly_supplier_trends = rollup(period_rows[period_rows['SUPPLIER'].isin(top_5_suppliers)], ['YEAR', 'MONTH', 'SUPPLIER'])
         
         monthly_supplier_trends['TOTAL_SALES'] = (
             monthly_supplier_trends['RETAIL SALES'] + 
@@ -643,84 +951,55 @@ def get_sales_per_supplier():
             'supplier_diversity': 'High' if total_suppliers >= 20 else 'Moderate' if total_suppliers >= 10 else 'Low'
         }
         
-        return jsonify(sales_per_supplier_data)
+        return sales_per_supplier_data
     except Exception as e:
-        return jsonify({'error': f'Error calculating sales per supplier: {str(e)}'})
+        return {'error': f'Error calculating sales per supplier: {str(e)}'}
 
 # Top Items by Retail Transfers - Logistics KPI
-@app.route('/api/top_items_by_transfers', methods=['GET'])
+@dashboard_endpoint('top_items_by_transfers')
 def get_top_items_by_transfers():
     try:
-        if len(df) == 0:
-            return jsonify({'error': 'No data available'})
-        
-        # Calculate retail transfers by item
-        item_transfers = df.groupby(['ITEM CODE', 'ITEM DESCRIPTION', 'ITEM TYPE']).agg({
-            'RETAIL TRANSFERS': 'sum',
-            'RETAIL SALES': 'sum'
-        }).reset_index()
+        if len(pinned_dataset()) == 0:
+            return {'error': 'No data available'}
         
-        # Filter items with retail transfers > 0
-        item_transfers = item_transfers[item_transfers['RETAIL TRANSFERS'] > 0]
+        period = get_period_from_request()
+        if len(rollup_source(period)) == 0:
+            return {'error': f'No data available for {period} period'}
         
-        if len(item_transfers) == 0:
-            return jsonify({'error': 'No items with retail transfers found'})
+        # Top 15 items by retail transfers, among those with retail transfers > 0
+        ranking = item_ranking(['ITEM CODE', 'ITEM DESCRIPTION', 'ITEM TYPE'], period)
+        top_transfers = ranking.top('RETAIL TRANSFERS', 15, positive=True)
         
-        # Sort by retail transfers
-        item_transfers = item_transfers.sort_values('RETAIL TRANSFERS', ascending=False)
+        if len(top_transfers) == 0:
+            return {'error': 'No items with retail transfers found'}
         
         # Calculate transfer efficiency (transfers as % of total retail activity)
-        item_transfers['TOTAL_RETAIL_ACTIVITY'] = item_transfers['RETAIL SALES'] + item_transfers['RETAIL TRANSFERS']
-        item_transfers['TRANSFER_EFFICIENCY'] = (
-            item_transfers['RETAIL TRANSFERS'] / item_transfers['TOTAL_RETAIL_ACTIVITY'] * 100
+        top_transfers['TOTAL_RETAIL_ACTIVITY'] = top_transfers['RETAIL SALES'] + top_transfers['RETAIL TRANSFERS']
+        top_transfers['TRANSFER_EFFICIENCY'] = (
+            top_transfers['RETAIL TRANSFERS'] / top_transfers['TOTAL_RETAIL_ACTIVITY'] * 100
         ).fillna(0)
         
-        # Get top 15 items by transfers
-        top_transfers = item_transfers.head(15).copy()
-        
         # Logistics performance categories
-        def get_logistics_performance(efficiency):
-            if efficiency >= 50:
-                return 'High Transfer Focus'
-            elif efficiency >= 30:
-                return 'Moderate Transfer Focus'
-            elif efficiency >= 15:
-                return 'Balanced Distribution'
-            elif efficiency >= 5:
-                return 'Sales Focus'
-            else:
-                return 'Minimal Transfers'
-        
-        top_transfers['LOGISTICS_PERFORMANCE'] = top_transfers['TRANSFER_EFFICIENCY'].apply(get_logistics_performance)
+        top_transfers['LOGISTICS_PERFORMANCE'] = classify(top_transfers['TRANSFER_EFFICIENCY'], 'logistics_performance')
         
         # Create display labels (truncated for charts)
-        top_transfers['DISPLAY_LABEL'] = top_transfers.apply(
-            lambda row: f"{row['ITEM CODE']} - {str(row['ITEM DESCRIPTION'])[:20]}..." 
-            if len(str(row['ITEM DESCRIPTION'])) > 20 
-            else f"{row['ITEM CODE']} - {str(row['ITEM DESCRIPTION'])}", 
-            axis=1
-        )
+        top_transfers['DISPLAY_LABEL'] = item_labels(top_transfers['ITEM CODE'], top_transfers['ITEM DESCRIPTION'], 20)
         
         # Calculate totals and metrics
-        total_transfers = float(df['RETAIL TRANSFERS'].sum())
+        total_transfers = grand_totals(period)['RETAIL TRANSFERS']
         top_15_transfers_total = float(top_transfers['RETAIL TRANSFERS'].sum())
         top_15_percentage = (top_15_transfers_total / total_transfers * 100) if total_transfers > 0 else 0
         
         # Item type analysis
-        transfers_by_type = top_transfers.groupby('ITEM TYPE')['RETAIL TRANSFERS'].sum().sort_values(ascending=False)
-        
-        # Monthly transfer trends for top item
-        if len(top_transfers) > 0:
-            top_item_code = top_transfers.iloc[0]['ITEM CODE']
-            monthly_trends = df[df['ITEM CODE'] == top_item_code].groupby(['YEAR', 'MONTH'])['RETAIL TRANSFERS'].sum().reset_index()
-            monthly_trends['PERIOD'] = monthly_trends['YEAR'].astype(str) + '-' + monthly_trends['MONTH'].astype(str).str.zfill(2)
-            monthly_trends = monthly_trends.sort_values(['YEAR', 'MONTH'])
-        else:
-            monthly_trends = pd.DataFrame()
+        transfers_by_type = top_transfers.groupby('ITEM TYPE', observed=True)['RETAIL TRANSFERS'].sum().sort_values(ascending=False)
         
         # Reverse order for horizontal bar chart display
         top_transfers_display = top_transfers.iloc[::-1].reset_index(drop=True)
         
+        # Monthly transfer trends for each displayed item
+        trend_periods, transfer_trends = item_month_matrix().series(
+            top_transfers_display['ITEM CODE'].tolist(), 'RETAIL TRANSFERS', parse_period(period))
+        
         top_items_transfers_data = {
             'item_codes': [str(x) for x in top_transfers_display['ITEM CODE'].tolist()],
             'display_labels': [str(x) for x in top_transfers_display['DISPLAY_LABEL'].tolist()],
@@ -733,37 +1012,34 @@ def get_top_items_by_transfers():
             'total_retail_transfers': total_transfers,
             'top_15_transfers_total': top_15_transfers_total,
             'top_15_percentage': float(top_15_percentage),
-            'top_transfer_item': str(item_transfers.iloc[0]['ITEM CODE']) if len(item_transfers) > 0 else 'N/A',
-            'top_transfer_amount': float(item_transfers.iloc[0]['RETAIL TRANSFERS']) if len(item_transfers) > 0 else 0,
+            'top_transfer_item': str(top_transfers.iloc[0]['ITEM CODE']),
+            'top_transfer_amount': float(top_transfers.iloc[0]['RETAIL TRANSFERS']),
             'transfer_focused_items': int(len(top_transfers[top_transfers['LOGISTICS_PERFORMANCE'].isin(['High Transfer Focus', 'Moderate Transfer Focus'])])),
-            'total_transfer_items': int(len(item_transfers)),
-            'dominant_transfer_type': str(transfers_by_type.index[0]) if len(transfers_by_type) > 0 else 'N/A'
+            'total_transfer_items': ranking.positive_count('RETAIL TRANSFERS'),
+            'dominant_transfer_type': str(transfers_by_type.index[0]) if len(transfers_by_type) > 0 else 'N/A',
+            'trend_periods': trend_periods,
+            'transfer_trends': [[float(x) for x in row] for row in transfer_trends.tolist()]
         }
         
-        return jsonify(top_items_transfers_data)
+        return top_items_transfers_data
     except Exception as e:
-        return jsonify({'error': f'Error calculating top items by transfers: {str(e)}'})
+        return {'error': f'Error calculating top items by transfers: {str(e)}'}
 
-# Remove the problematic seasonality endpoint temporarily
-@app.route('/api/sales_seasonality', methods=['GET'])
+@dashboard_endpoint('sales_seasonality')
 def get_sales_seasonality():
     try:
-        if len(df) == 0:
-            return jsonify({'error': 'No data available'})
-
-        # Simple seasonality calculation using basic grouping
-        monthly_data = df.groupby(['YEAR', 'MONTH']).agg({
-            'RETAIL SALES': 'sum',
-            'RETAIL TRANSFERS': 'sum', 
-            'WAREHOUSE SALES': 'sum'
-        }).reset_index()
+        if len(pinned_dataset()) == 0:
+            return {'error': 'No data available'}
         
-        # Create period strings
-        monthly_data['PERIOD'] = monthly_data['YEAR'].astype(str) + '-' + monthly_data['MONTH'].astype(str).str.zfill(2)
-        monthly_data['TOTAL_SALES'] = monthly_data['RETAIL SALES'] + monthly_data['RETAIL TRANSFERS'] + monthly_data['WAREHOUSE SALES']
+        period = get_period_from_request()
+        if len(rollup_source(period)) == 0:
+            return {'error': f'No data available for {period} period'}
+
+        # Simple seasonality calculation from the monthly totals (with PERIOD and TOTAL_SALES)
+        monthly_data = monthly_totals(period)
         
-        # Sort and get last 12 months
-        monthly_data = monthly_data.sort_values(['YEAR', 'MONTH']).tail(12)
+        # Get last 12 months
+        monthly_data = monthly_data.tail(12)
         
         # Simple peak/valley calculation
         peak_idx = monthly_data['TOTAL_SALES'].idxmax()
@@ -790,6 +1066,13 @@ def get_sales_seasonality():
         else:
             trend = "Stable"
         
+        # Year-over-year and seasonal figures of the analysed months, from the prefix sums
+        engine = seasonality()
+        months = row_periods(monthly_data)
+        first_month, last_month = int(months[0]), int(months[-1])
+        channels = {name: engine.channel_summary(column, first_month, last_month) for name, column in CHANNELS.items()}
+        latest_index = engine.seasonal_index('TOTAL_SALES', last_month)
+        
         # Calculate channel contributions
         total_all = monthly_data['TOTAL_SALES'].sum() if len(monthly_data) > 0 else 1
         retail_contrib = (monthly_data['RETAIL SALES'].sum() / total_all * 100) if total_all > 0 else 33
@@ -807,9 +1090,13 @@ def get_sales_seasonality():
             'peak_value': peak_value,
             'valley_value': valley_value,
             'seasonality_index': float(seasonality_index),
-            'seasonal_performance': 'Average Season',
+            'seasonal_index': latest_index,
+            'seasonal_performance': tier_of(latest_index, 'seasonal_performance'),
             'trend': trend,
-            'year_over_year_growth': 5.2,
+            'year_over_year_growth': channels['total_sales']['year_over_year_growth'],
+            'ttm_total_sales': channels['total_sales']['ttm_total'],
+            'ttm_growth': channels['total_sales']['ttm_growth'],
+            'channels': channels,
             'average_monthly_sales': float(avg_sales),
             'retail_contribution': float(retail_contrib),
             'transfers_contribution': float(transfers_contrib),
@@ -817,30 +1104,149 @@ def get_sales_seasonality():
             'months_analyzed': len(monthly_data)
         }
         
-        return jsonify(seasonality_data)
+        return seasonality_data
     except Exception as e:
-        # Return a fallback response instead of error
-        fallback_data = {
-            'periods': ['2024-01', '2024-02', '2024-03'],
-            'retail_sales': [100000, 120000, 110000],
-            'retail_transfers': [50000, 55000, 52000],
-            'warehouse_sales': [75000, 80000, 78000],
-            'total_sales': [225000, 255000, 240000],
-            'peak_month': '2024-02',
-            'valley_month': '2024-01',
-            'peak_value': 255000,
-            'valley_value': 225000,
-            'seasonality_index': 106.7,
-            'seasonal_performance': 'Average Season',
-            'trend': 'Stable',
-            'year_over_year_growth': 5.2,
-            'average_monthly_sales': 240000,
-            'retail_contribution': 44.4,
-            'transfers_contribution': 22.2,
-            'warehouse_contribution': 33.3,
-            'months_analyzed': 3
+        return {'error': f'Error calculating sales seasonality: {str(e)}'}
+
+@app.route('/api/item_trend', methods=['GET'])
+@cached
+def get_item_trend():
+    """Monthly series of one measure for ?codes=a,b,... (at most MAX_TREND_ITEMS) over the period"""
+    try:
+        codes = [code.strip() for code in request.args.get('codes', '').split(',') if code.strip()]
+        measure = request.args.get('measure', 'RETAIL SALES').strip().upper().replace('_', ' ')
+        if not codes or len(codes) > MAX_TREND_ITEMS:
+            return jsonify({'error': f'Give between 1 and {MAX_TREND_ITEMS} item codes in codes'}), 400
+        if measure not in MEASURE_COLUMNS:
+            return jsonify({'error': f"Unknown measure '{measure}': use one of {', '.join(MEASURE_COLUMNS)}"}), 400
+        if len(pinned_dataset()) == 0:
+            return jsonify({'error': 'No data available'})
+        
+        period = get_period_from_request()
+        matrix = item_month_matrix()
+        periods, values = matrix.series(codes, measure, parse_period(period))
+        known = [code in matrix.rows for code in codes]
+        
+        return jsonify({
+            'measure': measure,
+            'period': period,
+            'periods': periods,
+            'item_codes': [code for code, found in zip(codes, known) if found],
+            'series': [[float(x) for x in row] for row, found in zip(values.tolist(), known) if found],
+            'totals': [float(row.sum()) for row, found in zip(values, known) if found],
+            'unknown_codes': [code for code, found in zip(codes, known) if not found]
+        })
+    except Exception as e:
+        return jsonify({'error': f'Error fetching item trends: {str(e)}'})
+
+@app.route('/api/range_totals', methods=['GET'])
+@cached
+def get_range_totals():
+    """Totals of measures over the period, overall or per dimension value, in constant time per value.
+    
+    ?measures=retail_sales,... (default: all), ?dimension=supplier|item_type|area
+    with ?values=a,b,... (default: every value), and ?window=N for the
+    N-month moving sums and averages ending at each month of the period.
+    """
+    try:
+        measures = [column_name(m) for m in request.args.get('measures', '').split(',') if m.strip()] or MEASURE_COLUMNS
+        unknown = [m for m in measures if m not in MEASURE_COLUMNS]
+        if unknown:
+            return jsonify({'error': f"Unknown measure '{unknown[0]}': use one of {', '.join(MEASURE_COLUMNS)}"}), 400
+        dimension = column_name(request.args['dimension']) if request.args.get('dimension') else None
+        if dimension is not None and dimension not in RANGE_DIMENSIONS:
+            return jsonify({'error': f"Unknown dimension '{dimension}': use one of {', '.join(RANGE_DIMENSIONS)}"}), 400
+        values = [v.strip() for v in request.args.get('values', '').split(',') if v.strip()] or None
+        if values is not None and (dimension is None or len(values) > MAX_FILTER_VALUES):
+            return jsonify({'error': f'values needs a dimension and at most {MAX_FILTER_VALUES} entries'}), 400
+        try:
+            window = int(request.args['window']) if request.args.get('window') else None
+        except ValueError:
+            window = 0
+        if window is not None and not 1 <= window <= MAX_RANGE_WINDOW:
+            return jsonify({'error': f"'window' must be between 1 and {MAX_RANGE_WINDOW} months"}), 400
+        if len(pinned_dataset()) == 0:
+            return jsonify({'error': 'No data available'})
+        
+        period = get_period_from_request()
+        period_range = parse_period(period)
+        index = range_index()
+        if dimension is not None and dimension not in index.rows:
+            return jsonify({'error': f'{dimension} not in the loaded data'}), 400
+        found, rows, missing = index.dimension_rows(dimension, values) if dimension else ([], None, [])
+        
+        def per_value(array):
+            return [float(x) for x in array] if dimension else float(array[0])
+        
+        clipped = index.clip(period_range)
+        result = {
+            'period': period,
+            'months': [period_label(month) for month in range(clipped[0], clipped[1] + 1)] if clipped else [],
+            'measures': [result_label(m) for m in measures],
+            'dimension': result_label(dimension) if dimension else None,
+            'values': found,
+            'unknown_values': missing,
+            'totals': {result_label(m): per_value(index.totals(m, period_range, dimension, rows)) for m in measures}
         }
-        return jsonify(fallback_data)
+        if window is not None:
+            result.update(window=window, moving_sums={}, moving_averages={})
+            for m in measures:
+                _, sums = index.rolling(m, window, period_range, dimension, rows)
+                series = [[None if np.isnan(x) else float(x) for x in row] for row in sums]
+                result['moving_sums'][result_label(m)] = series if dimension else series[0]
+                averages = [[None if x is None else x / window for x in row] for row in series]
+                result['moving_averages'][result_label(m)] = averages if dimension else averages[0]
+        return jsonify(result)
+    except Exception as e:
+        return jsonify({'error': f'Error computing range totals: {str(e)}'})
+
+@app.route('/api/batch', methods=['GET'])
+@cached
+def get_batch():
+    """Several dashboard KPIs for one period in one request, keyed by endpoint name.
+    
+    ?endpoints=kpi_data,sales_mix,... (default: all of them). The KPIs run
+    against the same pinned dataset and share the totals they roll up, so a
+    full page costs one pass per aggregate instead of one per chart.
+    """
+    names = [name.strip() for name in request.args.get('endpoints', '').split(',') if name.strip()]
+    unknown = [name for name in names if name not in DASHBOARD_ENDPOINTS]
+    if unknown:
+        return jsonify({'error': f"Unknown endpoints: {', '.join(unknown)}",
+                        'available': list(DASHBOARD_ENDPOINTS)}), 400
+    
+    results = {name: DASHBOARD_ENDPOINTS[name]() for name in dict.fromkeys(names or DASHBOARD_ENDPOINTS)}
+    response = jsonify({'period': get_period_from_request(), 'results': results})
+    if any(isinstance(result, dict) and 'error' in result for result in results.values()):
+        # Recompute next time rather than replaying a failed KPI for the whole version
+        response.cache_control.no_store = True
+    return response
+
+@app.route('/api/query', methods=['GET', 'POST'])
+def query_sales():
+    """Ad-hoc grouping of the cube; see query_engine for the query fields"""
+    try:
+        params = request.args
+        if request.method == 'POST':
+            params = request.get_json(force=True, silent=True)
+            if params is None and request.get_data():
+                raise QueryError('The query must be a JSON object')
+        spec = parse_query(params)
+        pinned = pinned_dataset()
+        if len(pinned) == 0:
+            return jsonify({'error': 'No data available'})
+
+        key = query_key(spec)
+        result = query_cache.get(pinned.version, key)
+        cached = result is not None
+        if result is None:
+            result = run_query(spec, rollup_source(spec['period']))
+            query_cache.put(pinned.version, key, result)
+        return jsonify({**result, 'cached': cached, 'version': pinned.version})
+    except QueryError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Error running query: {str(e)}'})
 
 if __name__ == '__main__':
     # Get port from environment variable for Azure deployment
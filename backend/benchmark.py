@@ -0,0 +1,345 @@
+"""Latency benchmarks for the app_stable endpoints.
+
+    python benchmark.py cube [path] [--repeat N]
+    python benchmark.py batch [path] [--repeat N]
+    python benchmark.py builders [--sizes 10000,100000,1000000]
+    python benchmark.py parallel [path] [--workers 1,2,4] [--repeat N]
+    python benchmark.py kernel [path] [--trials N] [--repeat N]
+
+cube: per-endpoint latency answering every request by grouping the raw rows
+(the SALES_CUBE=0 path) against rolling up the pre-aggregated cube, with a
+check that both give the same response.
+
+batch: one /api/batch request for every dashboard KPI against the separate
+per-endpoint requests it replaces, with a check that the results match.
+
+builders: building app_new's supplier treemap records and item display
+labels row by row (iterrows, apply(axis=1)) against the column-at-a-time
+builders in response_builder, on synthetic frames of each size.
+
+parallel: top_selling_items and sales_per_supplier for periods that roll up
+the whole cube (or the raw rows with SALES_CUBE=0), with the rollups on a
+process pool of each size (see parallel_aggregates); 1 is the serial
+groupby. Checks that every pool size gives the serial response.
+
+kernel: checks group_kernel.group_sums against the pandas groupby it
+replaces on randomized frames (categorical, integer and text keys, unused
+categories, missing keys and NaN measures), then times both on the rollups
+behind sales_by_item_type, sales_mix, sales_by_area and sales_per_supplier,
+over the raw rows and the cube.
+
+`path` is the extract or partition directory to load (default: the one the
+app would find). The response cache is off unless SALES_RESPONSE_CACHE_SIZE
+is set, so every timed request is computed.
+"""
+import argparse
+import math
+import os
+import statistics
+import sys
+import time
+
+os.environ.setdefault('SALES_RELOAD_INTERVAL', '0')
+# Time the endpoints themselves, not replays from the response cache
+os.environ.setdefault('SALES_RESPONSE_CACHE_SIZE', '0')
+
+ENDPOINTS = [
+    'kpi_data', 'overall_sales_performance', 'sales_mix', 'sales_by_area', 'top_selling_items',
+    'sales_by_item_type', 'sales_transfer_ratio', 'month_over_month_growth', 'inventory_turnover_rate',
+    'sales_per_supplier', 'top_items_by_transfers', 'sales_seasonality'
+]
+QUERIES = ['', '?period=YTD']
+PARALLEL_ENDPOINTS = ['top_selling_items', 'sales_per_supplier']
+# Group keys of the endpoint rollups the integer-coded kernel serves
+KERNEL_KEYS = [['ITEM TYPE'], ['AREA'], ['SUPPLIER'], ['YEAR', 'MONTH', 'SUPPLIER']]
+
+
+def load_app(path=None):
+    """Import app_stable and publish the dataset at path (or wait for its own load)"""
+    import app_stable
+
+    while app_stable.data_state['status'] == 'loading':
+        time.sleep(0.1)
+    if path is not None:
+        app_stable.publish_dataset(app_stable.build_dataset(path))
+        app_stable.data_state.update(status='ready', error=None)
+    if app_stable.data_state['status'] != 'ready':
+        sys.exit(f"Data did not load: {app_stable.data_state['error']}")
+    return app_stable
+
+
+def time_request(client, url, repeat):
+    """Median latency in ms over repeat requests after one warm-up, and the response body"""
+    body = client.get(url).get_json()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        client.get(url)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), body
+
+
+def same_response(a, b, rel_tol=1e-6):
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(same_response(a[k], b[k], rel_tol) for k in a)
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(same_response(x, y, rel_tol) for x, y in zip(a, b))
+    if isinstance(a, float) or isinstance(b, float):
+        return math.isclose(a, b, rel_tol=rel_tol, abs_tol=1e-9)
+    return a == b
+
+
+def benchmark_cube(app_stable, repeat):
+    client = app_stable.app.test_client()
+    cube = app_stable.dataset.derived(app_stable.CUBE)
+    print(f"Raw rows: {len(app_stable.dataset):,}  cube rows: {len(cube):,}  repeat: {repeat}")
+    print(f"{'endpoint':45s} {'raw ms':>9s} {'cube ms':>9s} {'speedup':>8s}  same")
+
+    raw_total = cube_total = 0.0
+    for endpoint in ENDPOINTS:
+        for query in QUERIES:
+            url = f'/api/{endpoint}{query}'
+            app_stable.CUBE_ENABLED = False
+            raw_ms, raw_body = time_request(client, url, repeat)
+            app_stable.CUBE_ENABLED = True
+            cube_ms, cube_body = time_request(client, url, repeat)
+            raw_total += raw_ms
+            cube_total += cube_ms
+            print(f"{endpoint + query:45s} {raw_ms:9.2f} {cube_ms:9.2f} {raw_ms / cube_ms:7.1f}x  "
+                  f"{'yes' if same_response(raw_body, cube_body) else 'NO'}")
+    print(f"{'total':45s} {raw_total:9.2f} {cube_total:9.2f} {raw_total / cube_total:7.1f}x")
+
+
+def benchmark_batch(app_stable, repeat):
+    client = app_stable.app.test_client()
+    print(f"Raw rows: {len(app_stable.dataset):,}  endpoints: {len(ENDPOINTS)}  repeat: {repeat}")
+    print(f"{'query':20s} {'separate ms':>12s} {'batch ms':>9s} {'speedup':>8s}  same")
+    for query in QUERIES:
+        separate_ms, bodies = 0.0, {}
+        for endpoint in ENDPOINTS:
+            ms, bodies[endpoint] = time_request(client, f'/api/{endpoint}{query}', repeat)
+            separate_ms += ms
+        batch_ms, batch_body = time_request(client, f'/api/batch{query}', repeat)
+        print(f"{query or '(all data)':20s} {separate_ms:12.2f} {batch_ms:9.2f} {separate_ms / batch_ms:7.1f}x  "
+              f"{'yes' if same_response(bodies, batch_body['results']) else 'NO'}")
+
+
+def synthetic_groups(size, seed=0):
+    """A grouped-totals frame of size rows, shaped like app_new's supplier and item payloads"""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    frame = pd.DataFrame({
+        'SUPPLIER': [f'SUPPLIER {i} ' + 'X' * int(n) for i, n in enumerate(rng.integers(0, 20, size))],
+        'ITEM CODE': np.arange(100000, 100000 + size),
+        'ITEM DESCRIPTION': [f'ITEM DESCRIPTION {i} ' + 'X' * int(n) for i, n in enumerate(rng.integers(0, 20, size))],
+        'RETAIL SALES': rng.gamma(2.0, 500.0, size)
+    })
+    frame['PERCENTAGE'] = frame['RETAIL SALES'] / frame['RETAIL SALES'].sum() * 100
+    frame['RANK'] = range(1, size + 1)
+    frame['CATEGORY'] = np.where(frame['PERCENTAGE'] >= 1, 'Regular Partner', 'Minor Partner')
+    return frame
+
+
+def build_rowwise(frame):
+    """The iterrows / apply(axis=1) payload code app_new used"""
+    names = frame['SUPPLIER'].apply(lambda x: str(x)[:20] + '...' if len(str(x)) > 20 else str(x))
+    labels = frame.apply(
+        lambda row: f"{row['ITEM CODE']} - {str(row['ITEM DESCRIPTION'])[:25]}..."
+        if len(str(row['ITEM DESCRIPTION'])) > 25
+        else f"{row['ITEM CODE']} - {str(row['ITEM DESCRIPTION'])}",
+        axis=1
+    )
+    treemap = []
+    for _, row in frame.assign(DISPLAY_NAME=names).iterrows():
+        treemap.append({
+            'supplier': str(row['SUPPLIER']),
+            'display_name': str(row['DISPLAY_NAME']),
+            'sales': float(row['RETAIL SALES']),
+            'percentage': float(row['PERCENTAGE']),
+            'rank': int(row['RANK']),
+            'category': str(row['CATEGORY'])
+        })
+    return treemap, labels.tolist()
+
+
+def build_columnar(frame):
+    from response_builder import item_labels, records, truncate_labels
+
+    treemap = records(frame.assign(DISPLAY_NAME=truncate_labels(frame['SUPPLIER'], 20)), {
+        'supplier': ('SUPPLIER', str),
+        'display_name': ('DISPLAY_NAME', str),
+        'sales': ('RETAIL SALES', float),
+        'percentage': ('PERCENTAGE', float),
+        'rank': ('RANK', int),
+        'category': ('CATEGORY', str)
+    })
+    return treemap, item_labels(frame['ITEM CODE'], frame['ITEM DESCRIPTION'], 25).tolist()
+
+
+def benchmark_builders(sizes):
+    print(f"{'groups':>10s} {'row-wise s':>11s} {'columnar s':>11s} {'speedup':>8s}  same")
+    for size in sizes:
+        frame = synthetic_groups(size)
+        start = time.perf_counter()
+        rowwise = build_rowwise(frame)
+        rowwise_s = time.perf_counter() - start
+        start = time.perf_counter()
+        columnar = build_columnar(frame)
+        columnar_s = time.perf_counter() - start
+        print(f"{size:>10,d} {rowwise_s:11.3f} {columnar_s:11.3f} {rowwise_s / columnar_s:7.1f}x  "
+              f"{'yes' if rowwise == columnar else 'NO'}")
+
+
+def data_periods(app_stable):
+    """The whole month range of the loaded data and its last year, as period queries"""
+    months = app_stable.dataset.derived(app_stable.MONTHLY_ROLLUP)['months']['PERIOD']
+    return [f'?period={months.iloc[0]}:{months.iloc[-1]}', f'?period={months.iloc[-1][:4]}']
+
+
+def benchmark_parallel(app_stable, workers, repeat):
+    from parallel_aggregates import PARALLEL_PARTITIONS, shutdown_pools
+    from sales_dataset import SalesDataset
+
+    base = app_stable.dataset
+    client = app_stable.app.test_client()
+    queries = data_periods(app_stable)
+    source = base.derived(app_stable.CUBE) if app_stable.CUBE_ENABLED else base.frame
+    print(f"Raw rows: {len(base):,}  {'cube' if app_stable.CUBE_ENABLED else 'raw'} rows partitioned: "
+          f"{len(source):,}  cores: {os.cpu_count()}  repeat: {repeat}")
+
+    os.environ['SALES_PARALLEL_MIN_ROWS'] = '1'
+    timings, bodies = {}, {}
+    for count in workers:
+        os.environ['SALES_PARALLEL_WORKERS'] = str(count)
+        dataset = SalesDataset(base.frame, version=f'{base.version}-w{count}', source_path=base.source_path,
+                               load_info=base.load_info)
+        dataset.derived(app_stable.CUBE)
+        start = time.perf_counter()
+        dataset.derived(PARALLEL_PARTITIONS)
+        print(f"{count} worker(s): partitions written in {time.perf_counter() - start:.2f}s")
+        app_stable.publish_dataset(dataset)
+        for endpoint in PARALLEL_ENDPOINTS:
+            for query in queries:
+                timings[endpoint + query, count], bodies[endpoint + query, count] = \
+                    time_request(client, f'/api/{endpoint}{query}', repeat)
+    app_stable.publish_dataset(base)
+    shutdown_pools()
+
+    print(f"{'request':50s}" + ''.join(f"{f'{count} ms':>10s}" for count in workers) + f"{'speedup':>9s}  same")
+    for endpoint in PARALLEL_ENDPOINTS:
+        for query in queries:
+            url = endpoint + query
+            first, last = timings[url, workers[0]], timings[url, workers[-1]]
+            same = all(same_response(bodies[url, workers[0]], bodies[url, count]) for count in workers)
+            print(f"{url:50s}" + ''.join(f"{timings[url, count]:10.2f}" for count in workers) +
+                  f"{first / last:8.1f}x  {'yes' if same else 'NO'}")
+
+
+def random_key(rng, kind, size):
+    import pandas as pd
+
+    if kind == 'category':
+        # Only some of the categories used, and some keys missing
+        categories = [f'KEY {i}' for i in range(int(rng.integers(1, 40)))]
+        values = pd.Series(pd.Categorical(rng.choice(categories[:int(rng.integers(1, len(categories) + 1))], size),
+                                          categories=categories))
+        return values.mask(rng.random(size) < 0.05)
+    if kind == 'year':
+        return pd.Series(rng.integers(2020, 2027, size).astype('int16'))
+    if kind == 'month':
+        return pd.Series(rng.integers(1, 13, size).astype('int8'))
+    if kind == 'code':
+        return pd.Series(rng.integers(100000, 10 ** 9, size))
+    return pd.Series(rng.choice(['WINE', 'BEER', 'LIQUOR', None], size).astype(object))
+
+
+def verify_kernel(trials, seed=0):
+    """Number of randomized frames on which group_sums differs from the groupby"""
+    import numpy as np
+    import pandas as pd
+    from group_kernel import group_sums
+
+    rng = np.random.default_rng(seed)
+    measures = ['RETAIL SALES', 'RETAIL TRANSFERS', 'WAREHOUSE SALES']
+    failures = 0
+    for trial in range(trials):
+        size = int(rng.choice([0, 1, 10, 1000, 20000]))
+        kinds = rng.choice(['category', 'year', 'month', 'code', 'text'], int(rng.integers(1, 4)))
+        keys = [f'KEY {i}' for i in range(len(kinds))]
+        frame = pd.DataFrame({key: random_key(rng, kind, size) for key, kind in zip(keys, kinds)})
+        dtype = 'float32' if trial % 3 == 0 else 'float64'
+        for measure in measures:
+            values = rng.gamma(2.0, 500.0, size)
+            values[rng.random(size) < 0.05] = np.nan
+            frame[measure] = values.astype(dtype)
+        expected = frame.groupby(keys, observed=True, sort=True)[measures].sum().reset_index()
+        try:
+            pd.testing.assert_frame_equal(group_sums(frame, keys, measures), expected, check_exact=False,
+                                          rtol=1e-5 if dtype == 'float32' else 1e-12)
+        except AssertionError as e:
+            failures += 1
+            print(f"Trial {trial} ({', '.join(kinds)}, {size} rows, {dtype}) differs: {e}")
+    return failures
+
+
+def benchmark_kernel(app_stable, trials, repeat):
+    from group_kernel import group_sums
+    from sales_schema import MEASURE_COLUMNS
+
+    failures = verify_kernel(trials)
+    print(f"Randomized check: {trials - failures}/{trials} frames match the groupby")
+
+    sources = {'raw': app_stable.dataset.frame, 'cube': app_stable.dataset.derived(app_stable.CUBE)}
+    print(f"Raw rows: {len(sources['raw']):,}  cube rows: {len(sources['cube']):,}  repeat: {repeat}")
+    print(f"{'rollup':40s} {'groupby ms':>11s} {'kernel ms':>10s} {'speedup':>8s}")
+    for name, rows in sources.items():
+        for keys in KERNEL_KEYS:
+            timings = []
+            for rollup in (lambda: rows.groupby(keys, observed=True, sort=True)[MEASURE_COLUMNS].sum().reset_index(),
+                           lambda: group_sums(rows, keys, MEASURE_COLUMNS)):
+                samples = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    rollup()
+                    samples.append((time.perf_counter() - start) * 1000)
+                timings.append(statistics.median(samples))
+            print(f"{name + ' by ' + ', '.join(keys):40s} {timings[0]:11.2f} {timings[1]:10.2f} "
+                  f"{timings[0] / timings[1]:7.1f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the app_stable endpoints')
+    subcommands = parser.add_subparsers(dest='command', required=True)
+    cube_parser = subcommands.add_parser('cube', help='raw-row groupbys against cube rollups, per endpoint')
+    cube_parser.add_argument('path', nargs='?', help='extract or partition directory to load')
+    cube_parser.add_argument('--repeat', type=int, default=20)
+    batch_parser = subcommands.add_parser('batch', help='one /api/batch request against one request per endpoint')
+    batch_parser.add_argument('path', nargs='?', help='extract or partition directory to load')
+    batch_parser.add_argument('--repeat', type=int, default=20)
+    builders_parser = subcommands.add_parser('builders', help='row-wise against columnar payload building')
+    builders_parser.add_argument('--sizes', default='10000,100000,1000000',
+                                 help='comma-separated numbers of groups')
+    parallel_parser = subcommands.add_parser('parallel', help='rollups on process pools of increasing size')
+    parallel_parser.add_argument('path', nargs='?', help='extract or partition directory to load')
+    parallel_parser.add_argument('--workers', default=f'1,2,{os.cpu_count() or 1}',
+                                 help='comma-separated pool sizes (1 is the serial groupby)')
+    parallel_parser.add_argument('--repeat', type=int, default=10)
+    kernel_parser = subcommands.add_parser('kernel', help='integer-coded group sums against the pandas groupby')
+    kernel_parser.add_argument('path', nargs='?', help='extract or partition directory to load')
+    kernel_parser.add_argument('--trials', type=int, default=500, help='randomized frames to check')
+    kernel_parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == 'cube':
+        benchmark_cube(load_app(args.path), args.repeat)
+    elif args.command == 'batch':
+        benchmark_batch(load_app(args.path), args.repeat)
+    elif args.command == 'builders':
+        benchmark_builders([int(size) for size in args.sizes.split(',')])
+    elif args.command == 'parallel':
+        benchmark_parallel(load_app(args.path), sorted({int(count) for count in args.workers.split(',')}),
+                           args.repeat)
+    elif args.command == 'kernel':
+        benchmark_kernel(load_app(args.path), args.trials, args.repeat)
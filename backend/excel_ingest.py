@@ -0,0 +1,66 @@
+"""Streaming ingest of .xlsx sales workbooks.
+
+pd.read_excel loads the whole workbook through openpyxl in normal mode, which
+builds a cell object for every value and is very slow on large sheets. Here
+the sheet is opened read-only and its rows are streamed in batches, each
+batch converted straight to the typed ingest schema, so only one batch of
+Python row tuples exists at a time. Combined with snapshot_cache, a workbook
+is parsed once per file version and later loads read the Feather snapshot.
+
+SALES_XLSX_BATCH_ROWS sets the batch size (default 50000).
+"""
+import os
+
+import pandas as pd
+
+from sales_schema import CATEGORY_COLUMNS, apply_sales_schema, concat_sales_frames, schema_variant
+
+DEFAULT_BATCH_ROWS = 50000
+
+
+def xlsx_variant():
+    """Snapshot key tag for frames converted from a workbook"""
+    return f'{schema_variant()}-xlsx'
+
+
+def _convert_batch(rows, columns):
+    batch = pd.DataFrame.from_records(rows, columns=columns)
+    for col in CATEGORY_COLUMNS:
+        # ITEM CODE numbers are written as text by apply_sales_schema itself
+        if col != 'ITEM CODE' and col in batch.columns and batch[col].dtype == object:
+            # Cells of one column can mix numbers and text; compare them as text
+            batch[col] = batch[col].map(lambda value: value if value is None else str(value))
+    return apply_sales_schema(batch)
+
+
+def read_sales_xlsx(path, sheet_name=None, batch_rows=None):
+    """Stream the first (or named) sheet of a workbook into the typed ingest schema"""
+    from openpyxl import load_workbook
+
+    batch_rows = batch_rows or int(os.environ.get('SALES_XLSX_BATCH_ROWS', DEFAULT_BATCH_ROWS))
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return pd.DataFrame()
+        columns = [str(name) if name is not None else f'Unnamed: {i}' for i, name in enumerate(header)]
+
+        batches = []
+        pending = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            pending.append(row)
+            if len(pending) >= batch_rows:
+                batches.append(_convert_batch(pending, columns))
+                pending = []
+        if pending:
+            batches.append(_convert_batch(pending, columns))
+    finally:
+        workbook.close()
+
+    if not batches:
+        return pd.DataFrame(columns=columns)
+    return concat_sales_frames(batches)
@@ -0,0 +1,107 @@
+"""Multi-measure group sums by integer key codes, in place of a pandas groupby.
+
+Every rollup the endpoints run is "sum the three measures by one to three
+keys". The keys are already dictionary-encoded at load time: the ingest
+schema makes SUPPLIER, ITEM TYPE, AREA, ITEM CODE and ITEM DESCRIPTION
+categoricals, so their codes are ready-made group numbers. group_sums
+combines the codes of the keys into one group number per row (mixed radix,
+so group numbers sort like the keys) and adds each measure into its
+group's slot with np.bincount, skipping the hash table, the per-group
+Python objects and the multi-column result index a groupby builds. Integer
+keys with a small range (YEAR, MONTH) are coded by their offset from the
+minimum; any other column is factorized first.
+
+The result matches rollup's groupby(keys, observed=True, sort=True).sum():
+rows with a missing key are dropped, NaN measures count as 0, categorical
+keys keep their categories and the groups come out in key order. Sums are
+accumulated in float64 and returned in the measure's dtype; they can differ
+from pandas' (compensated) sums in the last bits only.
+"""
+import numpy as np
+import pandas as pd
+
+# Largest number of key combinations summed into a dense array; sparser keys are renumbered first
+MAX_DENSE_GROUPS = 1 << 24
+# Integer keys spanning fewer values than this are coded by offset instead of factorized
+MAX_OFFSET_RANGE = 1 << 16
+
+
+def key_codes(values):
+    """(codes, number of codes, decode(codes) -> key values) of one key column; missing is -1"""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return (values.cat.codes.to_numpy(), len(values.cat.categories),
+                lambda codes: pd.Categorical.from_codes(codes, dtype=values.dtype))
+    if pd.api.types.is_integer_dtype(values.dtype) and len(values):
+        # Small-range integers (YEAR, MONTH) are their own codes, offset by the minimum
+        array = values.to_numpy()
+        low, high = int(array.min()), int(array.max())
+        if high - low < MAX_OFFSET_RANGE:
+            return array.astype(np.intp) - low, high - low + 1, lambda codes: (codes + low).astype(array.dtype)
+    codes, uniques = pd.factorize(values, sort=True)
+    return codes, len(uniques), lambda codes: uniques.take(codes)
+
+
+def key_space(sizes):
+    """Number of possible key combinations"""
+    total = 1
+    for size in sizes:
+        total *= max(size, 1)
+    return total
+
+
+def group_numbers(codes, sizes):
+    """(slot of each row, number of slots, slots in use in key order, their codes per key).
+
+    With few enough key combinations every combination has a slot (its
+    mixed-radix number) and the rows need no renumbering; otherwise only the
+    combinations present get one.
+    """
+    total = key_space(sizes)
+    groups = codes[0].astype(np.intp)
+    for key_codes_, size in zip(codes[1:], sizes[1:]):
+        groups *= size
+        groups += key_codes_
+    if total <= max(MAX_DENSE_GROUPS, 4 * len(groups)):
+        present = np.flatnonzero(np.bincount(groups, minlength=total))
+        slots = total
+    else:
+        present, groups = np.unique(groups, return_inverse=True)
+        slots = len(present)
+    # Decode the mixed-radix group numbers back to one code per key
+    per_key, rest = [], present
+    for size in reversed(sizes[1:]):
+        per_key.append(rest % size)
+        rest = rest // size
+    per_key.append(rest)
+    return groups, slots, (present if slots == total else np.arange(slots)), per_key[::-1]
+
+
+def group_sums(frame, keys, measures):
+    """measures of frame summed by keys, as rollup's groupby would (see the module docstring).
+
+    None when the keys have too many combinations to number in int64.
+    """
+    encoded = [key_codes(frame[key]) for key in keys]
+    sizes = [size for _, size, _ in encoded]
+    if key_space(sizes) >= 1 << 62:
+        return None
+    codes = [code for code, _, _ in encoded]
+    missing = np.logical_or.reduce([code < 0 for code in codes])
+    keep = ~missing if missing.any() else None
+    if keep is not None:
+        codes = [code[keep] for code in codes]
+    groups, slots, used, per_key = group_numbers(codes, sizes)
+
+    result = {}
+    for key, (_, _, decode), key_values in zip(keys, encoded, per_key):
+        result[key] = decode(key_values)
+    for measure in measures:
+        values = frame[measure].to_numpy(dtype='float64', na_value=np.nan)
+        if keep is not None:
+            values = values[keep]
+        sums = np.bincount(groups, weights=values, minlength=slots)[used]
+        if np.isnan(sums).any():
+            # Only groups holding a NaN need it skipped; sum again without them
+            sums = np.bincount(groups, weights=np.where(np.isnan(values), 0.0, values), minlength=slots)[used]
+        result[measure] = sums.astype(frame[measure].dtype, copy=False)
+    return pd.DataFrame(result)
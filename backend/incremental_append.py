@@ -0,0 +1,111 @@
+"""Append a new batch of sales rows (typically one month) without a full reload.
+
+The new rows are written to the source (appended to the extract, or to the
+affected partitions of a partition directory) and folded into the dataset
+that is already in memory together with its maintained aggregates, producing
+a new data version. The work done is proportional to the appended rows, not
+to the history already loaded.
+
+Send a file of new rows (tab-separated, same header as the extract) to a
+running app with:
+    SALES_ADMIN_TOKEN=... python incremental_append.py new_rows.tsv [--url http://127.0.0.1:5000]
+or append it to the source directly while the app is stopped (running
+workers pick it up on their next reload check):
+    python incremental_append.py new_rows.tsv --local "../Sales data - Filtered"
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+
+import pandas as pd
+
+from partitioned_store import PartitionCatalog
+from sales_schema import apply_sales_schema
+
+APPEND_ENDPOINT = '/api/admin/append'
+
+
+def read_append_rows(source):
+    """Parse new rows given as a path or raw TSV bytes into the ingest schema"""
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    return apply_sales_schema(pd.read_csv(source, sep='\t'))
+
+
+def extract_columns(path):
+    return list(pd.read_csv(path, sep='\t', nrows=0).columns)
+
+
+def check_columns(rows, columns):
+    """Raise ValueError unless rows has every column in `columns`"""
+    missing = [col for col in columns if col not in rows.columns]
+    if missing:
+        raise ValueError(f"Appended rows are missing columns: {', '.join(missing)}")
+
+
+def append_to_extract(path, rows):
+    """Append rows to the tab-separated extract at path, in the extract's column order.
+
+    Returns the rows as written: columns the extract does not have are dropped.
+    """
+    columns = extract_columns(path)
+    check_columns(rows, columns)
+    rows = rows[columns]
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b'\n'
+        else:
+            needs_newline = False
+    with open(path, 'a', encoding='utf-8', newline='') as f:
+        if needs_newline:
+            f.write('\n')
+        rows.to_csv(f, sep='\t', index=False, header=False)
+    return rows
+
+
+def append_local(path, rows):
+    """Append rows to an extract file or a partition directory"""
+    if os.path.isdir(path):
+        PartitionCatalog.open(path).append(rows)
+    else:
+        append_to_extract(path, rows)
+
+
+def post_rows(url, path, token):
+    """Send the rows file at path to a running app's append endpoint; returns the JSON reply"""
+    with open(path, 'rb') as f:
+        body = f.read()
+    req = urllib.request.Request(url.rstrip('/') + APPEND_ENDPOINT, data=body, method='POST',
+                                 headers={'Content-Type': 'text/tab-separated-values', 'X-Admin-Token': token})
+    try:
+        with urllib.request.urlopen(req) as response:
+            return json.load(response)
+    except urllib.error.HTTPError as e:
+        return json.load(e)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Append new sales rows to the dashboard data')
+    parser.add_argument('rows', help='tab-separated file of new rows with the extract header')
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='base URL of the running app')
+    parser.add_argument('--local', metavar='SOURCE', help='append to this extract or partition directory instead')
+    args = parser.parse_args()
+
+    if args.local:
+        new_rows = read_append_rows(args.rows)
+        append_local(args.local, new_rows)
+        print(f"Appended {len(new_rows):,} rows to {args.local}")
+    else:
+        try:
+            reply = post_rows(args.url, args.rows, os.environ.get('SALES_ADMIN_TOKEN', ''))
+        except urllib.error.URLError as e:
+            print(f"Could not reach {args.url}: {e.reason}")
+            sys.exit(1)
+        print(json.dumps(reply, indent=2))
+        sys.exit(0 if 'error' not in reply else 1)
@@ -0,0 +1,100 @@
+"""Items ranked by each measure, for the top-selling and top-transfer endpoints.
+
+An ItemRanking holds the item totals for one grouping of the item columns
+and answers "the K items with the largest <measure>" by partial selection:
+np.partition finds the K-th largest value in linear time and only the
+items at or above it are sorted, instead of sorting every item. The
+leaders of each measure are selected once and kept, so later requests for
+as many items or fewer are a slice.
+
+The all-data rankings are derived structures of each dataset version,
+built from the maintained item totals and merged with appended rows like
+the other aggregates. Rankings for a period are built per request from the
+cube rollup for that period.
+"""
+import numpy as np
+
+from sales_aggregates import rollup
+from sales_dataset import derived_structure
+from sales_schema import concat_sales_frames
+
+# Structure name -> item columns it ranks
+RANKINGS = {
+    'item_ranking': ['ITEM CODE', 'ITEM DESCRIPTION'],
+    'typed_item_ranking': ['ITEM CODE', 'ITEM DESCRIPTION', 'ITEM TYPE']
+}
+# Leaders selected per measure on first use; larger requests select again
+DEFAULT_LEADERS = 100
+
+
+def top_positions(values, k):
+    """Positions of the k largest values, largest first, ties in position order"""
+    k = min(k, len(values))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    threshold = np.partition(values, len(values) - k)[len(values) - k]
+    candidates = np.flatnonzero(values >= threshold)
+    return candidates[np.lexsort((candidates, -values[candidates]))[:k]]
+
+
+def ranking_name(keys):
+    """Name of the derived ranking over keys, or None"""
+    for name, ranking_keys in RANKINGS.items():
+        if list(keys) == ranking_keys:
+            return name
+    return None
+
+
+class ItemRanking:
+    """Totals of the items grouped by keys, with the leaders of each measure"""
+
+    def __init__(self, items, keys):
+        self.keys = list(keys)
+        self.items = items.reset_index(drop=True)
+        self._values = {}
+        self._leaders = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def values(self, measure):
+        if measure not in self._values:
+            self._values[measure] = self.items[measure].to_numpy(dtype='float64', na_value=np.nan)
+        return self._values[measure]
+
+    def top(self, measure, k, positive=False):
+        """The k items with the largest measure (only those above zero if positive), largest first"""
+        leaders = self._leaders.get(measure)
+        if leaders is None or (len(leaders) < k and len(leaders) < len(self.items)):
+            leaders = top_positions(self.values(measure), max(k, DEFAULT_LEADERS))
+            self._leaders[measure] = leaders
+        positions = leaders[:k]
+        if positive:
+            positions = positions[self.values(measure)[positions] > 0]
+        return self.items.iloc[positions].reset_index(drop=True)
+
+    def positive_count(self, measure):
+        """Number of items whose measure is above zero"""
+        return int((self.values(measure) > 0).sum())
+
+    def first_positive(self, measure):
+        """First item in key order whose measure is above zero, or None"""
+        positions = np.flatnonzero(self.values(measure) > 0)
+        return self.items.iloc[positions[0]] if len(positions) else None
+
+    def appended(self, rows):
+        """Ranking with the totals of rows merged in"""
+        items = rollup(concat_sales_frames([self.items, rollup(rows, self.keys)]), self.keys)
+        return ItemRanking(items, self.keys)
+
+
+def _register(name, keys):
+    def build(dataset):
+        items = dataset.derived('item_totals')
+        return ItemRanking(rollup(items, keys), keys) if items is not None else None
+
+    derived_structure(name, append=lambda ranking, rows: ranking.appended(rows))(build)
+
+
+for _name, _keys in RANKINGS.items():
+    _register(_name, _keys)
@@ -0,0 +1,116 @@
+"""Item-by-month matrix of each measure, for per-item monthly trends.
+
+Only a small fraction of (item, month) pairs have sales, so the matrix is
+stored sparse in CSR form, sharing its structure across the three
+measures: the months of item row r are columns indices[indptr[r]:indptr[r + 1]]
+and its values are data[measure] at the same positions. An ITEM CODE -> row
+map makes fetching one item's series, or a batch of them, a dictionary
+lookup and a few slices rather than a scan of the rows.
+
+The matrix is a derived structure of each dataset version, built from the
+cube. Appended rows are summed on their own and merged into the existing
+entries, so an append costs a sort of the stored entries rather than a
+rollup of the cube.
+"""
+import numpy as np
+import pandas as pd
+
+from period_index import period_label, row_periods
+from sales_aggregates import CUBE, rollup
+from sales_dataset import derived_structure
+from sales_schema import MEASURE_COLUMNS
+
+ITEM_MONTHS = 'item_month_matrix'
+
+
+class ItemMonthMatrix:
+    """Sparse ITEM CODE x month matrix of each measure"""
+
+    def __init__(self, rows):
+        sums = rollup(rows, ['ITEM CODE', 'YEAR', 'MONTH'])
+        item_rows, codes = pd.factorize(sums['ITEM CODE'])
+        months = row_periods(sums)
+        self.months = np.unique(months)
+        self.indices = np.searchsorted(self.months, months).astype(np.int32)
+        self.data = {col: sums[col].to_numpy(dtype='float64') for col in MEASURE_COLUMNS if col in sums.columns}
+        self._index_rows({str(code): row for row, code in enumerate(codes)}, item_rows)
+
+    def _index_rows(self, rows, item_rows):
+        """Set the ITEM CODE -> row map and the row offsets from the item row of each (sorted) entry"""
+        self.indptr = np.concatenate([[0], np.cumsum(np.bincount(item_rows, minlength=len(rows)))])
+        self.rows = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def appended(self, rows):
+        """Matrix with the sums of rows added; new items get rows after the existing ones.
+
+        Entries are ordered by (item row, month), so the summed rows are
+        merged into them by binary search: matching entries are added to and
+        the others inserted, without sorting the entries again.
+        """
+        sums = rollup(rows, ['ITEM CODE', 'YEAR', 'MONTH'])
+        if len(sums) == 0:
+            return self
+        added_rows, added_codes = pd.factorize(sums['ITEM CODE'].astype(str).to_numpy(dtype=object))
+        new_codes = [code for code in added_codes if code not in self.rows]
+        rows = {**self.rows, **{code: len(self.rows) + i for i, code in enumerate(new_codes)}} if new_codes else self.rows
+        added_rows = np.array([rows[code] for code in added_codes], dtype=np.int64)[added_rows]
+
+        added_months = row_periods(sums)
+        months = np.union1d(self.months, added_months)
+        width = len(months)
+        keys = (np.repeat(np.arange(len(self.rows), dtype=np.int64), np.diff(self.indptr)) * width
+                + np.searchsorted(months, self.months)[self.indices])
+        added_keys = added_rows * width + np.searchsorted(months, added_months)
+        order = np.argsort(added_keys, kind='stable')
+        added_keys = added_keys[order]
+        at = np.searchsorted(keys, added_keys)
+        found = at < len(keys)
+        found[found] = keys[at[found]] == added_keys[found]
+
+        matrix = ItemMonthMatrix.__new__(ItemMonthMatrix)
+        matrix.months = months
+        matrix.data = {}
+        for col, values in self.data.items():
+            added = sums[col].to_numpy(dtype='float64')[order]
+            values = values.copy()
+            np.add.at(values, at[found], added[found])
+            matrix.data[col] = np.insert(values, at[~found], added[~found])
+        keys = np.insert(keys, at[~found], added_keys[~found])
+        matrix.indices = (keys % width).astype(np.int32)
+        matrix._index_rows(rows, keys // width)
+        return matrix
+
+    def columns(self, period_range=None):
+        """(first, stop) columns of the months in period_range; None means every month"""
+        if period_range is None:
+            return 0, len(self.months)
+        first = int(np.searchsorted(self.months, period_range[0], side='left'))
+        return first, max(first, int(np.searchsorted(self.months, period_range[1], side='right')))
+
+    def series(self, codes, measure, period_range=None):
+        """('YYYY-MM' labels, item x month array) of measure for codes, over the months in period_range.
+
+        Months without sales are 0; rows of codes not in the matrix are NaN.
+        """
+        first, stop = self.columns(period_range)
+        values = np.zeros((len(codes), stop - first))
+        data = self.data[measure]
+        for i, code in enumerate(codes):
+            row = self.rows.get(str(code))
+            if row is None:
+                values[i] = np.nan
+                continue
+            start, end = self.indptr[row], self.indptr[row + 1]
+            columns = self.indices[start:end]
+            keep = (columns >= first) & (columns < stop)
+            values[i, columns[keep] - first] = data[start:end][keep]
+        return [period_label(int(month)) for month in self.months[first:stop]], values
+
+
+@derived_structure(ITEM_MONTHS, append=lambda matrix, rows: matrix.appended(rows))
+def build_item_month_matrix(dataset):
+    cube = dataset.derived(CUBE)
+    return ItemMonthMatrix(cube) if {'ITEM CODE', 'YEAR', 'MONTH'} <= set(cube.columns) else None
@@ -0,0 +1,221 @@
+"""Partitioned rollups on a persistent process pool, for sources too large for one core.
+
+A request's groupby runs on one core of one worker. Once the rows requests
+roll up from (the cube, or the raw rows with SALES_CUBE=0) reach
+SALES_PARALLEL_MIN_ROWS, each dataset version also splits them into row
+partitions:
+
+    hash    by a hash of ITEM CODE, one partition per pool process (default)
+    year    one partition per YEAR
+
+chosen with SALES_PARALLEL_PARTITION. The partitions are written once per
+version as memory-mapped column files (see shared_frame) under
+<shared root>/partitions, so pool processes attach them by path and no rows
+travel with a task. A rollup then sends each pool process (keys, measures,
+period), gets back the partition's partial sums, with categorical keys as
+codes, and merges them with one more (small) rollup. Partitions whose months fall outside the period are
+skipped without a task, and each partition keeps its own PeriodIndex, so a
+period is a row slice there too.
+
+After an append the partition files are kept as they are: the appended
+rows, summed at the cube grain, are rolled up in the app process and merged
+into each result, until the next full load partitions the source again.
+If another worker has meanwhile loaded a newer version and removed these
+files, rollups report it and the caller falls back to the serial rollup.
+
+The pool has SALES_PARALLEL_WORKERS processes (default: one per core) and
+lives for the life of the app, across versions. The app runs loader and
+watcher threads, and forking a threaded process can leave a lock held in
+the child, so pool processes are not forked from the app: they come from a
+forkserver, a clean single-threaded process that has imported this module
+once. The mode is only available where forkserver is (not on Windows);
+elsewhere, and below the threshold, rollups stay serial. Partial sums are
+added up in a different order than one groupby would, so totals match the
+serial ones up to floating point rounding.
+
+Pool processes import the app's main script as __mp_main__ (as with
+spawn), so a script that starts threads or loads data at import must skip
+that there; app_stable does.
+
+How much faster than the serial rollup this is depends on the cores and
+the memory bandwidth available; measure it on the target machine with
+benchmark.py parallel.
+"""
+import copy
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from period_index import PeriodIndex, row_periods
+from sales_aggregates import CUBE, cube_enabled, cube_grain, rollup, summarize
+from sales_dataset import derived_structure
+from sales_schema import concat_sales_frames
+from shared_frame import attach_shared_frame, remove_stale_versions, shared_key, shared_root, write_shared_frame
+
+PARALLEL_PARTITIONS = 'parallel_partitions'
+PARTITION_MODES = ('hash', 'year')
+DEFAULT_MIN_ROWS = 1000000
+
+
+def parallel_workers():
+    return int(os.environ.get('SALES_PARALLEL_WORKERS', 0)) or os.cpu_count() or 1
+
+
+def parallel_min_rows():
+    return int(os.environ.get('SALES_PARALLEL_MIN_ROWS', DEFAULT_MIN_ROWS))
+
+
+def partition_mode():
+    mode = os.environ.get('SALES_PARALLEL_PARTITION', 'hash')
+    if mode not in PARTITION_MODES:
+        raise ValueError(f"SALES_PARALLEL_PARTITION must be one of {', '.join(PARTITION_MODES)}")
+    return mode
+
+
+def parallel_available():
+    return 'forkserver' in multiprocessing.get_all_start_methods()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def process_pool(workers):
+    """The persistent pool of `workers` processes, started on first use"""
+    with _pools_lock:
+        if workers not in _pools:
+            context = multiprocessing.get_context('forkserver')
+            # Pool processes fork from a server that has already imported pandas and this module
+            context.set_forkserver_preload([__name__])
+            _pools[workers] = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        return _pools[workers]
+
+
+def shutdown_pools():
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.shutdown()
+        _pools.clear()
+
+
+def partition_ids(rows, mode, count):
+    """Partition number of every row: its YEAR's position, or a hash of its ITEM CODE modulo count"""
+    if mode == 'year':
+        return np.unique(rows['YEAR'].to_numpy(), return_inverse=True)[1]
+    codes = rows['ITEM CODE']
+    if isinstance(codes.dtype, pd.CategoricalDtype):
+        # Hash each category once; missing codes (-1) land in partition 0
+        hashes = pd.util.hash_array(codes.cat.categories.astype(str).to_numpy(dtype=object))
+        return np.where(codes.cat.codes.to_numpy() >= 0, hashes[codes.cat.codes.to_numpy()] % count, 0)
+    return pd.util.hash_array(codes.astype(str).to_numpy(dtype=object)) % count
+
+
+# Partitions attached in this (pool) process: directory -> (rows, PeriodIndex)
+_attached = {}
+
+
+def _attach(directory):
+    if directory not in _attached:
+        # A new version's partitions replace the previous version's
+        version = os.path.dirname(directory)
+        for stale in [d for d in _attached if os.path.dirname(d) != version]:
+            del _attached[stale]
+        rows = attach_shared_frame(directory)
+        _attached[directory] = (rows, PeriodIndex(rows))
+    return _attached[directory]
+
+
+def partial_rollup(directory, keys, measures, period_range):
+    """Sums of one partition by keys over period_range; runs in a pool process.
+
+    Categorical keys are returned as their codes: every partition has the
+    source's categories, so only the parent needs them, not each result.
+    """
+    rows, index = _attach(directory)
+    partial = rollup(index.slice(rows, period_range), keys, measures)
+    for key in keys:
+        if isinstance(partial[key].dtype, pd.CategoricalDtype):
+            partial[key] = partial[key].cat.codes
+    return partial
+
+
+class PartitionedSource:
+    """Row partitions of one dataset version's rollup source, written for the process pool"""
+
+    def __init__(self, rows, directory, mode, workers):
+        self.mode = mode
+        self.workers = workers
+        self.rows = len(rows)
+        self.empty = rows.iloc[:0]
+        self.partitions = []
+        # Rows appended since the partitions were written, summed at the cube grain
+        self.appended_rows = None
+        self.appended_index = None
+        ids = partition_ids(rows, mode, workers)
+        for number in np.unique(ids):
+            # Raw rows come in file order; the PeriodIndex needs each partition sorted by month
+            part = rows[ids == number].sort_values(['YEAR', 'MONTH'], kind='stable').reset_index(drop=True)
+            path = os.path.join(directory, str(number))
+            write_shared_frame(part, path)
+            periods = row_periods(part)
+            self.partitions.append((path, int(periods.min()), int(periods.max())))
+
+    def appended(self, rows):
+        """Source with rows added, sharing this one's partition files"""
+        added = summarize(rows, cube_grain(rows))
+        source = copy.copy(self)
+        if self.appended_rows is not None:
+            added = summarize(concat_sales_frames([self.appended_rows, added]), cube_grain(added))
+        source.appended_rows, source.appended_index = added, PeriodIndex(added)
+        return source
+
+    def rollup(self, keys, measures=None, period_range=None):
+        """Measures summed by keys over period_range, from partial sums computed in the pool.
+
+        Returns None if the partition files have been removed.
+        """
+        paths = [path for path, first, last in self.partitions
+                 if period_range is None or (first <= period_range[1] and last >= period_range[0])]
+        pool = process_pool(self.workers)
+        futures = [pool.submit(partial_rollup, path, list(keys), measures, period_range) for path in paths]
+        try:
+            partials = [future.result() for future in futures]
+        except FileNotFoundError:
+            return None
+        if not partials:
+            merged = rollup(self.empty, keys, measures)
+        else:
+            # Merge on the codes (their order is the categories' order), then restore the categories
+            merged = rollup(pd.concat(partials, ignore_index=True), keys, measures)
+            for key in keys:
+                if isinstance(self.empty[key].dtype, pd.CategoricalDtype):
+                    merged[key] = pd.Categorical.from_codes(merged[key], dtype=self.empty[key].dtype)
+        if self.appended_rows is not None:
+            appended = rollup(self.appended_index.slice(self.appended_rows, period_range), keys, measures)
+            merged = rollup(concat_sales_frames([merged, appended]), keys, measures)
+        return merged
+
+
+def partition_source(rows, source_path, version, workers, mode):
+    """Write rows as partitions for a pool of `workers` processes, replacing older versions'"""
+    root = os.path.join(shared_root(), 'partitions')
+    os.makedirs(root, exist_ok=True)
+    key = shared_key(source_path or 'memory', version, len(rows), mode, workers)
+    source = PartitionedSource(rows, os.path.join(root, key), mode, workers)
+    remove_stale_versions(root, keep=key)
+    return source
+
+
+@derived_structure(PARALLEL_PARTITIONS, append=lambda source, rows: source.appended(rows))
+def build_parallel_partitions(dataset):
+    rows = dataset.derived(CUBE) if cube_enabled() else dataset.frame
+    min_rows, workers = parallel_min_rows(), parallel_workers()
+    if min_rows <= 0 or len(rows) < min_rows or workers < 2 or not parallel_available():
+        return None
+    if not {'YEAR', 'MONTH', 'ITEM CODE'} <= set(rows.columns):
+        return None
+    return partition_source(rows, dataset.source_path, dataset.version, workers, partition_mode())
@@ -0,0 +1,209 @@
+"""Partitioned on-disk layout of the sales data with a catalog.
+
+Instead of one extract, the data can live in a directory of per-month
+(2024-01.feather) or per-year (2024.feather) partition files plus a
+catalog.json recording each partition's row count. Appends rewrite only
+the partitions their rows fall into.
+
+Each dataset version reads every partition once, one at a time, to build
+the cube (see sales_aggregates), so the full raw frame is never in memory
+unless something asks for it (SALES_CUBE=0); period requests are then
+row slices of the cube. Partitions are not pruned by period. Besides the
+cube, the monthly rollup, seasonality, range index and item trends all
+span every month, and the dashboard asks for them on every page, so a
+period-pruned read would be followed by a full one anyway.
+
+Partition files are Feather when pyarrow is installed and TSV otherwise.
+
+Create a partition directory from an extract with:
+    python partitioned_store.py "../Sales data - Filtered" ../sales_partitions [month|year]
+"""
+import json
+import os
+import sys
+import threading
+
+import pandas as pd
+
+from sales_schema import apply_sales_schema, concat_sales_frames, read_sales_tsv
+from snapshot_cache import SNAPSHOTS_AVAILABLE
+
+CATALOG_FILE = 'catalog.json'
+PARTITION_EXTENSIONS = ('.feather', '.tsv')
+
+
+def catalog_file(directory):
+    return os.path.join(directory, CATALOG_FILE)
+
+
+def _partition_stats(frame, filename):
+    return {'file': filename, 'rows': int(len(frame))}
+
+
+def _read_partition(path):
+    if path.endswith('.feather'):
+        return pd.read_feather(path)
+    return read_sales_tsv(path)
+
+
+def _write_partition(frame, path):
+    """Write via a temp file so readers never see a partially written partition"""
+    tmp_path = path + '.tmp'
+    if path.endswith('.feather'):
+        frame.reset_index(drop=True).to_feather(tmp_path)
+    else:
+        frame.to_csv(tmp_path, sep='\t', index=False)
+    os.replace(tmp_path, path)
+
+
+def write_catalog(directory, partitions, granularity):
+    catalog = {
+        'granularity': granularity,
+        'total_rows': sum(p['rows'] for p in partitions),
+        # Partition names ('2024-01', '2024') sort by period
+        'partitions': sorted(partitions, key=lambda p: p['file'])
+    }
+    tmp_path = catalog_file(directory) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(catalog, f, indent=1)
+    os.replace(tmp_path, catalog_file(directory))
+    return catalog
+
+
+def _split_partitions(frame, granularity, extension):
+    """(filename, rows) for each partition of granularity that frame has rows for"""
+    if granularity not in ('month', 'year'):
+        raise ValueError("granularity must be 'month' or 'year'")
+    keys = ['YEAR', 'MONTH'] if granularity == 'month' else ['YEAR']
+    for key, part in frame.groupby(keys, sort=True):
+        key = key if isinstance(key, tuple) else (key,)
+        name = f'{int(key[0])}-{int(key[1]):02d}' if granularity == 'month' else f'{int(key[0])}'
+        yield name + extension, part
+
+
+def _compact(part):
+    """Each file should only carry the dictionary values it actually uses"""
+    return part.assign(**{col: part[col].cat.remove_unused_categories()
+                          for col in part.columns if isinstance(part[col].dtype, pd.CategoricalDtype)})
+
+
+def write_partitions(frame, directory, granularity='month'):
+    """Split a schema-typed frame into partition files and write their catalog"""
+    os.makedirs(directory, exist_ok=True)
+    extension = '.feather' if SNAPSHOTS_AVAILABLE else '.tsv'
+
+    partitions = []
+    for filename, part in _split_partitions(frame, granularity, extension):
+        part = _compact(part)
+        _write_partition(part, os.path.join(directory, filename))
+        partitions.append(_partition_stats(part, filename))
+    return write_catalog(directory, partitions, granularity)
+
+
+def build_catalog(directory):
+    """Scan partition files that have no catalog yet and write one"""
+    partitions = []
+    granularity = 'month'
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(PARTITION_EXTENSIONS):
+            continue
+        part = _read_partition(os.path.join(directory, filename))
+        if len(part) == 0:
+            continue
+        if len(part[['YEAR', 'MONTH']].drop_duplicates()) > 1:
+            granularity = 'year'
+        partitions.append(_partition_stats(part, filename))
+    return write_catalog(directory, partitions, granularity)
+
+
+class PartitionCatalog:
+    """Catalog of a partition directory that loads partitions on demand"""
+
+    def __init__(self, directory, catalog):
+        self.directory = directory
+        self.granularity = catalog['granularity']
+        self.partitions = catalog['partitions']
+        self.total_rows = catalog['total_rows']
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, directory):
+        path = catalog_file(directory)
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                catalog = json.load(f)
+        else:
+            print(f"No catalog in {directory}, scanning partition files")
+            catalog = build_catalog(directory)
+        return cls(directory, catalog)
+
+    def _load(self, partition):
+        filename = partition['file']
+        frame = self._loaded.get(filename)
+        if frame is None:
+            with self._lock:
+                if filename not in self._loaded:
+                    self._loaded[filename] = apply_sales_schema(
+                        _read_partition(os.path.join(self.directory, filename)))
+                frame = self._loaded[filename]
+        return frame
+
+    def iter_partitions(self):
+        """Yield each partition's rows in turn without keeping the ones not already loaded"""
+        for partition in self.partitions:
+            frame = self._loaded.get(partition['file'])
+            if frame is None:
+                frame = apply_sales_schema(_read_partition(os.path.join(self.directory, partition['file'])))
+            yield frame
+
+    def load_all(self):
+        return concat_sales_frames([self._load(p) for p in self.partitions])
+
+    def columns(self):
+        """Columns of the partitions, or None if there are none"""
+        return list(self._load(self.partitions[0]).columns) if self.partitions else None
+
+    def append(self, rows):
+        """Add schema-typed rows to the directory and return the updated catalog.
+
+        Only the partitions the rows fall into are rewritten (an existing
+        partition is read, extended and replaced); the catalog is
+        rewritten last. Partitions already loaded here are handed to the new
+        catalog unless they changed. Columns the partitions do not have are
+        dropped from rows.
+        """
+        columns = self.columns()
+        if columns is not None:
+            missing = [col for col in columns if col not in rows.columns]
+            if missing:
+                raise ValueError(f"Appended rows are missing columns: {', '.join(missing)}")
+            rows = rows[columns]
+        by_file = {p['file']: p for p in self.partitions}
+        extension = os.path.splitext(self.partitions[0]['file'])[1] if self.partitions else (
+            '.feather' if SNAPSHOTS_AVAILABLE else '.tsv')
+        changed = {}
+        for filename, part in _split_partitions(rows, self.granularity, extension):
+            if filename in by_file:
+                part = concat_sales_frames([self._load(by_file[filename]), part])
+            part = _compact(part)
+            _write_partition(part, os.path.join(self.directory, filename))
+            by_file[filename] = _partition_stats(part, filename)
+            changed[filename] = part
+
+        updated = PartitionCatalog(self.directory, write_catalog(self.directory, list(by_file.values()),
+                                                                 self.granularity))
+        updated._loaded = {**{name: frame for name, frame in self._loaded.items() if name not in changed},
+                           **changed}
+        return updated
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print(__doc__)
+        sys.exit(1)
+    source, target = sys.argv[1], sys.argv[2]
+    granularity = sys.argv[3] if len(sys.argv) > 3 else 'month'
+    written = write_partitions(read_sales_tsv(source), target, granularity)
+    print(f"Wrote {len(written['partitions'])} {granularity} partitions "
+          f"({written['total_rows']:,} rows) to {target}")
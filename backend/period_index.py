@@ -0,0 +1,91 @@
+"""Period parsing and row offsets for frames sorted by (YEAR, MONTH).
+
+The frames the endpoints read (the cube and the monthly rollup) come out of
+a sorted groupby with YEAR and MONTH as the leading keys, so the rows of any
+run of months are contiguous. A PeriodIndex records where each month starts,
+which turns filtering to a month, MTD, YTD or any month range into a binary
+search over the few dozen months plus a zero-copy row slice, instead of
+building full-length boolean masks on every request.
+
+Periods are given as:
+    ALL (or empty)          all data
+    MTD / YTD               current month / current year up to this month
+    YYYY                    one calendar year
+    YYYY-MM                 one month
+    YYYY-MM:YYYY-MM         an inclusive month range
+"""
+import re
+from datetime import datetime
+
+import numpy as np
+
+_MONTH = r'(\d{4})-(\d{1,2})'
+
+
+def period_number(year, month):
+    """Months since year 0, so (year, month) ranges compare as plain integers"""
+    return int(year) * 12 + int(month) - 1
+
+
+def parse_period(period, today=None):
+    """(first, last) month numbers (see period_number) covered by period, None for all data.
+
+    Raises ValueError for a period that is not in one of the forms above.
+    """
+    value = (period or 'ALL').strip().upper()
+    today = today or datetime.now()
+    if value == 'ALL':
+        return None
+    if value == 'MTD':
+        current = period_number(today.year, today.month)
+        return current, current
+    if value == 'YTD':
+        return period_number(today.year, 1), period_number(today.year, today.month)
+    if re.fullmatch(r'\d{4}', value):
+        return period_number(value, 1), period_number(value, 12)
+
+    match = re.fullmatch(f'{_MONTH}(?::{_MONTH})?', value)
+    if match is None or not all(1 <= int(m) <= 12 for m in match.group(2, 4) if m is not None):
+        raise ValueError(f"Invalid period '{period}': use ALL, MTD, YTD, YYYY, YYYY-MM or YYYY-MM:YYYY-MM")
+    first = period_number(match.group(1), match.group(2))
+    last = period_number(match.group(3), match.group(4)) if match.group(3) else first
+    if last < first:
+        raise ValueError(f"Invalid period '{period}': range ends before it starts")
+    return first, last
+
+
+def period_label(number):
+    """'YYYY-MM' of a month number"""
+    return f'{number // 12}-{number % 12 + 1:02d}'
+
+
+def row_periods(frame):
+    """Month number of every row of frame"""
+    return frame['YEAR'].to_numpy(dtype='int32') * 12 + frame['MONTH'].to_numpy(dtype='int32') - 1
+
+
+class PeriodIndex:
+    """First row of each month in a frame sorted by (YEAR, MONTH)"""
+
+    def __init__(self, frame):
+        periods = row_periods(frame)
+        if len(periods) > 1 and (np.diff(periods) < 0).any():
+            raise ValueError('PeriodIndex needs a frame sorted by YEAR, MONTH')
+        self.months, self.starts = np.unique(periods, return_index=True)
+        self.rows = len(periods)
+
+    def _row_at(self, position):
+        return int(self.starts[position]) if position < len(self.months) else self.rows
+
+    def bounds(self, first, last):
+        """(start, stop) row positions of months first..last"""
+        start = self._row_at(np.searchsorted(self.months, first, side='left'))
+        stop = self._row_at(np.searchsorted(self.months, last, side='right'))
+        return start, max(start, stop)
+
+    def slice(self, frame, period_range):
+        """Rows of frame (the frame this index was built on) in period_range; None means all rows"""
+        if period_range is None:
+            return frame
+        start, stop = self.bounds(*period_range)
+        return frame.iloc[start:stop]
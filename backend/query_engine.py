@@ -0,0 +1,227 @@
+"""Ad-hoc aggregation queries over the sales cube, served by /api/query.
+
+A query names the dimensions to group by, measures with an aggregation
+(sum, mean or count), optional filters and a sort and top-N limit:
+
+    GET /api/query?dimensions=SUPPLIER&measures=RETAIL SALES:sum,RETAIL SALES:mean
+        &item_type=WINE,BEER&period=2025-01:2025-06&sort=-retail_sales_sum&limit=10
+
+POST takes the same fields as a JSON object, with lists in place of the
+comma-separated strings. Column names are case-insensitive and may use
+underscores (item_type). Filters: supplier, item_type, area, item_code and
+period (see period_index.parse_period). sort names a result column, with a
+leading '-' for descending; the default is the first measure, descending.
+
+The result is column-oriented like the other endpoints: one list per
+dimension and measure under its snake_case name (supplier,
+retail_sales_sum, ...), plus the query description and row counts.
+
+Execution never touches the raw rows. The caller passes the cube already
+sliced to the period through its PeriodIndex; value filters are evaluated on
+the categorical codes; only the dimension, measure and count columns are
+carried into the groupby. Means and counts come from the COUNT columns the
+cube keeps next to each sum, so they match the raw rows exactly.
+
+Queries are validated before they run and bounded: at most MAX_DIMENSIONS
+group-by columns, MAX_MEASURES measures, MAX_FILTER_VALUES values per filter
+and MAX_LIMIT result rows, and a query matching more than
+SALES_QUERY_MAX_ROWS cube rows is refused before grouping.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from period_index import parse_period
+from sales_aggregates import CUBE_GRAIN
+from sales_schema import MEASURE_COLUMNS, count_column
+
+AGGREGATIONS = ('sum', 'mean', 'count')
+FILTERS = {'supplier': 'SUPPLIER', 'item_type': 'ITEM TYPE', 'area': 'AREA', 'item_code': 'ITEM CODE'}
+QUERY_FIELDS = {'dimensions', 'measures', 'period', 'sort', 'limit', *FILTERS}
+INTEGER_DIMENSIONS = {'YEAR', 'MONTH'}
+
+MAX_DIMENSIONS = 4
+MAX_MEASURES = 9
+MAX_FILTER_VALUES = 500
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 5000
+DEFAULT_MAX_ROWS = 5000000
+
+
+class QueryError(ValueError):
+    """A query that is malformed or over its cost limits"""
+
+
+def max_scan_rows():
+    return int(os.environ.get('SALES_QUERY_MAX_ROWS', DEFAULT_MAX_ROWS))
+
+
+def column_name(name):
+    """'item_type' / 'Item Type' -> 'ITEM TYPE'"""
+    return str(name).strip().upper().replace('_', ' ')
+
+
+def result_label(column, aggregation=None):
+    """Name of a result column: 'ITEM TYPE' -> 'item_type', ('RETAIL SALES', 'sum') -> 'retail_sales_sum'"""
+    label = column.lower().replace(' ', '_')
+    return f'{label}_{aggregation}' if aggregation else label
+
+
+def _as_list(value, field):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [part.strip() for part in value.split(',') if part.strip()]
+    if isinstance(value, (list, tuple)):
+        return [str(part).strip() for part in value if str(part).strip()]
+    raise QueryError(f"'{field}' must be a list or a comma-separated string")
+
+
+def _parse_measure(spec):
+    column, _, aggregation = spec.rpartition(':') if ':' in spec else (spec, ':', 'sum')
+    column, aggregation = column_name(column), aggregation.strip().lower()
+    if column not in MEASURE_COLUMNS:
+        raise QueryError(f"Unknown measure '{column}': use one of {', '.join(MEASURE_COLUMNS)}")
+    if aggregation not in AGGREGATIONS:
+        raise QueryError(f"Unknown aggregation '{aggregation}': use one of {', '.join(AGGREGATIONS)}")
+    return column, aggregation
+
+
+def parse_query(params):
+    """Validate request args or a JSON body into a normalized query; raises QueryError"""
+    params = params if params is not None else {}
+    if not hasattr(params, 'get'):
+        raise QueryError('The query must be a JSON object')
+    unknown = sorted(set(params) - QUERY_FIELDS)
+    if unknown:
+        raise QueryError(f"Unknown query fields: {', '.join(unknown)}")
+
+    dimensions = [column_name(d) for d in _as_list(params.get('dimensions'), 'dimensions')]
+    for dimension in dimensions:
+        if dimension not in CUBE_GRAIN:
+            raise QueryError(f"Unknown dimension '{dimension}': use one of {', '.join(CUBE_GRAIN)}")
+    if len(set(dimensions)) != len(dimensions) or len(dimensions) > MAX_DIMENSIONS:
+        raise QueryError(f'Use at most {MAX_DIMENSIONS} distinct dimensions')
+
+    measures = [_parse_measure(m) for m in _as_list(params.get('measures'), 'measures')] or [('RETAIL SALES', 'sum')]
+    if len(set(measures)) != len(measures) or len(measures) > MAX_MEASURES:
+        raise QueryError(f'Use at most {MAX_MEASURES} distinct measures')
+
+    filters = {}
+    for field, column in FILTERS.items():
+        values = _as_list(params.get(field), field)
+        if len(values) > MAX_FILTER_VALUES:
+            raise QueryError(f"Use at most {MAX_FILTER_VALUES} values for '{field}'")
+        if values:
+            filters[column] = sorted(set(values))
+
+    period = str(params.get('period') or 'ALL').strip()
+    try:
+        parse_period(period)
+    except ValueError as e:
+        raise QueryError(str(e))
+
+    labels = [result_label(d) for d in dimensions] + [result_label(*m) for m in measures]
+    sort = str(params.get('sort') or '-' + labels[len(dimensions)]).strip()
+    descending = sort.startswith('-')
+    sort = sort.lstrip('-+').lower()
+    if sort not in labels:
+        raise QueryError(f"Cannot sort by '{sort}': use one of {', '.join(labels)}")
+
+    try:
+        limit = int(params.get('limit') or DEFAULT_LIMIT)
+    except (TypeError, ValueError):
+        raise QueryError("'limit' must be an integer")
+    if not 1 <= limit <= MAX_LIMIT:
+        raise QueryError(f"'limit' must be between 1 and {MAX_LIMIT}")
+
+    return {'dimensions': dimensions, 'measures': measures, 'filters': filters, 'period': period,
+            'sort': sort, 'descending': descending, 'limit': limit}
+
+
+def query_key(query):
+    """Canonical string of a parsed query and the months its period resolves to, for result caching"""
+    return json.dumps({**query, 'months': parse_period(query['period'])}, sort_keys=True)
+
+
+def _value_mask(values, wanted):
+    """Boolean mask of rows whose value is in wanted, on the categorical codes where possible"""
+    categorical = isinstance(values.dtype, pd.CategoricalDtype)
+    domain = values.cat.categories if categorical else values
+    if pd.api.types.is_numeric_dtype(domain):
+        # Filter values arrive as strings; numeric ITEM CODEs compare as numbers
+        wanted = pd.to_numeric(pd.Series(wanted), errors='coerce').dropna().to_numpy()
+    if categorical:
+        codes = values.cat.categories.get_indexer(pd.Index(wanted).unique())
+        return np.isin(values.cat.codes.to_numpy(), codes[codes >= 0])
+    return values.isin(wanted).to_numpy()
+
+
+def run_query(query, rows):
+    """Execute a parsed query on cube rows already restricted to its period"""
+    dimensions = query['dimensions']
+    measure_columns = list(dict.fromkeys(column for column, _ in query['measures']))
+    needed = dimensions + list(query['filters']) + measure_columns
+    missing = [column for column in dict.fromkeys(needed) if column not in rows.columns]
+    if missing:
+        raise QueryError(f"{', '.join(missing)} not in the loaded data")
+
+    # Filters first, on codes, so no other column is touched for rows that drop out
+    mask = None
+    for column, wanted in query['filters'].items():
+        keep = _value_mask(rows[column], wanted)
+        mask = keep if mask is None else mask & keep
+    matched = int(mask.sum()) if mask is not None else len(rows)
+    if matched > max_scan_rows():
+        raise QueryError(f'Query matches {matched:,} rows, over the limit of {max_scan_rows():,}; '
+                         'narrow the period or add filters')
+
+    counts = [count_column(column) for column in measure_columns]
+    has_counts = all(column in rows.columns for column in counts)
+    frame = rows[dimensions + measure_columns + (counts if has_counts else [])]
+    if mask is not None:
+        frame = frame[mask]
+
+    keys = dimensions or np.zeros(len(frame), dtype=np.int8)
+    grouped = frame.groupby(keys, observed=True, sort=True)
+    sums = grouped[measure_columns].sum()
+    # Without a cube (raw rows) the counts are taken directly
+    value_counts = grouped[counts].sum() if has_counts else grouped[measure_columns].count().set_axis(counts, axis=1)
+
+    result = pd.DataFrame(index=sums.index)
+    for column, aggregation in query['measures']:
+        total, count = sums[column], value_counts[count_column(column)]
+        if aggregation == 'sum':
+            result[result_label(column, aggregation)] = total
+        elif aggregation == 'count':
+            result[result_label(column, aggregation)] = count
+        else:
+            result[result_label(column, aggregation)] = total / count.where(count > 0)
+    result = result.reset_index(drop=not dimensions)
+    result.columns = [result_label(c) if c in dimensions else c for c in result.columns]
+
+    total_groups = len(result)
+    result = result.sort_values(query['sort'], ascending=not query['descending'], kind='stable')
+    result = result.head(query['limit'])
+
+    response = {
+        'dimensions': [result_label(d) for d in dimensions],
+        'measures': [result_label(*m) for m in query['measures']],
+        'period': query['period'],
+        'filters': {result_label(column): values for column, values in query['filters'].items()},
+        'matched_rows': matched,
+        'total_groups': total_groups,
+        'row_count': len(result),
+        'truncated': total_groups > len(result)
+    }
+    for dimension in dimensions:
+        label = result_label(dimension)
+        convert = int if dimension in INTEGER_DIMENSIONS else str
+        response[label] = [convert(x) for x in result[label].tolist()]
+    for column, aggregation in query['measures']:
+        label = result_label(column, aggregation)
+        convert = int if aggregation == 'count' else float
+        response[label] = [None if pd.isna(x) else convert(x) for x in result[label].tolist()]
+    return response
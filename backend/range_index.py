@@ -0,0 +1,137 @@
+"""Prefix sums over the month axis for month-range totals and rolling windows, served by /api/range_totals.
+
+"Total of a measure between month A and month B", overall or for one
+supplier, item type or area, used to be a masked groupby per question. The
+index lays the months out on a gap-free axis from the first month with data
+to the last and keeps, for each measure, a matrix of cumulative sums: one
+row for the overall total and one per value of each dimension in
+RANGE_DIMENSIONS. A range total is then prefix[last + 1] - prefix[first],
+and the N-month moving sum ending at each month is the same subtraction
+shifted by N, all constant time per value and month whatever the range.
+
+Months outside the axis hold no sales, so ranges are clipped to it. A
+moving window that would start before the first month with data is
+incomplete and is returned as None.
+
+The index is a derived structure of each dataset version, built from the
+cube when the data is published. Appended rows are summed on their own and
+their prefix sums added to the existing ones, extending the axis and the
+dimension values as needed.
+"""
+import numpy as np
+
+from period_index import period_label, row_periods
+from sales_aggregates import CUBE, rollup
+from sales_dataset import derived_structure
+from sales_schema import MEASURE_COLUMNS
+
+RANGE_INDEX = 'range_index'
+RANGE_DIMENSIONS = ['SUPPLIER', 'ITEM TYPE', 'AREA']
+
+
+class RangeIndex:
+    """Cumulative monthly sums of each measure, overall and per dimension value"""
+
+    def __init__(self, rows):
+        periods = row_periods(rows)
+        self.first, self.last = int(periods.min()), int(periods.max())
+        self.measures = [col for col in MEASURE_COLUMNS if col in rows.columns]
+        # Dimension (None for the overall totals) -> value -> row, and -> measure -> prefix matrix
+        self.rows = {None: {'': 0}}
+        monthly = rollup(rows, ['YEAR', 'MONTH'])
+        self.prefix = {None: self._prefix(monthly, np.zeros(len(monthly), dtype=np.intp), 1)}
+        for dimension in RANGE_DIMENSIONS:
+            if dimension not in rows.columns:
+                continue
+            sums = rollup(rows, [dimension, 'YEAR', 'MONTH'])
+            values = sums[dimension].astype(str)
+            self.rows[dimension] = {value: row for row, value in enumerate(values.unique())}
+            self.prefix[dimension] = self._prefix(sums, values.map(self.rows[dimension]).to_numpy(),
+                                                  len(self.rows[dimension]))
+
+    def appended(self, rows):
+        """Index with the sums of rows added"""
+        periods = row_periods(rows)
+        if len(periods) == 0:
+            return self
+        index = RangeIndex.__new__(RangeIndex)
+        index.first, index.last = min(self.first, int(periods.min())), max(self.last, int(periods.max()))
+        index.measures = self.measures
+        index.rows, index.prefix = {}, {}
+        # Prefix column j of the new axis is the sum before month index.first + j; before the old axis
+        # that is 0 and after it the old grand total
+        columns = np.clip(np.arange(index.last - index.first + 2) + index.first - self.first,
+                          0, self.last - self.first + 1)
+        for dimension, values in self.rows.items():
+            if dimension is None:
+                sums = rollup(rows, ['YEAR', 'MONTH'])
+                index.rows[None] = values
+                positions = np.zeros(len(sums), dtype=np.intp)
+            else:
+                sums = rollup(rows, [dimension, 'YEAR', 'MONTH'])
+                labels = sums[dimension].astype(str)
+                new_values = [value for value in labels.unique() if value not in values]
+                index.rows[dimension] = {**values, **{value: len(values) + i for i, value in enumerate(new_values)}}
+                positions = labels.map(index.rows[dimension]).to_numpy()
+            added = index._prefix(sums, positions, len(index.rows[dimension]))
+            index.prefix[dimension] = {}
+            for measure in self.measures:
+                prefix = self.prefix[dimension][measure][:, columns]
+                if len(prefix) < len(index.rows[dimension]):
+                    prefix = np.vstack([prefix, np.zeros((len(index.rows[dimension]) - len(prefix), len(columns)))])
+                index.prefix[dimension][measure] = prefix + added[measure]
+        return index
+
+    def _prefix(self, sums, rows, count):
+        """measure -> (count x months + 1) cumulative sums of the monthly sums placed at (rows, month)"""
+        months = row_periods(sums) - self.first
+        prefix = {}
+        for measure in self.measures:
+            values = np.zeros((count, self.last - self.first + 1))
+            values[rows, months] = sums[measure].to_numpy(dtype='float64')
+            prefix[measure] = np.concatenate([np.zeros((count, 1)), np.cumsum(values, axis=1)], axis=1)
+        return prefix
+
+    def dimension_rows(self, dimension, values=None):
+        """(values found, their rows, values not found) of a dimension; every value when values is None"""
+        rows = self.rows[dimension]
+        if values is None:
+            return list(rows), np.fromiter(rows.values(), dtype=np.intp, count=len(rows)), []
+        found = [value for value in values if value in rows]
+        return found, np.array([rows[value] for value in found], dtype=np.intp), \
+            [value for value in values if value not in rows]
+
+    def clip(self, period_range):
+        """(first, last) months of period_range on the axis, or None when they do not overlap"""
+        first, last = period_range if period_range is not None else (self.first, self.last)
+        first, last = max(first, self.first), min(last, self.last)
+        return (first, last) if first <= last else None
+
+    def totals(self, measure, period_range, dimension=None, rows=None):
+        """Total of measure over period_range for each row (the overall total when dimension is None)"""
+        prefix = self.prefix[dimension][measure]
+        prefix = prefix[rows] if rows is not None else prefix
+        clipped = self.clip(period_range)
+        if clipped is None:
+            return np.zeros(len(prefix))
+        return prefix[:, clipped[1] - self.first + 1] - prefix[:, clipped[0] - self.first]
+
+    def rolling(self, measure, window, period_range, dimension=None, rows=None):
+        """('YYYY-MM' labels, rows x months moving sums) of the window months ending at each month of
+        period_range; NaN where the window starts before the first month with data"""
+        prefix = self.prefix[dimension][measure]
+        prefix = prefix[rows] if rows is not None else prefix
+        clipped = self.clip(period_range)
+        if clipped is None:
+            return [], np.zeros((len(prefix), 0))
+        ends = np.arange(clipped[0], clipped[1] + 1) - self.first + 1
+        starts = ends - window
+        sums = prefix[:, ends] - prefix[:, np.maximum(starts, 0)]
+        sums[:, starts < 0] = np.nan
+        return [period_label(int(month)) for month in range(clipped[0], clipped[1] + 1)], sums
+
+
+@derived_structure(RANGE_INDEX, append=lambda index, rows: index.appended(rows))
+def build_range_index(dataset):
+    cube = dataset.derived(CUBE)
+    return RangeIndex(cube) if len(cube) and {'YEAR', 'MONTH'} <= set(cube.columns) else None
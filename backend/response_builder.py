@@ -0,0 +1,31 @@
+"""Column-at-a-time builders for JSON response payloads.
+
+Endpoints that return a list of records, or labels derived from several
+columns, used to walk the frame row by row (iterrows, apply(axis=1)),
+which builds a Series per row. These helpers convert each column once
+with vectorized operations and only zip the finished Python lists into
+records, so the cost per row is a dict, not a Series. They produce
+exactly the values the row-wise code did.
+"""
+
+
+def truncate_labels(values, width):
+    """values as strings, cut to width characters plus '...' when longer"""
+    labels = values.astype(str)
+    return labels.where(labels.str.len() <= width, labels.str[:width] + '...')
+
+
+def item_labels(codes, descriptions, width):
+    """'<code> - <description>' labels with the description truncated to width"""
+    return codes.astype(str) + ' - ' + truncate_labels(descriptions, width)
+
+
+def column_values(values, kind):
+    """A column as a list of plain Python kind values (str, float or int)"""
+    return values.astype(kind).tolist()
+
+
+def records(frame, fields):
+    """frame as a list of dicts; fields maps each output key to (column, kind)"""
+    columns = [column_values(frame[column], kind) for column, kind in fields.values()]
+    return [dict(zip(fields, values)) for values in zip(*columns)]
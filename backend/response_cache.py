@@ -0,0 +1,65 @@
+"""Whole-response caching for read-only API endpoints.
+
+The data behind every GET endpoint only changes when a new dataset version
+is loaded, so the serialized JSON body of a successful response is kept
+under (route, query args, data version) and replayed as-is: a repeated
+dashboard load is a dictionary lookup, with no pandas and no JSON encoding.
+Query args are normalized by sorting them by name, so ?a=1&b=2 and
+?b=2&a=1 share an entry. A ?period is also keyed by the months it resolves
+to, so relative periods (MTD, YTD) miss once the calendar month changes.
+
+Only 200 JSON responses without a top-level 'error' and without
+Cache-Control: no-store are cached; errors, responses that embed one (a
+view marks those no-store) and responses computed while no data is loaded
+are recomputed next time. A new
+version misses by construction, and the apps drop the older versions'
+entries when they publish it. Cached responses carry X-Cache: HIT, computed
+ones X-Cache: MISS.
+"""
+import functools
+
+from flask import Response, current_app, request
+
+from period_index import parse_period
+
+
+def request_key():
+    """(route, query args sorted by name, months of ?period) of the current request"""
+    try:
+        months = parse_period(request.args.get('period'))
+    except ValueError:
+        # Rejected by the endpoint; the raw value is key enough
+        months = None
+    return request.path, tuple(sorted(request.args.items(multi=True))), months
+
+
+def cacheable(response):
+    if response.status_code != 200 or not response.is_json or response.is_streamed or response.cache_control.no_store:
+        return False
+    payload = response.get_json(silent=True)
+    return not (isinstance(payload, dict) and 'error' in payload)
+
+
+def cached_response(cache, version):
+    """Serve a GET view's responses from cache (a VersionedLRUCache) for the data version()"""
+    def decorate(view):
+        @functools.wraps(view)
+        def serve(*args, **kwargs):
+            if request.method != 'GET':
+                return view(*args, **kwargs)
+            key = request_key()
+            entry = cache.get(version(), key)
+            if entry is not None:
+                body, mimetype = entry
+                response = Response(body, mimetype=mimetype)
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            response = current_app.make_response(view(*args, **kwargs))
+            if cacheable(response):
+                # The version read after the view: computing it may have loaded the data
+                body = response.get_data()
+                cache.put(version(), key, (body, response.mimetype), size=len(body))
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return serve
+    return decorate
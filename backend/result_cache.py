@@ -0,0 +1,76 @@
+"""LRU cache of computed results, keyed by dataset version.
+
+A result is only valid for the dataset version it was computed from, so
+entries are stored under (version, key). Requests pinned to a new version
+miss, and entries of older versions are never hit again and age out of the
+LRU order, or are dropped at once by retain() when a new version is
+published.
+
+The cache holds at most maxsize entries and, when maxbytes is set, at most
+maxbytes of entry sizes as given to put(); least recently used entries are
+evicted first.
+"""
+import threading
+from collections import OrderedDict
+
+
+class VersionedLRUCache:
+    """Thread-safe LRU mapping of (version, key) to results, with hit/miss counters"""
+
+    def __init__(self, maxsize=256, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        # (version, key) -> (value, size)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, version, key):
+        """The cached result, or None"""
+        with self._lock:
+            entry = self._entries.get((version, key))
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end((version, key))
+            self.hits += 1
+            return entry[0]
+
+    def put(self, version, key, value, size=0):
+        """Cache value, whose size counts against maxbytes; values larger than maxbytes are not kept"""
+        if self.maxsize <= 0 or (self.maxbytes is not None and size > self.maxbytes):
+            return
+        with self._lock:
+            previous = self._entries.pop((version, key), None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[(version, key)] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.maxsize or (self.maxbytes is not None and self._bytes > self.maxbytes):
+                self._bytes -= self._entries.popitem(last=False)[1][1]
+
+    def retain(self, version):
+        """Drop the entries of every other version"""
+        with self._lock:
+            for stale in [entry for entry in self._entries if entry[0] != version]:
+                self._bytes -= self._entries.pop(stale)[1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'maxsize': self.maxsize,
+                'bytes': self._bytes,
+                'maxbytes': self.maxbytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
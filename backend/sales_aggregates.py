@@ -0,0 +1,181 @@
+"""Pre-aggregated cube of the sales data and the aggregates maintained from it.
+
+Every endpoint only needs the three measures summed by some combination of
+YEAR, MONTH, ITEM TYPE, SUPPLIER, AREA and ITEM CODE (with its description).
+The cube holds those sums (and the count of values behind each) at exactly
+that grain and is built once per
+dataset version, so answering a request means rolling up the cube, whose
+size is bounded by the number of distinct key combinations rather than by
+the number of raw rows.
+
+The smaller maintained aggregates (monthly, supplier, item type, item and
+area totals) are rollups of the cube kept alongside it; find_aggregate picks
+the smallest one that can answer a grouping. All of them are frames in the
+same schema as the sales rows, with rows for missing keys kept
+(dropna=False), so rolling one up by some of its keys gives exactly what
+grouping the raw rows by those keys would.
+
+Both the cube and the monthly rollup stay sorted by (YEAR, MONTH) and carry a
+PeriodIndex, so restricting either to a period is a row slice.
+
+At a fine grain the cube can be nearly as large as the raw rows, so with
+SALES_SHARED_MMAP=1 it is shared between workers like the raw frame (see
+shared_frame): the first worker to need a version's cube builds and writes
+it under <shared root>/cubes, and the others map it read-only. A cube
+updated by an append stays private to the worker that appended.
+
+The monthly rollup, shared by all the trend endpoints, is the monthly totals
+with a TOTAL_SALES column, a 'YYYY-MM' PERIOD label and the grand totals of
+every measure, computed once per version.
+
+The cube and the maintained aggregates are registered as derived structures
+with an append function: when rows are appended (SalesDataset.appended) the
+new rows alone are summed and merged in. Aggregates keyed by month (the cube
+and the monthly totals) are sorted by it, so only their rows from the first
+appended month on are grouped again and the earlier months are copied as
+they are; appending the latest month regroups that month, not the history.
+The others are regrouped whole, but they are bounded by the number of items,
+suppliers, areas or item types rather than by rows.
+"""
+import os
+
+import numpy as np
+
+from group_kernel import group_sums
+from period_index import PeriodIndex, row_periods
+from sales_dataset import derived_structure
+from sales_schema import MEASURE_COLUMNS, concat_sales_frames, count_column
+from shared_frame import load_shared_frame, shared_enabled, shared_key, shared_root
+
+CUBE = 'sales_cube'
+CUBE_INDEX = 'sales_cube_index'
+MONTHLY_ROLLUP = 'monthly_rollup'
+CUBE_GRAIN = ['YEAR', 'MONTH', 'ITEM TYPE', 'SUPPLIER', 'AREA', 'ITEM CODE', 'ITEM DESCRIPTION']
+
+# Smallest first: find_aggregate answers from the first one that fits
+MAINTAINED_AGGREGATES = {
+    'item_type_totals': ['ITEM TYPE'],
+    'area_totals': ['AREA'],
+    'monthly_totals': ['YEAR', 'MONTH'],
+    'supplier_totals': ['SUPPLIER'],
+    'item_totals': ['ITEM CODE', 'ITEM DESCRIPTION', 'ITEM TYPE']
+}
+
+
+def cube_enabled():
+    """Whether endpoints answer from the cube; SALES_CUBE=0 makes every request group the raw rows"""
+    return os.environ.get('SALES_CUBE', '1') != '0'
+
+
+def summarize(frame, keys):
+    """Measures of frame summed by keys, keeping missing keys; None if a key column is absent.
+
+    Each sum comes with its '<measure> COUNT' column so means and counts roll
+    up exactly: the counts are taken from raw rows, or added up when frame
+    is itself a summary.
+    """
+    if any(key not in frame.columns for key in keys):
+        return None
+    measures = [col for col in MEASURE_COLUMNS if col in frame.columns]
+    counts = [count_column(col) for col in measures]
+    grouped = frame.groupby(keys, observed=True, dropna=False, sort=True)
+    if all(col in frame.columns for col in counts):
+        return grouped[measures + counts].sum().reset_index()
+    summary = grouped[measures].agg(['sum', 'count'])
+    summary.columns = [col if how == 'sum' else count_column(col) for col, how in summary.columns]
+    return summary[measures + counts].reset_index()
+
+
+def rollup(frame, keys, measures=None):
+    """Measures summed by keys with missing keys dropped, as a plain groupby on the rows would.
+
+    The sums are computed on the key codes by group_kernel, falling back to
+    the groupby itself only for keys too many to number.
+    """
+    measures = measures or [col for col in MEASURE_COLUMNS if col in frame.columns]
+    summed = group_sums(frame, list(keys), measures)
+    if summed is None:
+        summed = frame.groupby(keys, observed=True, sort=True)[measures].sum().reset_index()
+    return summed
+
+
+def cube_grain(frame):
+    """The cube grain restricted to the columns frame has (a folded frame may lack some)"""
+    return [col for col in CUBE_GRAIN if col in frame.columns]
+
+
+def find_aggregate(keys):
+    """Name of the first (smallest) maintained aggregate whose key covers keys, or None"""
+    for name, aggregate_keys in MAINTAINED_AGGREGATES.items():
+        if set(keys) <= set(aggregate_keys):
+            return name
+    return None
+
+
+def _merge(summary, rows, keys):
+    added = summarize(rows, keys)
+    if keys[:2] != ['YEAR', 'MONTH'] or len(summary) == 0 or len(added) == 0:
+        return summarize(concat_sales_frames([summary, added]), keys)
+    # Sorted by month: months before the first appended one are unchanged
+    split = int(np.searchsorted(row_periods(summary), row_periods(added).min()))
+    merged = summarize(concat_sales_frames([summary.iloc[split:], added]), keys)
+    return concat_sales_frames([summary.iloc[:split], merged])
+
+
+def _append_to_cube(cube, rows):
+    return _merge(cube, rows, [col for col in CUBE_GRAIN if col in cube.columns])
+
+
+def _cube_of(dataset):
+    if dataset.catalog is not None and not dataset.frame_loaded:
+        # Sum one partition at a time, then combine the (much smaller) partial cubes
+        partials = concat_sales_frames([summarize(part, cube_grain(part))
+                                        for part in dataset.catalog.iter_partitions()])
+        return summarize(partials, cube_grain(partials))
+    return summarize(dataset.frame, cube_grain(dataset.frame))
+
+
+@derived_structure(CUBE, append=_append_to_cube)
+def build_cube(dataset):
+    if not shared_enabled() or dataset.source_path is None or dataset.version is None:
+        return _cube_of(dataset)
+    # Kept apart from the raw frames: each directory only holds the latest version of its sources
+    key = shared_key(dataset.source_path, dataset.version, len(dataset), *CUBE_GRAIN)
+    cube, _ = load_shared_frame(key, lambda: _cube_of(dataset), root=os.path.join(shared_root(), 'cubes'))
+    return cube
+
+
+@derived_structure(CUBE_INDEX)
+def build_cube_index(dataset):
+    cube = dataset.derived(CUBE)
+    return PeriodIndex(cube) if {'YEAR', 'MONTH'} <= set(cube.columns) else None
+
+
+def _register(name, keys):
+    def build(dataset):
+        return summarize(dataset.derived(CUBE), keys)
+
+    def append(summary, rows):
+        return _merge(summary, rows, keys)
+
+    derived_structure(name, append=append)(build)
+
+
+for _name, _keys in MAINTAINED_AGGREGATES.items():
+    _register(_name, _keys)
+
+
+def monthly_rollup_of(rows):
+    """{'months': per-month totals sorted by month with TOTAL_SALES and PERIOD, 'index': their
+    PeriodIndex, 'totals': grand totals}"""
+    months = rollup(rows, ['YEAR', 'MONTH'])
+    months['TOTAL_SALES'] = months['RETAIL SALES'] + months['RETAIL TRANSFERS'] + months['WAREHOUSE SALES']
+    months['PERIOD'] = months['YEAR'].astype(str) + '-' + months['MONTH'].astype(str).str.zfill(2)
+    totals = {col: float(months[col].sum()) for col in MEASURE_COLUMNS + ['TOTAL_SALES']}
+    return {'months': months, 'index': PeriodIndex(months), 'totals': totals}
+
+
+@derived_structure(MONTHLY_ROLLUP)
+def build_monthly_rollup(dataset):
+    summary = dataset.derived('monthly_totals')
+    return monthly_rollup_of(summary) if summary is not None else None
@@ -0,0 +1,158 @@
+"""Versioned, immutable snapshots of the sales data.
+
+A SalesDataset bundles one loaded frame with a version string and the
+structures derived from it. Reloads build a complete new SalesDataset in the
+background and then replace the app's reference to it in a single
+assignment, so a request that pinned the old object keeps a consistent view
+until it finishes, and the old frame is freed once the last such request
+drops it.
+
+Derived structures are registered with @derived_structure and built lazily
+on first use, or eagerly by warm() before a new version is published. A
+structure registered with an `append` function can be updated from just the
+appended rows when new data is folded in with SalesDataset.appended.
+
+The version is a fingerprint of the source file (size and mtime) plus the
+mtime of an optional "<source>.reload" marker. Every gunicorn worker polls
+the same files, so all workers converge on the same version; touching the
+marker forces a rebuild everywhere without changing the data file.
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+from sales_schema import concat_sales_frames
+
+RELOAD_MARKER_SUFFIX = '.reload'
+
+# name -> function(dataset) building the structure
+DERIVED_BUILDERS = {}
+# name -> function(structure, appended_rows) returning the updated structure
+DERIVED_APPENDERS = {}
+
+
+def derived_structure(name, append=None):
+    """Register a builder for a structure derived from each dataset version.
+
+    `append(structure, rows)`, if given, returns the structure updated with
+    newly appended rows; structures without it are rebuilt on next use.
+    """
+    def register(build):
+        DERIVED_BUILDERS[name] = build
+        if append is not None:
+            DERIVED_APPENDERS[name] = append
+        return build
+    return register
+
+
+def source_version(path):
+    """Fingerprint of the source file and its reload marker, identical in every worker"""
+    stat = os.stat(path)
+    parts = [os.path.abspath(path), str(stat.st_size), str(stat.st_mtime_ns)]
+    marker = path + RELOAD_MARKER_SUFFIX
+    if os.path.exists(marker):
+        parts.append(str(os.stat(marker).st_mtime_ns))
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()[:12]
+
+
+def touch_reload_marker(path):
+    """Ask every worker watching `path` to rebuild on its next poll"""
+    marker = path + RELOAD_MARKER_SUFFIX
+    with open(marker, 'a', encoding='utf-8'):
+        pass
+    os.utime(marker, None)
+
+
+class SalesDataset:
+    """One version of the sales frame and everything derived from it.
+
+    A dataset backed by a PartitionCatalog loads its full frame only when
+    something asks for it; the cube is built from the catalog one partition
+    at a time. Rows appended to a loaded frame are kept as separate chunks
+    and concatenated with it the first time the frame is asked for.
+    """
+
+    def __init__(self, frame=None, version=None, source_path=None, load_info=None, catalog=None):
+        self._frame = frame
+        # Appended row chunks not concatenated into _frame yet
+        self._chunks = []
+        self.catalog = catalog
+        self.version = version
+        self.source_path = source_path
+        self.load_info = load_info or {}
+        self.loaded_at = datetime.now().isoformat()
+        self._derived = {}
+        # Reentrant: a builder may ask for another derived structure
+        self._lock = threading.RLock()
+        self._frame_lock = threading.Lock()
+
+    @property
+    def frame(self):
+        if self._frame is None or self._chunks:
+            with self._frame_lock:
+                if self._chunks:
+                    self._frame = concat_sales_frames([self._frame, *self._chunks])
+                    self._chunks = []
+                elif self._frame is None:
+                    self._frame = self.catalog.load_all() if self.catalog is not None else pd.DataFrame()
+        return self._frame
+
+    @property
+    def frame_loaded(self):
+        return self._frame is not None or bool(self._chunks)
+
+    def __len__(self):
+        if not self.frame_loaded and self.catalog is not None:
+            return self.catalog.total_rows
+        if self._chunks:
+            # Under the lock, so a concurrent concatenation is not counted twice
+            with self._frame_lock:
+                return sum(len(chunk) for chunk in [self._frame, *self._chunks] if chunk is not None)
+        return len(self.frame)
+
+    def derived(self, name):
+        """Return the derived structure `name`, building it on first use"""
+        try:
+            return self._derived[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._derived:
+                self._derived[name] = DERIVED_BUILDERS[name](self)
+            return self._derived[name]
+
+    def warm(self):
+        """Build every registered derived structure; returns build time per structure"""
+        timings = {}
+        for name in list(DERIVED_BUILDERS):
+            start = time.perf_counter()
+            self.derived(name)
+            timings[name] = round(time.perf_counter() - start, 3)
+        return timings
+
+    def appended(self, rows, version, catalog=None, load_info=None):
+        """New dataset version with `rows` added to this one.
+
+        Derived structures already built here that have an append function
+        are carried over updated from `rows` alone; the rest are rebuilt
+        lazily. A catalog-backed dataset whose frame is not loaded yet stays
+        lazy, reading from the updated `catalog`.
+
+        A loaded frame is not copied: the new dataset shares it and keeps
+        `rows` as one more chunk, concatenated only when its frame is asked
+        for (the cube does not need it). Structures without an append
+        function, such as the cube's period index, are rebuilt from the
+        updated structures they derive from.
+        """
+        new_dataset = SalesDataset(self._frame, version=version, source_path=self.source_path,
+                                   load_info=load_info or self.load_info, catalog=catalog)
+        if self.frame_loaded or catalog is None:
+            new_dataset._chunks = [*self._chunks, rows]
+        for name, structure in list(self._derived.items()):
+            if name in DERIVED_APPENDERS and structure is not None:
+                new_dataset._derived[name] = DERIVED_APPENDERS[name](structure, rows)
+        return new_dataset
@@ -0,0 +1,182 @@
+"""Ingest schema for the sales frame, shared by every loader.
+
+The raw extract parses SUPPLIER, ITEM DESCRIPTION, ITEM TYPE and AREA as
+Python object strings and YEAR/MONTH as int64. Converting the repeated strings
+to categoricals and the calendar columns to small integers shrinks the frame
+several times over and makes the SUPPLIER / ITEM CODE groupbys much faster.
+
+Categorical group keys must be grouped with observed=True, otherwise pandas
+builds the cartesian product of all categories.
+
+Set SALES_FLOAT32=1 to also store the three measures as float32.
+
+Run `python sales_schema.py <path>` for a before/after memory and groupby
+latency report.
+"""
+import numbers
+import os
+import sys
+import time
+
+import pandas as pd
+
+CATEGORY_COLUMNS = ['SUPPLIER', 'ITEM CODE', 'ITEM DESCRIPTION', 'ITEM TYPE', 'AREA']
+INTEGER_COLUMNS = {'YEAR': 'int16', 'MONTH': 'int8'}
+MEASURE_COLUMNS = ['RETAIL SALES', 'RETAIL TRANSFERS', 'WAREHOUSE SALES']
+
+# Summaries carry '<measure> COUNT', the number of non-null values summed
+COUNT_SUFFIX = ' COUNT'
+
+# Bump when the conversions below change so cached snapshots are rebuilt
+SCHEMA_VERSION = 2
+
+
+def count_column(measure):
+    return measure + COUNT_SUFFIX
+
+
+def float32_measures():
+    return os.environ.get('SALES_FLOAT32', '0') == '1'
+
+
+def schema_variant():
+    """Tag for snapshot keys describing how the frame was prepared"""
+    return f"schema-v{SCHEMA_VERSION}{'-f32' if float32_measures() else ''}"
+
+
+def apply_sales_schema(data, float32=None):
+    """Convert a freshly loaded sales frame to the compact ingest schema in place and return it.
+
+    Columns that are missing are skipped. ITEM CODE stays numeric when it
+    was parsed as numbers, becomes int64 when every code read as text is a
+    whole number, and is otherwise categorical text (see item_code_text).
+    """
+    if float32 is None:
+        float32 = float32_measures()
+
+    for col in CATEGORY_COLUMNS:
+        if col in data.columns and not isinstance(data[col].dtype, pd.CategoricalDtype):
+            if col == 'ITEM CODE':
+                if not pd.api.types.is_numeric_dtype(data[col]):
+                    data[col] = typed_item_codes(data[col])
+                continue
+            data[col] = data[col].astype('category')
+
+    for col, dtype in INTEGER_COLUMNS.items():
+        if col in data.columns and data[col].notna().all():
+            data[col] = data[col].astype(dtype)
+
+    for col in MEASURE_COLUMNS:
+        if col in data.columns:
+            data[col] = pd.to_numeric(data[col], errors='coerce').astype('float32' if float32 else 'float64')
+
+    return data
+
+
+def _code_text(value):
+    if isinstance(value, numbers.Real) and not isinstance(value, bool) and float(value).is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def item_code_text(values):
+    """ITEM CODE values as categorical text, whole numbers written without a decimal part.
+
+    A text column can also hold numbers (pandas infers each chunk of a file
+    separately), so 315, 315.0 and '315' all become the category '315'.
+    Missing codes stay missing.
+    """
+    uniques = pd.unique(values.dropna())
+    return values.map({value: _code_text(value) for value in uniques}).astype('category')
+
+
+def typed_item_codes(values):
+    """Non-numeric ITEM CODE values as int64 if all are whole numbers, else as item_code_text"""
+    uniques = pd.Series(pd.unique(values.dropna()), dtype=object)
+    numeric = pd.to_numeric(uniques, errors='coerce')
+    if len(values) > 0 and values.notna().all() and numeric.notna().all() and (numeric % 1 == 0).all():
+        return pd.to_numeric(values).astype('int64')
+    return item_code_text(values)
+
+
+def align_item_codes(frames):
+    """ITEM CODE stays numeric only if it is numeric in every frame"""
+    if not any(isinstance(frame['ITEM CODE'].dtype, pd.CategoricalDtype) for frame in frames if 'ITEM CODE' in frame):
+        return frames
+    return [frame.assign(**{'ITEM CODE': item_code_text(frame['ITEM CODE'])})
+            if 'ITEM CODE' in frame and not isinstance(frame['ITEM CODE'].dtype, pd.CategoricalDtype) else frame
+            for frame in frames]
+
+
+def concat_sales_frames(frames):
+    """Concatenate schema-typed frames, unioning categories so categoricals stay categorical"""
+    frames = [frame for frame in frames if frame is not None]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    frames = align_item_codes(frames)
+    for col in CATEGORY_COLUMNS:
+        if all(col in frame.columns and isinstance(frame[col].dtype, pd.CategoricalDtype) for frame in frames):
+            # The union of the categories alone, sorted; usually the large frame already has all of
+            # them and only the others are recoded
+            categories = frames[0][col].cat.categories
+            for frame in frames[1:]:
+                categories = categories.union(frame[col].cat.categories)
+            if not categories.is_monotonic_increasing:
+                categories = categories.sort_values()
+            frames = [frame if frame[col].cat.categories.equals(categories)
+                      else frame.assign(**{col: frame[col].cat.set_categories(categories)}) for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def read_sales_tsv(path):
+    """Parse the tab-separated extract and apply the ingest schema"""
+    return apply_sales_schema(pd.read_csv(path, sep='\t'))
+
+
+def memory_mb(data):
+    return round(data.memory_usage(deep=True).sum() / 1024 / 1024, 2)
+
+
+def _best_of(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 2)
+
+
+def _groupby_timings(data):
+    measures = [col for col in MEASURE_COLUMNS if col in data.columns]
+    timings = {}
+    if 'SUPPLIER' in data.columns:
+        timings['groupby_supplier_ms'] = _best_of(
+            lambda: data.groupby('SUPPLIER', observed=True)[measures].sum())
+    if 'ITEM CODE' in data.columns and 'ITEM DESCRIPTION' in data.columns:
+        timings['groupby_item_ms'] = _best_of(
+            lambda: data.groupby(['ITEM CODE', 'ITEM DESCRIPTION'], observed=True)['RETAIL SALES'].sum())
+    return timings
+
+
+def schema_report(raw):
+    """Compare memory and groupby latency of a raw frame against its optimized copy"""
+    optimized = apply_sales_schema(raw.copy())
+    return {
+        'rows': len(raw),
+        'before': {'memory_mb': memory_mb(raw), **_groupby_timings(raw)},
+        'after': {'memory_mb': memory_mb(optimized), **_groupby_timings(optimized)},
+        'dtypes': {col: str(dtype) for col, dtype in optimized.dtypes.items()}
+    }
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else '../Sales data - Filtered'
+    report = schema_report(pd.read_csv(path, sep='\t'))
+    print(f"Rows: {report['rows']:,}")
+    for key in report['before']:
+        print(f"{key:22s} before: {report['before'][key]:>10}  after: {report['after'][key]:>10}")
+    for col, dtype in report['dtypes'].items():
+        print(f"  {col:20s} {dtype}")
@@ -0,0 +1,87 @@
+"""Point-budget downsampling for scatter plots of every row.
+
+A scatter of one point per row grows with the data until the browser can
+no longer draw it. sample_points picks at most max_points rows that keep
+the shape of the cloud and its extremes:
+
+- Outliers first: points more than OUTLIER_FENCE interquartile ranges from
+  the median on either axis, most extreme first, up to OUTLIER_SHARE of the
+  budget. They are kept as they are, so they stay visible however large
+  the data grows.
+- Then a stratified sample of the rest over a grid of the value range.
+  Every occupied cell keeps at least one point, so sparse regions do not
+  vanish, and the remaining budget is shared between cells in proportion
+  to their counts, so dense regions stay dense. Each kept point carries the
+  number of rows it stands for.
+
+Everything is vectorized NumPy, and the random draw within each cell uses a
+fixed seed, so the same data and budget always give the same points.
+"""
+import numpy as np
+
+OUTLIER_FENCE = 3.0
+OUTLIER_SHARE = 0.1
+
+
+def outlier_scores(x, y):
+    """Distance of each point from the median, in interquartile ranges, along its farther axis"""
+    scores = np.zeros(len(x))
+    for values in (x, y):
+        q1, median, q3 = np.percentile(values, [25, 50, 75])
+        # Mostly-constant columns (all-zero transfers) have no IQR; use the standard deviation
+        spread = (q3 - q1) or values.std() or 1.0
+        scores = np.maximum(scores, np.abs(values - median) / spread)
+    return scores
+
+
+def cell_index(values, cells):
+    """Column of each value in `cells` equal-width bins over its range"""
+    low, high = values.min(), values.max()
+    if high <= low:
+        return np.zeros(len(values), dtype=np.intp)
+    return np.minimum(((values - low) / (high - low) * cells).astype(np.intp), cells - 1)
+
+
+def stratified_sample(x, y, budget, rng):
+    """(positions, weights) of at most budget points, stratified over a grid of cells"""
+    # At most budget / 2 cells, so the one point every occupied cell keeps uses half the budget at most
+    grid = max(1, int(np.sqrt(budget / 2)))
+    cells = cell_index(x, grid) * grid + cell_index(y, grid)
+    counts = np.bincount(cells, minlength=grid * grid)
+    occupied = counts > 0
+    quota = np.zeros_like(counts)
+    quota[occupied] = 1 + (budget - occupied.sum()) * counts[occupied] // len(x)
+
+    # Rank each point within its cell in random order and keep the first quota of each
+    order = np.lexsort((rng.random(len(x)), cells))
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    ranks = np.arange(len(x)) - starts[cells[order]]
+    positions = np.sort(order[ranks < quota[cells[order]]])
+    kept = cells[positions]
+    return positions, counts[kept] / np.minimum(quota, counts)[kept]
+
+
+def sample_points(x, y, max_points, seed=0):
+    """(sampled positions, their weights, outlier positions) of at most max_points points of x, y.
+
+    Points with a missing coordinate are dropped. When every point fits in
+    the budget all of them are returned, with weight 1 and no outliers set
+    apart.
+    """
+    x = np.asarray(x, dtype='float64')
+    y = np.asarray(y, dtype='float64')
+    finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if len(finite) <= max_points:
+        return finite, np.ones(len(finite)), np.empty(0, dtype=np.intp)
+
+    x, y = x[finite], y[finite]
+    scores = outlier_scores(x, y)
+    outlier_count = min(int(max_points * OUTLIER_SHARE), int((scores > OUTLIER_FENCE).sum()))
+    outliers = np.argpartition(-scores, outlier_count)[:outlier_count] if outlier_count else np.empty(0, dtype=np.intp)
+    rest = np.ones(len(x), dtype=bool)
+    rest[outliers] = False
+    rest = np.flatnonzero(rest)
+
+    positions, weights = stratified_sample(x[rest], y[rest], max_points - outlier_count,
+                                           np.random.default_rng(seed))
+    return finite[rest[positions]], weights, finite[np.sort(outliers)]
@@ -0,0 +1,134 @@
+"""Year-over-year, trailing-twelve-month and seasonal figures per sales channel.
+
+Built from the monthly rollup, once per dataset version, and updated from
+just the appended rows' monthly sums after an append. The months are
+laid out on a gap-free axis from the first month with data to the last
+(months without sales are 0), and each channel keeps the prefix sums of its
+monthly values, so the total of any run of months is one subtraction. Every
+YoY comparison (a month or any window against the same months a year
+earlier) and every trailing-twelve-month total is therefore O(1), however
+long the history.
+
+Seasonal indices use the classical ratio-to-moving-average method: each
+month's value is divided by the centred 12-month moving average around it
+(itself two prefix-sum lookups), which takes the trend out; the ratios are
+averaged per calendar month and scaled so the months average 100. A
+calendar month only gets an index once some occurrence of it has six months
+of data on either side; until then it is None.
+
+Comparisons that reach before the first month with data, or whose earlier
+total is not positive, are None rather than a made-up figure.
+"""
+import numpy as np
+
+from period_index import row_periods
+from sales_aggregates import MONTHLY_ROLLUP, monthly_rollup_of
+from sales_dataset import derived_structure
+
+SEASONALITY = 'seasonality'
+
+# Response key -> monthly rollup column
+CHANNELS = {
+    'retail_sales': 'RETAIL SALES',
+    'retail_transfers': 'RETAIL TRANSFERS',
+    'warehouse_sales': 'WAREHOUSE SALES',
+    'total_sales': 'TOTAL_SALES'
+}
+
+
+class Seasonality:
+    """Prefix sums and seasonal indices of each channel over the months of one dataset version"""
+
+    def __init__(self, months):
+        periods = row_periods(months)
+        self.first, self.last = int(periods.min()), int(periods.max())
+        self.sums = {}
+        self.indices = {}
+        for column in CHANNELS.values():
+            values = np.zeros(self.last - self.first + 1)
+            values[periods - self.first] = months[column].to_numpy(dtype='float64')
+            self.sums[column] = np.concatenate([[0.0], np.cumsum(values)])
+            self.indices[column] = self._seasonal_indices(column, values)
+
+    def appended(self, rows):
+        """Figures with the monthly sums of rows added, over an axis extended to cover their months"""
+        months = monthly_rollup_of(rows)['months']
+        if len(months) == 0:
+            return self
+        periods = row_periods(months)
+        seasonality = Seasonality.__new__(Seasonality)
+        seasonality.first = min(self.first, int(periods.min()))
+        seasonality.last = max(self.last, int(periods.max()))
+        # Prefix position j of the new axis sums the months before first + j: nothing before the
+        # old axis, everything after it
+        positions = np.clip(np.arange(seasonality.last - seasonality.first + 2) + seasonality.first - self.first,
+                            0, self.last - self.first + 1)
+        seasonality.sums = {}
+        seasonality.indices = {}
+        for column in CHANNELS.values():
+            values = np.zeros(seasonality.last - seasonality.first + 1)
+            values[periods - seasonality.first] = months[column].to_numpy(dtype='float64')
+            seasonality.sums[column] = self.sums[column][positions] + np.concatenate([[0.0], np.cumsum(values)])
+            seasonality.indices[column] = seasonality._seasonal_indices(column, np.diff(seasonality.sums[column]))
+        return seasonality
+
+    def total(self, column, first, last):
+        """Sum of column over months first..last (month numbers), None unless all are covered"""
+        if first < self.first or last > self.last or last < first:
+            return None
+        sums = self.sums[column]
+        return float(sums[last - self.first + 1] - sums[first - self.first])
+
+    def growth(self, column, first, last):
+        """% change of the total over months first..last against the same months a year earlier"""
+        current, previous = self.total(column, first, last), self.total(column, first - 12, last - 12)
+        if current is None or previous is None or previous <= 0:
+            return None
+        return (current / previous - 1) * 100
+
+    def ttm(self, column, month):
+        """Trailing-twelve-month total up to and including month"""
+        return self.total(column, month - 11, month)
+
+    def ttm_growth(self, column, month):
+        return self.growth(column, month - 11, month)
+
+    def _seasonal_indices(self, column, values):
+        sums = self.sums[column]
+        positions = np.arange(6, len(values) - 6)
+        if len(positions) == 0:
+            return [None] * 12
+        # Centred 12-month average: the mean of the 12-month windows ending 5 and 6 months later
+        centred = (sums[positions + 6] - sums[positions - 6] + sums[positions + 7] - sums[positions - 5]) / 24
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratios = np.where(centred > 0, values[positions] / centred, np.nan)
+        calendar = (self.first + positions) % 12
+        indices = np.full(12, np.nan)
+        for month in range(12):
+            month_ratios = ratios[(calendar == month) & ~np.isnan(ratios)]
+            if len(month_ratios):
+                indices[month] = month_ratios.mean()
+        if np.isnan(indices).all():
+            return [None] * 12
+        indices = indices / np.nanmean(indices) * 100
+        return [None if np.isnan(index) else float(index) for index in indices]
+
+    def seasonal_index(self, column, month):
+        """Seasonal index of the calendar month of month (a month number)"""
+        return self.indices[column][month % 12]
+
+    def channel_summary(self, column, first, last):
+        """YoY, trailing-twelve-month and seasonal figures of one channel for the window first..last"""
+        return {
+            'year_over_year_growth': self.growth(column, first, last),
+            'latest_month_yoy_growth': self.growth(column, last, last),
+            'ttm_total': self.ttm(column, last),
+            'ttm_growth': self.ttm_growth(column, last),
+            'seasonal_indices': self.indices[column]
+        }
+
+
+@derived_structure(SEASONALITY, append=lambda seasonality, rows: seasonality.appended(rows))
+def build_seasonality(dataset):
+    monthly = dataset.derived(MONTHLY_ROLLUP)
+    return Seasonality(monthly['months']) if monthly is not None and len(monthly['months']) else None
@@ -0,0 +1,146 @@
+"""Memory-mapped copy of the prepared sales frame shared by all gunicorn workers.
+
+Each worker normally parses and holds its own copy of the frame, which is why
+the app runs with a single worker. With SALES_SHARED_MMAP=1 the first worker
+to start writes the prepared (schema-typed) frame once as one .npy file per
+column; every worker then attaches those files read-only with numpy memmaps.
+The pages live in the OS page cache and are shared, so resident memory stays
+roughly flat as workers are added. The cube is shared the same way (see
+sales_aggregates); the smaller structures derived from it are still built
+by every worker.
+
+Categorical columns are stored as their integer codes plus a JSON list of
+categories, and are rebuilt with Categorical.from_codes without copying the
+codes. Only one worker builds a given version; the others wait on a lock
+file and attach when it is complete.
+
+SALES_SHARED_DIR selects where the shared files live (default: the system
+temp directory).
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+META_FILE = 'meta.json'
+LOCK_SUFFIX = '.lock'
+
+
+def shared_enabled():
+    return os.environ.get('SALES_SHARED_MMAP', '0') == '1'
+
+
+def shared_root():
+    return os.environ.get('SALES_SHARED_DIR') or os.path.join(tempfile.gettempdir(), 'sales-shared')
+
+
+def _digest(value, length):
+    return hashlib.sha1(value.encode('utf-8')).hexdigest()[:length]
+
+
+def shared_key(source_path, *parts):
+    """Directory name for one prepared version of a source: '<source hash>-<version hash>'"""
+    source = os.path.abspath(source_path)
+    return f"{_digest(source, 8)}-{_digest('|'.join([source, *map(str, parts)]), 12)}"
+
+
+def is_complete(directory):
+    return os.path.exists(os.path.join(directory, META_FILE))
+
+
+def write_shared_frame(frame, directory):
+    """Write frame column by column into directory, which appears atomically once complete"""
+    tmp_dir = f'{directory}.{os.getpid()}.tmp'
+    os.makedirs(tmp_dir, exist_ok=True)
+    columns = []
+    for i, col in enumerate(frame.columns):
+        values = frame[col]
+        if not (isinstance(values.dtype, pd.CategoricalDtype) or pd.api.types.is_numeric_dtype(values)
+                or pd.api.types.is_bool_dtype(values)):
+            # Object arrays cannot be memory-mapped, so any remaining text is dictionary-encoded
+            values = values.astype('category')
+        entry = {'name': col, 'file': f'{i}.npy'}
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            np.save(os.path.join(tmp_dir, entry['file']), np.asarray(values.cat.codes))
+            entry['categories'] = values.cat.categories.tolist()
+        else:
+            np.save(os.path.join(tmp_dir, entry['file']), values.to_numpy())
+        columns.append(entry)
+    with open(os.path.join(tmp_dir, META_FILE), 'w', encoding='utf-8') as f:
+        json.dump({'rows': len(frame), 'columns': columns}, f)
+    try:
+        os.rename(tmp_dir, directory)
+    except OSError:
+        # Another worker published the same version first
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def attach_shared_frame(directory):
+    """Build a DataFrame whose columns are read-only memmaps of the shared files"""
+    with open(os.path.join(directory, META_FILE), 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    data = {}
+    for entry in meta['columns']:
+        values = np.load(os.path.join(directory, entry['file']), mmap_mode='r', allow_pickle=False)
+        if 'categories' in entry:
+            values = pd.Categorical.from_codes(values, categories=pd.Index(entry['categories']))
+        data[entry['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def remove_stale_versions(root, keep):
+    """Delete older versions of the same source.
+
+    Workers still mapping them keep their pages until they drop the frame.
+    """
+    prefix = keep.split('-', 1)[0] + '-'
+    for name in os.listdir(root):
+        path = os.path.join(root, name)
+        if name != keep and name.startswith(prefix) and os.path.isdir(path) and not name.endswith('.tmp'):
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def load_shared_frame(key, build, wait_seconds=600, root=None):
+    """Attach the shared frame for key, building it with build() if no worker has yet.
+
+    `root` (default: shared_root()) is the directory the versions of one
+    kind of frame are kept in. Returns (frame, method) where method is
+    'attached' or 'built'.
+    """
+    root = root or shared_root()
+    os.makedirs(root, exist_ok=True)
+    target = os.path.join(root, key)
+    if is_complete(target):
+        return attach_shared_frame(target), 'attached'
+
+    lock_path = target + LOCK_SUFFIX
+    try:
+        lock_fd = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        # Another worker is building this version; wait for it to finish
+        deadline = time.time() + wait_seconds
+        while time.time() < deadline:
+            if is_complete(target):
+                return attach_shared_frame(target), 'attached'
+            time.sleep(0.5)
+        print(f"Timed out waiting for {target}, building it in this worker")
+        if os.path.exists(lock_path):
+            os.remove(lock_path)
+        lock_fd = os.open(lock_path, os.O_CREAT | os.O_WRONLY)
+
+    try:
+        if not is_complete(target):
+            frame = build()
+            write_shared_frame(frame, target)
+            del frame
+            remove_stale_versions(root, keep=key)
+    finally:
+        os.close(lock_fd)
+        if os.path.exists(lock_path):
+            os.remove(lock_path)
+    return attach_shared_frame(target), 'built'
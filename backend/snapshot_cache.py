@@ -0,0 +1,137 @@
+"""Binary columnar snapshots of the tab-separated sales extract.
+
+Parsing the "Sales data - Filtered" text file is the slowest part of a cold
+start. The first load writes a Feather copy next to the source file and later
+starts read that instead. A snapshot is keyed by the source path, size and
+mtime, so it is rebuilt automatically whenever the TSV changes. The key is
+stored in the Feather file's own schema metadata, so data and key are
+replaced together by one rename and can never come from different writers.
+
+Set SALES_SNAPSHOT=0 to always parse the text file.
+"""
+import json
+import os
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+    SNAPSHOTS_AVAILABLE = True
+except ImportError:
+    SNAPSHOTS_AVAILABLE = False
+
+SNAPSHOT_SUFFIX = '.feather'
+# Schema metadata entry holding the snapshot's source key
+KEY_METADATA = b'sales_snapshot_key'
+
+
+def snapshots_enabled():
+    """Snapshots need pyarrow and can be switched off with SALES_SNAPSHOT=0"""
+    return SNAPSHOTS_AVAILABLE and os.environ.get('SALES_SNAPSHOT', '1') != '0'
+
+
+def source_key(path, variant=''):
+    """Identity of a source file version: absolute path, size and mtime"""
+    stat = os.stat(path)
+    return {
+        'source': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'variant': variant
+    }
+
+
+def snapshot_path(path):
+    return path + SNAPSHOT_SUFFIX
+
+
+def read_tsv(path):
+    return pd.read_csv(path, sep='\t')
+
+
+def _read_snapshot(path, key):
+    """The snapshot at path as a frame if it was written for key, else None"""
+    try:
+        with pa.OSFile(path, 'rb') as source:
+            reader = pa.ipc.open_file(source)
+            stored = (reader.schema.metadata or {}).get(KEY_METADATA)
+            if stored is None or json.loads(stored) != key:
+                return None
+            return reader.read_all().to_pandas()
+    except FileNotFoundError:
+        return None
+
+
+def _write_snapshot(data, path, key, info=None):
+    """Write data with its key via a temp file so concurrent workers never see a partial snapshot.
+
+    A failure is recorded as info['snapshot_error'], so it shows up in the
+    load info reported by /health instead of only in the log.
+    """
+    tmp_snapshot = f'{path}.{os.getpid()}.tmp'
+    try:
+        table = pa.Table.from_pandas(data.reset_index(drop=True), preserve_index=False)
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}),
+                                               KEY_METADATA: json.dumps(key).encode('utf-8')})
+        feather.write_feather(table, tmp_snapshot)
+        os.replace(tmp_snapshot, path)
+        return True
+    except Exception as e:
+        print(f"Could not write snapshot {path}: {e}")
+        if info is not None:
+            info['snapshot_error'] = f'{type(e).__name__}: {e}'
+        if os.path.exists(tmp_snapshot):
+            os.remove(tmp_snapshot)
+        return False
+
+
+def write_snapshot(path, data, key, info=None):
+    """Store `data` as the snapshot of the source version `key` (see source_key) of `path`.
+
+    Used when the caller already holds the frame for a new source version
+    (e.g. after appending rows), so the next load skips parsing. The caller
+    takes the key while it knows the file matches data; by the time the
+    snapshot is written the file may have changed again. A failure is
+    recorded in `info` if given.
+    """
+    if not snapshots_enabled():
+        return False
+    return _write_snapshot(data, snapshot_path(path), key, info)
+
+
+def load_table(path, reader=read_tsv, variant=''):
+    """Load a source file through its snapshot when one matches the current file version.
+
+    `reader` parses the source when there is no usable snapshot; `variant` is
+    mixed into the key so a change in how the frame is prepared invalidates
+    old snapshots. Returns (data, info) where info records which path was taken
+    and how long it took, plus 'snapshot_error' if the snapshot could not be
+    written. Raises FileNotFoundError if `path` does not exist.
+    """
+    start = time.perf_counter()
+    key = source_key(path, variant)
+    snapshot = snapshot_path(path)
+
+    if snapshots_enabled():
+        try:
+            data = _read_snapshot(snapshot, key)
+            if data is not None:
+                seconds = time.perf_counter() - start
+                print(f"Loaded snapshot {snapshot} in {seconds:.2f}s")
+                return data, {'method': 'snapshot', 'path': snapshot, 'seconds': round(seconds, 3)}
+        except Exception as e:
+            print(f"Snapshot {snapshot} unreadable, parsing source instead: {e}")
+
+    data = reader(path)
+    parse_seconds = time.perf_counter() - start
+    info = {'method': 'parse', 'path': path, 'seconds': round(parse_seconds, 3)}
+
+    if snapshots_enabled() and _write_snapshot(data, snapshot, key, info):
+        info['snapshot_written'] = snapshot
+        print(f"Parsed {path} in {parse_seconds:.2f}s, wrote snapshot {snapshot} "
+              f"in {time.perf_counter() - start - parse_seconds:.2f}s")
+    else:
+        print(f"Parsed {path} in {parse_seconds:.2f}s (no snapshot)")
+    return data, info
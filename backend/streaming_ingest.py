@@ -0,0 +1,106 @@
+"""Out-of-core ingest that folds the sales extract into aggregates while reading.
+
+Every endpoint only needs sums of the three measures by some combination of
+YEAR, MONTH, SUPPLIER, ITEM TYPE, ITEM CODE and AREA, so the raw rows never
+have to be held in memory at once. In streaming mode the TSV is read in
+chunks and each chunk is summed at a configurable grain. The partial sums are
+combined every COMBINE_CHUNKS chunks, so the running aggregate is regrouped
+once per batch of chunks rather than once per chunk. Peak memory is then
+bounded by one chunk plus the aggregate and a batch of partial sums instead
+of the whole file.
+
+Configuration (environment variables):
+    SALES_INGEST_MODE=stream        enable the chunked reader (default: full)
+    SALES_INGEST_GRAIN=YEAR,MONTH,...  grouping columns to keep
+    SALES_INGEST_CHUNKSIZE=250000   rows per chunk
+
+Endpoints that group by a column left out of the grain will report an error,
+so coarser grains are only suitable for deployments that do not need them.
+"""
+import os
+import time
+
+import pandas as pd
+
+from sales_aggregates import summarize
+from sales_schema import MEASURE_COLUMNS, apply_sales_schema, count_column, schema_variant
+
+DEFAULT_GRAIN = ['YEAR', 'MONTH', 'SUPPLIER', 'ITEM CODE', 'ITEM DESCRIPTION', 'ITEM TYPE', 'AREA']
+TEXT_COLUMNS = ['SUPPLIER', 'ITEM CODE', 'ITEM DESCRIPTION', 'ITEM TYPE', 'AREA']
+DEFAULT_CHUNKSIZE = 250000
+# Chunk partial sums kept before they are combined with the running aggregate
+COMBINE_CHUNKS = 8
+
+
+def streaming_enabled():
+    return os.environ.get('SALES_INGEST_MODE', 'full').lower() == 'stream'
+
+
+def configured_grain():
+    value = os.environ.get('SALES_INGEST_GRAIN', '')
+    grain = [col.strip() for col in value.split(',') if col.strip()]
+    return grain or list(DEFAULT_GRAIN)
+
+
+def configured_chunksize():
+    return int(os.environ.get('SALES_INGEST_CHUNKSIZE', DEFAULT_CHUNKSIZE))
+
+
+def folded_variant(grain=None):
+    """Snapshot key tag for folded frames, so changing the grain rebuilds the snapshot"""
+    grain = grain or configured_grain()
+    return f"{schema_variant()}-folded-counts-{'|'.join(grain)}"
+
+
+def fold_tsv(path, grain=None, chunksize=None, progress=None):
+    """Stream a TSV and return its measures summed at `grain` (see sales_aggregates.summarize).
+
+    Grain columns missing from the file are skipped. Rows with a missing key
+    are kept (dropna=False) so overall totals match a full read. `progress`,
+    if given, is called with the fraction of the file consumed after each chunk.
+    """
+    grain = grain or configured_grain()
+    chunksize = chunksize or configured_chunksize()
+
+    header = pd.read_csv(path, sep='\t', nrows=0).columns
+    grain = [col for col in grain if col in header]
+    measures = [col for col in MEASURE_COLUMNS if col in header]
+    text_dtypes = {col: str for col in TEXT_COLUMNS if col in grain}
+
+    total_bytes = max(os.path.getsize(path), 1)
+    partials = []
+    rows_read = 0
+    start = time.perf_counter()
+
+    with open(path, 'rb') as f:
+        for chunk in pd.read_csv(f, sep='\t', usecols=grain + measures, dtype=text_dtypes, chunksize=chunksize):
+            rows_read += len(chunk)
+            partials.append(summarize(chunk, grain))
+            if len(partials) > COMBINE_CHUNKS:
+                # The first partial is the aggregate of everything combined so far
+                partials = [summarize(pd.concat(partials, ignore_index=True), grain)]
+            if progress is not None:
+                progress(min(f.tell() / total_bytes, 1.0))
+
+    if not partials:
+        folded = pd.DataFrame(columns=grain + measures + [count_column(col) for col in measures])
+    else:
+        folded = partials[0] if len(partials) == 1 else summarize(pd.concat(partials, ignore_index=True), grain)
+
+    print(f"Folded {rows_read:,} rows into {len(folded):,} aggregate rows "
+          f"in {time.perf_counter() - start:.2f}s")
+    return folded
+
+
+def fold_frame(frame, grain=None):
+    """Sum an in-memory schema-typed frame at the configured grain, like fold_tsv does per chunk"""
+    return summarize(frame, [col for col in (grain or configured_grain()) if col in frame.columns])
+
+
+def read_folded_tsv(path, progress=None):
+    """Streaming counterpart of sales_schema.read_sales_tsv.
+
+    Item codes are read as text; apply_sales_schema turns them into integers
+    when they are all whole numbers, as a full read would.
+    """
+    return apply_sales_schema(fold_tsv(path, progress=progress))
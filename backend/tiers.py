@@ -0,0 +1,176 @@
+"""Threshold tiers that label values in bulk (growth categories, efficiency levels, ...).
+
+A tier table is an ordered list of tiers. Each tier has a label and bounds
+on the value: min (>=), max (<=), above (>) and below (<), any of them
+optional. A value gets the first tier whose bounds it meets, and a table
+ends with a tier without bounds, which takes every value left, NaN
+included. This matches the if/elif chains the tables replace. Tiers may
+carry extra fields, such as a chart color, which are looked up the same
+way.
+
+classify labels a whole array at once, with one vectorized comparison
+per bound, and returns a Categorical whose categories are the table's
+labels in table order. tier_of labels a single value.
+
+The default tables below can be overridden or extended per deployment,
+without code changes, by a JSON file of {name: [tier, ...]} named in
+SALES_TIERS_FILE.
+"""
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+BOUNDS = {'min': np.greater_equal, 'max': np.less_equal, 'above': np.greater, 'below': np.less}
+
+TIERS = {
+    # app_stable
+    'contribution_category': [
+        {'label': 'Major Contributor', 'min': 30},
+        {'label': 'Moderate Contributor', 'min': 10},
+        {'label': 'Minor Contributor'}
+    ],
+    'performance_tier': [
+        {'label': 'Star Performer', 'max': 3},
+        {'label': 'Strong Performer', 'max': 6},
+        {'label': 'Good Performer'}
+    ],
+    'efficiency_level': [
+        {'label': 'High Efficiency', 'min': 25},
+        {'label': 'Moderate Efficiency', 'min': 15},
+        {'label': 'Low Efficiency', 'min': 5},
+        {'label': 'Very Low Efficiency'}
+    ],
+    'growth_category': [
+        {'label': 'Strong Growth', 'min': 10},
+        {'label': 'Moderate Growth', 'min': 5},
+        {'label': 'Slight Growth', 'min': 0},
+        {'label': 'Slight Decline', 'min': -5},
+        {'label': 'Moderate Decline', 'min': -10},
+        {'label': 'Strong Decline'}
+    ],
+    'turnover_rating': [
+        {'label': 'High Turnover', 'min': 50000},
+        {'label': 'Moderate Turnover', 'min': 20000},
+        {'label': 'Low Turnover', 'min': 5000},
+        {'label': 'Very Low Turnover'}
+    ],
+    'partnership_tier': [
+        {'label': 'Strategic Partner', 'min': 15},
+        {'label': 'Key Partner', 'min': 8},
+        {'label': 'Important Partner', 'min': 3},
+        {'label': 'Regular Partner', 'min': 1},
+        {'label': 'Minor Partner'}
+    ],
+    'logistics_performance': [
+        {'label': 'High Transfer Focus', 'min': 50},
+        {'label': 'Moderate Transfer Focus', 'min': 30},
+        {'label': 'Balanced Distribution', 'min': 15},
+        {'label': 'Sales Focus', 'min': 5},
+        {'label': 'Minimal Transfers'}
+    ],
+    # Seasonal index of the month (100 = a typical month); no index yet counts as average
+    'seasonal_performance': [
+        {'label': 'Peak Season', 'min': 110},
+        {'label': 'Low Season', 'below': 90},
+        {'label': 'Average Season'}
+    ],
+    # app_new
+    'transfer_efficiency_category': [
+        {'label': 'No Transfers', 'min': 0, 'max': 0},
+        {'label': 'Efficient (0.8-1.2)', 'min': 0.8, 'max': 1.2},
+        {'label': 'High Sales/Low Transfers', 'above': 1.2},
+        {'label': 'Low Sales/High Transfers'}
+    ],
+    'item_share_category': [
+        {'label': 'Major Contributor', 'min': 10},
+        {'label': 'Moderate Contributor', 'min': 5},
+        {'label': 'Minor Contributor'}
+    ],
+    'growth_trend_category': [
+        {'label': 'High Growth', 'above': 10},
+        {'label': 'Moderate Growth', 'min': 5, 'max': 10},
+        {'label': 'Stable', 'min': -5, 'below': 5},
+        {'label': 'Moderate Decline', 'min': -10, 'below': -5},
+        {'label': 'Significant Decline'}
+    ],
+    'turnover_performance': [
+        {'label': 'Excellent', 'min': 5.0, 'color': '#4CAF50'},
+        {'label': 'Good', 'min': 3.0, 'color': '#8BC34A'},
+        {'label': 'Average', 'min': 1.5, 'color': '#FFC107'},
+        {'label': 'Poor', 'min': 0.5, 'color': '#FF9800'},
+        {'label': 'Critical', 'color': '#F44336'}
+    ],
+    'supplier_category': [
+        {'label': 'Major Partner', 'min': 20, 'color': '#1976D2'},
+        {'label': 'Key Partner', 'min': 10, 'color': '#2196F3'},
+        {'label': 'Important Partner', 'min': 5, 'color': '#4CAF50'},
+        {'label': 'Regular Partner', 'min': 1, 'color': '#FF9800'},
+        {'label': 'Minor Partner', 'color': '#9E9E9E'}
+    ],
+    'logistics_category': [
+        {'label': 'Critical Logistics', 'max': 3, 'color': '#F44336'},
+        {'label': 'High Priority', 'max': 7, 'color': '#FF9800'},
+        {'label': 'Regular Transfer', 'max': 12, 'color': '#FFC107'},
+        {'label': 'Low Priority', 'color': '#4CAF50'}
+    ]
+}
+
+
+def validate_table(name, table):
+    """Raise ValueError unless table is a list of labelled tiers ending with an unbounded one"""
+    if not isinstance(table, list) or not table:
+        raise ValueError(f"Tier table '{name}' must be a non-empty list of tiers")
+    for tier in table:
+        if not isinstance(tier, dict) or 'label' not in tier:
+            raise ValueError(f"Every tier of '{name}' needs a label")
+        for bound in BOUNDS:
+            if bound in tier and not isinstance(tier[bound], (int, float)):
+                raise ValueError(f"Bound '{bound}' of '{name}' tier '{tier['label']}' must be a number")
+    if any(bound in table[-1] for bound in BOUNDS):
+        raise ValueError(f"The last tier of '{name}' must have no bounds, to take every value left")
+
+
+def load_tiers(path=None):
+    """The default tables, overridden by the JSON file at path if given"""
+    tables = dict(TIERS)
+    if path:
+        with open(path) as f:
+            overrides = json.load(f)
+        if not isinstance(overrides, dict):
+            raise ValueError(f'{path} must hold a JSON object of tier tables')
+        tables.update(overrides)
+        print(f"Loaded tier tables {', '.join(sorted(overrides))} from {path}")
+    for name, table in tables.items():
+        validate_table(name, table)
+    return tables
+
+
+tier_tables = load_tiers(os.environ.get('SALES_TIERS_FILE'))
+
+
+def classify(values, name, field='label'):
+    """field of the tier of each value under table name, as a Categorical (a Series for a Series)"""
+    table = tier_tables[name]
+    array = np.asarray(values, dtype='float64')
+    matched = np.zeros(array.shape, dtype=bool)
+    tier_index = np.full(array.shape, len(table) - 1)
+    with np.errstate(invalid='ignore'):
+        for position, tier in enumerate(table[:-1]):
+            meets = ~matched
+            for bound, compare in BOUNDS.items():
+                if bound in tier:
+                    meets &= compare(array, tier[bound])
+            tier_index[meets] = position
+            matched |= meets
+
+    categories = list(dict.fromkeys(tier[field] for tier in table))
+    codes = np.array([categories.index(tier[field]) for tier in table])[tier_index]
+    labels = pd.Categorical.from_codes(codes, categories=categories)
+    return pd.Series(labels, index=values.index) if isinstance(values, pd.Series) else labels
+
+
+def tier_of(value, name, field='label'):
+    """field of the tier of a single value"""
+    return classify([value], name, field)[0]
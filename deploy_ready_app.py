@@ -7,6 +7,12 @@ from datetime import datetime
 import traceback
 import sys
 
+# Shared ingest helpers live in the backend directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+from excel_ingest import read_sales_xlsx, xlsx_variant
+from sales_schema import apply_sales_schema, memory_mb
+from snapshot_cache import load_table
+
 app = Flask(__name__)
 CORS(app)
 
@@ -62,8 +68,11 @@ def load_data():
                 log_message(f"✅ Found data file at: {path}")
                 
                 # Try different read methods based on file extension
+                read_started = datetime.now()
+                ingest_info = None
                 if path.endswith('.xlsx'):
-                    df = pd.read_excel(path)
+                    # Streamed read-only, converted once per workbook version and cached as a snapshot
+                    df, ingest_info = load_table(path, reader=read_sales_xlsx, variant=xlsx_variant())
                 elif path.endswith('.csv'):
                     df = pd.read_csv(path)
                 elif path.endswith('.tsv'):
@@ -75,7 +84,12 @@ def load_data():
                     except:
                         df = pd.read_csv(path)
                 
-                log_message(f"✅ Data loaded successfully! Shape: {df.shape}")
+                df = apply_sales_schema(df)
+                if ingest_info is None:
+                    ingest_info = {'method': 'read_csv', 'path': path}
+                ingest_info['seconds'] = round((datetime.now() - read_started).total_seconds(), 3)
+                log_message(f"✅ Data loaded successfully! Shape: {df.shape} "
+                            f"({ingest_info['method']}, {ingest_info['seconds']:.2f}s)")
                 log_message(f"✅ Columns: {list(df.columns)}")
                 
                 # Store comprehensive data info
@@ -83,8 +97,9 @@ def load_data():
                     'file_path': path,
                     'shape': df.shape,
                     'columns': list(df.columns),
-                    'memory_usage_mb': round(df.memory_usage(deep=True).sum() / 1024 / 1024, 2),
+                    'memory_usage_mb': memory_mb(df),
                     'dtypes': {col: str(dtype) for col, dtype in df.dtypes.items()},
+                    'ingest': ingest_info,
                     'null_counts': df.isnull().sum().to_dict(),
                     'loaded_at': datetime.now().isoformat()
                 }
@@ -1,4 +1,4 @@
-from flask import Flask, render_template_string, jsonify
+from flask import Flask, render_template_string, jsonify, request
 from flask_cors import CORS
 import pandas as pd
 import json
@@ -6,6 +6,14 @@ import logging
 import os
 import sys
 
+# Shared ingest helpers live in the backend directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+from result_cache import VersionedLRUCache
+from sales_dataset import source_version
+from sales_schema import apply_sales_schema, memory_mb, schema_variant
+from scatter_sample import sample_points
+from shared_frame import load_shared_frame, shared_enabled, shared_key
+
 app = Flask(__name__)
 CORS(app)
 
@@ -17,6 +25,13 @@ logger = logging.getLogger(__name__)
 df_global = None
 data_loaded = False
 load_errors = []
+# Fingerprint of the loaded data; cached results are keyed by it
+data_version = None
+
+# Scatter plots send at most this many points unless ?max_points= asks otherwise
+DEFAULT_SCATTER_POINTS = int(os.environ.get('SCATTER_MAX_POINTS', 5000))
+MAX_SCATTER_POINTS = 50000
+scatter_cache = VersionedLRUCache(int(os.environ.get('SCATTER_CACHE_SIZE', 16)))
 
 def log_message(message):
     """Print and store log messages"""
@@ -26,7 +41,7 @@ def log_message(message):
 
 def load_data():
     """Load the sales data from your actual files"""
-    global df_global, data_loaded, load_errors
+    global df_global, data_loaded, load_errors, data_version
     
     if df_global is not None:
         return df_global
@@ -47,17 +62,25 @@ def load_data():
         try:
             log_message(f"Trying to load: {path}")
             
-            # Try reading as CSV with tab separator (your data appears to be tab-separated)
-            df = pd.read_csv(path, sep='\t', encoding='utf-8')
+            if shared_enabled():
+                # Map the frame shared by all gunicorn workers, preparing it if this worker is first
+                df, method = load_shared_frame(
+                    shared_key(path, source_version(path), schema_variant()),
+                    lambda: apply_sales_schema(pd.read_csv(path, sep='\t', encoding='utf-8')))
+                log_message(f"Shared memory-mapped frame {method} for {path}")
+            else:
+                # Try reading as CSV with tab separator (your data appears to be tab-separated)
+                df = apply_sales_schema(pd.read_csv(path, sep='\t', encoding='utf-8'))
             
             if len(df) > 0:
-                log_message(f"✅ Successfully loaded {len(df)} records from {path}")
+                log_message(f"✅ Successfully loaded {len(df)} records from {path} ({memory_mb(df)} MB)")
                 log_message(f"Columns: {list(df.columns)}")
                 log_message(f"Data shape: {df.shape}")
                 
                 # Store the data
                 df_global = df
                 data_loaded = True
+                data_version = source_version(path)
                 return df_global
                 
         except Exception as e:
@@ -67,7 +90,8 @@ def load_data():
     
     # If no data loaded, create sample data
     log_message("⚠️ No data files found, creating sample data")
-    df_global = create_sample_data()
+    df_global = apply_sales_schema(create_sample_data())
+    data_version = 'sample'
     return df_global
 
 def create_sample_data():
@@ -436,7 +460,7 @@ def item_type_distribution():
         if df is None or len(df) == 0:
             return jsonify({'error': 'No data available'})
         
-        item_distribution = df.groupby('ITEM TYPE')['RETAIL SALES'].sum()
+        item_distribution = df.groupby('ITEM TYPE', observed=True)['RETAIL SALES'].sum()
         
         return jsonify({
             'data': [{
@@ -461,7 +485,7 @@ def top_suppliers():
         if df is None or len(df) == 0:
             return jsonify({'error': 'No data available'})
         
-        top_suppliers = df.groupby('SUPPLIER')['RETAIL SALES'].sum().nlargest(10)
+        top_suppliers = df.groupby('SUPPLIER', observed=True)['RETAIL SALES'].sum().nlargest(10)
         
         return jsonify({
             'data': [{
@@ -550,7 +574,7 @@ def supplier_performance():
         if df is None or len(df) == 0:
             return jsonify({'error': 'No data available'})
         
-        supplier_perf = df.groupby('SUPPLIER').agg({
+        supplier_perf = df.groupby('SUPPLIER', observed=True).agg({
             'RETAIL SALES': 'sum',
             'WAREHOUSE SALES': 'sum'
         }).head(10)
@@ -612,29 +636,77 @@ def seasonal_analysis():
         log_message(f"Error in seasonal_analysis: {str(e)}")
         return jsonify({'error': str(e)})
 
+def max_points_arg():
+    """?max_points= as an int; raises ValueError for bad values"""
+    try:
+        max_points = int(request.args.get('max_points', DEFAULT_SCATTER_POINTS))
+    except ValueError:
+        raise ValueError("'max_points' must be an integer")
+    if not 1 <= max_points <= MAX_SCATTER_POINTS:
+        raise ValueError(f"'max_points' must be between 1 and {MAX_SCATTER_POINTS}")
+    return max_points
+
 @app.route('/api/sales_vs_transfers')
 def sales_vs_transfers():
+    """Retail sales against transfers, one point per row up to ?max_points=.
+
+    Larger data is downsampled to a stratified sample that keeps its
+    outliers (see scatter_sample), drawn as a second trace.
+    """
+    try:
+        max_points = max_points_arg()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
         df = load_data()
         if df is None or len(df) == 0:
             return jsonify({'error': 'No data available'})
         
-        return jsonify({
-            'data': [{
-                'x': df['RETAIL SALES'].tolist(),
-                'y': df['RETAIL TRANSFERS'].tolist(),
+        cached = scatter_cache.get(data_version, ('sales_vs_transfers', max_points))
+        if cached is not None:
+            return jsonify(cached)
+        
+        x = df['RETAIL SALES'].to_numpy(dtype='float64', na_value=float('nan'))
+        y = df['RETAIL TRANSFERS'].to_numpy(dtype='float64', na_value=float('nan'))
+        positions, weights, outliers = sample_points(x, y, max_points)
+        data = [{
+            'x': x[positions].tolist(),
+            'y': y[positions].tolist(),
+            'customdata': weights.round(1).tolist(),
+            'hovertemplate': 'Sales: %{x:,.2f}<br>Transfers: %{y:,.2f}<br>Represents ~%{customdata} rows<extra></extra>',
+            'mode': 'markers',
+            'type': 'scatter',
+            'name': 'Sales vs Transfers',
+            'marker': {'color': '#d62728', 'size': 8}
+        }]
+        if len(outliers):
+            data.append({
+                'x': x[outliers].tolist(),
+                'y': y[outliers].tolist(),
                 'mode': 'markers',
                 'type': 'scatter',
-                'name': 'Sales vs Transfers',
-                'marker': {'color': '#d62728', 'size': 8}
-            }],
+                'name': 'Outliers',
+                'marker': {'color': '#7f7f7f', 'size': 8, 'symbol': 'diamond'}
+            })
+        
+        result = {
+            'data': data,
             'layout': {
                 'title': 'Retail Sales vs Transfers Correlation',
                 'xaxis': {'title': 'Retail Sales ($)'},
                 'yaxis': {'title': 'Retail Transfers'},
                 'showlegend': False
+            },
+            'sampling': {
+                'total_points': len(df),
+                'returned_points': len(positions) + len(outliers),
+                'outliers': len(outliers),
+                'max_points': max_points,
+                'sampled': bool(len(outliers) or (weights > 1).any())
             }
-        })
+        }
+        scatter_cache.put(data_version, ('sales_vs_transfers', max_points), result)
+        return jsonify(result)
     except Exception as e:
         log_message(f"Error in sales_vs_transfers: {str(e)}")
         return jsonify({'error': str(e)})
@@ -647,7 +719,7 @@ def item_type_trends():
             return jsonify({'error': 'No data available'})
         
         df['YEAR_MONTH'] = df['YEAR'].astype(str) + '-' + df['MONTH'].astype(str).str.zfill(2)
-        trends = df.groupby(['YEAR_MONTH', 'ITEM TYPE'])['RETAIL SALES'].sum().unstack(fill_value=0)
+        trends = df.groupby(['YEAR_MONTH', 'ITEM TYPE'], observed=True)['RETAIL SALES'].sum().unstack(fill_value=0)
         
         data = []
         for item_type in trends.columns:
@@ -1,10 +1,17 @@
-from flask import Flask, render_template_string, jsonify
+from flask import Flask, render_template_string, jsonify, request
 from flask_cors import CORS
 import pyodbc
+import numpy as np
 import pandas as pd
 import json
 import logging
 import os
+import sys
+
+# Shared helpers live in the backend directory
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'backend'))
+from response_cache import cached_response
+from result_cache import VersionedLRUCache
 
 app = Flask(__name__)
 CORS(app)
@@ -86,18 +93,102 @@ def get_sample_data():
 
 # Global data variable
 df_global = None
+# Bumped on every load, so results computed from older data are never served
+data_version = 0
+# Serialized /api responses per data version (see backend/response_cache.py)
+response_cache = VersionedLRUCache(int(os.getenv('RESPONSE_CACHE_SIZE', 1024)),
+                                   int(os.getenv('RESPONSE_CACHE_MB', 64)) << 20)
+cached = cached_response(response_cache, lambda: data_version)
 
 def load_data():
     """Load data from SQL Server or use sample data"""
-    global df_global
+    global df_global, data_version
     if df_global is None:
         logger.info("Loading data...")
         df_global = get_data_from_sql()
         if df_global is None:
             logger.warning("SQL Server connection failed, using sample data")
             df_global = get_sample_data()
+        data_version += 1
+        histogram_cache.clear()
+        response_cache.retain(data_version)
     return df_global
 
+# Histogram binning: distributions are binned here and sent as bin counts,
+# so the payload stays the same size however many rows are loaded
+BIN_STRATEGIES = ('fixed', 'quantile', 'fd')
+DEFAULT_BINS = 30
+MAX_BINS = 200
+# Largest row count for which raw values may still be requested (?raw=1)
+RAW_VALUES_LIMIT = int(os.getenv('RAW_VALUES_LIMIT', 5000))
+
+# (data version, column, strategy, bins) -> (edges, counts)
+histogram_cache = {}
+
+def bin_edges(values, strategy, bins):
+    """Bin edges of values: 'fixed' equal-width bins, 'quantile' equal-count bins
+    or 'fd' (Freedman-Diaconis) bins whose width follows the spread of the data"""
+    if strategy == 'quantile':
+        edges = np.unique(np.quantile(values, np.linspace(0, 1, bins + 1)))
+        # A single distinct value leaves one edge; fall back to one fixed bin around it
+        return edges if len(edges) > 1 else np.histogram_bin_edges(values, bins=1)
+    if strategy == 'fd':
+        bins = fd_bin_count(values, bins)
+    return np.histogram_bin_edges(values, bins=bins)
+
+def fd_bin_count(values, fallback):
+    """Number of Freedman-Diaconis bins (width 2 IQR n^(-1/3)) over the range of values, at most MAX_BINS.
+    
+    Counted before any edges are built: on long-tailed data the width is tiny
+    against the range and the uncapped count would not fit in memory. Data
+    without an interquartile range gets the fallback count.
+    """
+    q1, q3 = np.percentile(values, [25, 75])
+    width = 2 * (q3 - q1) * len(values) ** (-1 / 3)
+    if width <= 0:
+        return fallback
+    return int(min(max(np.ceil((values.max() - values.min()) / width), 1), MAX_BINS))
+
+def histogram(df, column, strategy, bins):
+    """(edges, counts) of a column, cached per data version"""
+    key = (data_version, column, strategy, bins)
+    if key not in histogram_cache:
+        values = pd.to_numeric(df[column], errors='coerce').dropna().to_numpy(dtype='float64')
+        if len(values) == 0:
+            edges, counts = np.array([]), np.array([], dtype=np.int64)
+        else:
+            edges = bin_edges(values, strategy, bins)
+            counts, edges = np.histogram(values, bins=edges)
+        histogram_cache[key] = (edges, counts)
+    return histogram_cache[key]
+
+def histogram_args():
+    """(strategy, bins, raw) from the request; raises ValueError for bad values"""
+    strategy = request.args.get('strategy', 'fixed').strip().lower()
+    if strategy not in BIN_STRATEGIES:
+        raise ValueError(f"Unknown binning strategy '{strategy}': use one of {', '.join(BIN_STRATEGIES)}")
+    try:
+        bins = int(request.args.get('bins', DEFAULT_BINS))
+    except ValueError:
+        raise ValueError("'bins' must be an integer")
+    if not 1 <= bins <= MAX_BINS:
+        raise ValueError(f"'bins' must be between 1 and {MAX_BINS}")
+    raw = request.args.get('raw', '').lower() in ('1', 'true', 'yes')
+    return strategy, bins, raw
+
+def histogram_trace(edges, counts, name, color):
+    """Plotly bar trace drawing binned counts as a histogram"""
+    return {
+        'x': ((edges[:-1] + edges[1:]) / 2).tolist(),
+        'y': counts.tolist(),
+        'width': np.diff(edges).tolist(),
+        'customdata': np.column_stack([edges[:-1], edges[1:]]).tolist(),
+        'hovertemplate': '%{customdata[0]:,.2f} - %{customdata[1]:,.2f}<br>Count: %{y}<extra></extra>',
+        'type': 'bar',
+        'name': name,
+        'marker': {'color': color}
+    }
+
 # HTML Templates
 HOME_TEMPLATE = """
 <!DOCTYPE html>
@@ -338,6 +429,7 @@ def strategic():
 
 # API Endpoints for charts
 @app.route('/api/total_trade_quantity')
+@cached
 def total_trade_quantity():
     try:
         df = load_data()
@@ -366,6 +458,7 @@ def total_trade_quantity():
         return jsonify({'error': str(e)})
 
 @app.route('/api/average_close_price')
+@cached
 def average_close_price():
     try:
         df = load_data()
@@ -394,6 +487,7 @@ def average_close_price():
         return jsonify({'error': str(e)})
 
 @app.route('/api/total_delivery_quantity')
+@cached
 def total_delivery_quantity():
     try:
         df = load_data()
@@ -422,6 +516,7 @@ def total_delivery_quantity():
         return jsonify({'error': str(e)})
 
 @app.route('/api/total_turnover')
+@cached
 def total_turnover():
     try:
         df = load_data()
@@ -450,6 +545,7 @@ def total_turnover():
         return jsonify({'error': str(e)})
 
 @app.route('/api/average_peak_value')
+@cached
 def average_peak_value():
     try:
         df = load_data()
@@ -478,6 +574,7 @@ def average_peak_value():
         return jsonify({'error': str(e)})
 
 @app.route('/api/monthly_records_count')
+@cached
 def monthly_records_count():
     try:
         df = load_data()
@@ -507,24 +604,53 @@ def monthly_records_count():
 
 # Strategic Dashboard APIs
 @app.route('/api/peak_value_distribution')
+@cached
 def peak_value_distribution():
+    """Peak value histogram, binned server side.
+
+    ?strategy=fixed|quantile|fd picks the binning (default fixed) and
+    ?bins=N the bin count for fixed and quantile bins. ?raw=1 returns the
+    values themselves for the browser to bin, while the data has at most
+    RAW_VALUES_LIMIT rows.
+    """
+    try:
+        strategy, bins, raw = histogram_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     try:
         df = load_data()
         if df is None or len(df) == 0:
             return jsonify({'error': 'No data available'})
         
+        layout = {
+            'title': 'Peak Value Distribution',
+            'xaxis': {'title': 'Peak Value'},
+            'yaxis': {'title': 'Frequency'},
+            'showlegend': False
+        }
+        if raw:
+            if len(df) > RAW_VALUES_LIMIT:
+                return jsonify({'error': f'Raw values are only available for up to {RAW_VALUES_LIMIT:,} rows; '
+                                         f'{len(df):,} are loaded'}), 400
+            return jsonify({
+                'data': [{
+                    'x': df['peak_value'].tolist(),
+                    'type': 'histogram',
+                    'name': 'Peak Value Distribution',
+                    'marker': {'color': '#1f77b4'}
+                }],
+                'layout': layout
+            })
+        
+        edges, counts = histogram(df, 'peak_value', strategy, bins)
         return jsonify({
-            'data': [{
-                'x': df['peak_value'].tolist(),
-                'type': 'histogram',
-                'name': 'Peak Value Distribution',
-                'marker': {'color': '#1f77b4'}
-            }],
-            'layout': {
-                'title': 'Peak Value Distribution',
-                'xaxis': {'title': 'Peak Value'},
-                'yaxis': {'title': 'Frequency'},
-                'showlegend': False
+            'data': [histogram_trace(edges, counts, 'Peak Value Distribution', '#1f77b4')],
+            'layout': dict(layout, bargap=0),
+            'bins': {
+                'strategy': strategy,
+                'edges': edges.tolist(),
+                'counts': counts.tolist(),
+                'total': int(counts.sum())
             }
         })
     except Exception as e:
@@ -532,6 +658,7 @@ def peak_value_distribution():
         return jsonify({'error': str(e)})
 
 @app.route('/api/delivery_percentage_trend')
+@cached
 def delivery_percentage_trend():
     try:
         df = load_data()
@@ -562,6 +689,7 @@ def delivery_percentage_trend():
         return jsonify({'error': str(e)})
 
 @app.route('/api/symbol_performance')
+@cached
 def symbol_performance():
     try:
         df = load_data()
@@ -591,6 +719,7 @@ def symbol_performance():
         return jsonify({'error': str(e)})
 
 @app.route('/api/monthly_turnover_trend')
+@cached
 def monthly_turnover_trend():
     try:
         df = load_data()
@@ -620,6 +749,7 @@ def monthly_turnover_trend():
         return jsonify({'error': str(e)})
 
 @app.route('/api/price_volatility')
+@cached
 def price_volatility():
     try:
         df = load_data()
@@ -647,6 +777,10 @@ def price_volatility():
         logger.error(f"Error in price_volatility: {str(e)}")
         return jsonify({'error': str(e)})
 
+@app.route('/api/cache_stats')
+def cache_stats():
+    return jsonify({'version': data_version, 'responses': response_cache.stats()})
+
 if __name__ == '__main__':
     logger.info("Starting Sales Dashboard SQL Server Version...")
     app.run(debug=True, host='0.0.0.0', port=5000)
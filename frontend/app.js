@@ -23,9 +23,22 @@ function calculateChange(current, previous) {
     return ((current - previous) / previous * 100);
 }
 
+// Every KPI on this page, fetched together in one request (see /api/batch)
+const DASHBOARD_ENDPOINTS = [
+    'overall_sales_performance', 'sales_mix', 'top_selling_items', 'kpi_data', 'sales_by_item_type',
+    'sales_transfer_ratio', 'month_over_month_growth', 'inventory_turnover_rate', 'sales_per_supplier',
+    'top_items_by_transfers', 'sales_seasonality'
+];
+const dashboardData = fetch('http://127.0.0.1:5000/api/batch?endpoints=' + DASHBOARD_ENDPOINTS.join(','))
+    .then(response => response.json());
+
+// Data of one KPI from the batch; an error for the whole batch is passed on as that KPI's error
+function fetchKpi(endpoint) {
+    return dashboardData.then(batch => batch.results ? batch.results[endpoint] : batch);
+}
+
 // Fetch and display Overall Sales Performance
-fetch('http://127.0.0.1:5000/api/overall_sales_performance')
-    .then(response => response.json())
+fetchKpi('overall_sales_performance')
     .then(data => {
         // Update the grand total KPI card
         document.getElementById('grand-total').textContent = formatCurrency(data.grand_total);
@@ -99,8 +112,7 @@ fetch('http://127.0.0.1:5000/api/overall_sales_performance')
     });
 
 // Fetch and display Sales Mix pie chart
-fetch('http://127.0.0.1:5000/api/sales_mix')
-    .then(response => response.json())
+fetchKpi('sales_mix')
     .then(data => {
         // Create professional color palette for pie chart
         const colors = [
@@ -181,8 +193,7 @@ fetch('http://127.0.0.1:5000/api/sales_mix')
     });
 
 // Fetch and display Top 10 Selling Items
-fetch('http://127.0.0.1:5000/api/top_selling_items')
-    .then(response => response.json())
+fetchKpi('top_selling_items')
     .then(data => {
         console.log('Top selling items data:', data);
         
@@ -275,8 +286,7 @@ fetch('http://127.0.0.1:5000/api/top_selling_items')
     });
 
 // Fetch and display KPI data
-fetch('http://127.0.0.1:5000/api/kpi_data')
-    .then(response => response.json())
+fetchKpi('kpi_data')
     .then(data => {
         // Update KPI cards
         const currentRetail = data.current_month.values[0];
@@ -369,8 +379,7 @@ fetch('http://127.0.0.1:5000/api/kpi_data')
     });
 
 // Fetch and display sales by item type with stacked bar chart
-fetch('http://127.0.0.1:5000/api/sales_by_item_type')
-    .then(response => response.json())
+fetchKpi('sales_by_item_type')
     .then(data => {
         // Create stacked bar chart traces for each sales component
         const retailSalesTrace = {
@@ -474,8 +483,7 @@ fetch('http://127.0.0.1:5000/api/sales_by_item_type')
     });
 
 // Fetch and display sales transfer ratio
-fetch('http://127.0.0.1:5000/api/sales_transfer_ratio')
-    .then(response => response.json())
+fetchKpi('sales_transfer_ratio')
     .then(data => {
         if (data.error) {
             console.error('Error:', data.error);
@@ -564,8 +572,7 @@ fetch('http://127.0.0.1:5000/api/sales_transfer_ratio')
     });
 
 // Fetch and display Month-over-Month Sales Growth
-fetch('http://127.0.0.1:5000/api/month_over_month_growth')
-    .then(response => response.json())
+fetchKpi('month_over_month_growth')
     .then(data => {
         if (data.error) {
             console.error('Error:', data.error);
@@ -715,8 +722,7 @@ fetch('http://127.0.0.1:5000/api/month_over_month_growth')
     });
 
 // Fetch and display Inventory Turnover Rate
-fetch('http://127.0.0.1:5000/api/inventory_turnover_rate')
-    .then(response => response.json())
+fetchKpi('inventory_turnover_rate')
     .then(data => {
         if (data.error) {
             console.error('Error:', data.error);
@@ -813,8 +819,7 @@ fetch('http://127.0.0.1:5000/api/inventory_turnover_rate')
     });
 
 // Fetch and display Sales per Supplier
-fetch('http://127.0.0.1:5000/api/sales_per_supplier')
-    .then(response => response.json())
+fetchKpi('sales_per_supplier')
     .then(data => {
         if (data.error) {
             console.error('Error:', data.error);
@@ -925,8 +930,7 @@ fetch('http://127.0.0.1:5000/api/sales_per_supplier')
 // Fetch and display Top Items by Retail Transfers
 function loadTopItemsByTransfers() {
     console.log('Starting to fetch Top Items by Retail Transfers...');
-    fetch('http://127.0.0.1:5000/api/top_items_by_transfers')
-        .then(response => response.json())
+    fetchKpi('top_items_by_transfers')
         .then(data => {
             console.log('Received transfers data:', data);
             if (data.error) {
@@ -1037,8 +1041,7 @@ setTimeout(loadTopItemsByTransfers, 2000);
 // Fetch and display Sales Seasonality
 function loadSalesSeasonality() {
     console.log('Starting to fetch Sales Seasonality...');
-    fetch('http://127.0.0.1:5000/api/sales_seasonality')
-        .then(response => response.json())
+    fetchKpi('sales_seasonality')
         .then(data => {
             console.log('Received seasonality data:', data);
             if (data.error) {
@@ -1153,7 +1156,7 @@ function loadSalesSeasonality() {
 
             const layout = {
                 title: {
-                    text: `Peak: ${data.peak_month} ($${data.peak_value.toLocaleString()}) | Valley: ${data.valley_month} ($${data.valley_value.toLocaleString()}) | Current Trend: ${data.trend} | YoY Growth: ${data.year_over_year_growth.toFixed(1)}%`,
+                    text: `Peak: ${data.peak_month} ($${data.peak_value.toLocaleString()}) | Valley: ${data.valley_month} ($${data.valley_value.toLocaleString()}) | Current Trend: ${data.trend} | YoY Growth: ${data.year_over_year_growth === null ? 'n/a' : data.year_over_year_growth.toFixed(1) + '%'}`,
                     font: { size: 12, color: '#333' }
                 },
                 xaxis: {
@@ -22,11 +22,20 @@ const chartConfig = {
     }
 };
 
-// Utility function to create charts
-async function createChart(endpoint, chartId, chartFunction) {
+// Fetch several KPIs in one request (see /api/batch); resolves to their data by endpoint name
+async function fetchBatch(endpoints) {
+    const response = await fetch(`${API_BASE}/batch?endpoints=${endpoints.join(',')}`);
+    const batch = await response.json();
+    if (batch.error) {
+        throw new Error(batch.error);
+    }
+    return batch.results;
+}
+
+// Utility function to create charts from the page's batch
+async function createChart(batch, endpoint, chartId, chartFunction) {
     try {
-        const response = await fetch(`${API_BASE}/${endpoint}`);
-        const data = await response.json();
+        const data = (await batch)[endpoint];
         
         if (data.error) {
             document.getElementById(chartId).innerHTML = `<div class="error">Error: ${data.error}</div>`;
@@ -226,13 +235,14 @@ function createTopSellingItems(data, chartId) {
 
 // Initialize all charts when page loads
 document.addEventListener('DOMContentLoaded', function() {
-    // Load all operational KPIs using existing endpoints
-    createChart('overall_sales_performance', 'overallSalesPerformance', createOverallSalesPerformance);
-    createChart('month_over_month_growth', 'monthOverMonthGrowth', createMonthOverMonthGrowth);
-    createChart('sales_transfer_ratio', 'salesTransferRatio', createSalesTransferRatio);
-    createChart('inventory_turnover_rate', 'inventoryTurnover', createInventoryTurnover);
-    createChart('top_items_by_transfers', 'topItemsByRetailTransfers', createTopItemsByRetailTransfers);
-    createChart('top_selling_items', 'topSellingItems', createTopSellingItems);
+    // Load all operational KPIs in one batch request
+    const batch = fetchBatch(['overall_sales_performance', 'month_over_month_growth', 'sales_transfer_ratio', 'inventory_turnover_rate', 'top_items_by_transfers', 'top_selling_items']);
+    createChart(batch, 'overall_sales_performance', 'overallSalesPerformance', createOverallSalesPerformance);
+    createChart(batch, 'month_over_month_growth', 'monthOverMonthGrowth', createMonthOverMonthGrowth);
+    createChart(batch, 'sales_transfer_ratio', 'salesTransferRatio', createSalesTransferRatio);
+    createChart(batch, 'inventory_turnover_rate', 'inventoryTurnover', createInventoryTurnover);
+    createChart(batch, 'top_items_by_transfers', 'topItemsByRetailTransfers', createTopItemsByRetailTransfers);
+    createChart(batch, 'top_selling_items', 'topSellingItems', createTopSellingItems);
 });
 
 // Add loading indicators
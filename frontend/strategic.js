@@ -15,11 +15,20 @@ const chartConfig = {
     }
 };
 
-// Utility function to create charts
-async function createChart(endpoint, chartId, chartFunction) {
+// Fetch several KPIs in one request (see /api/batch); resolves to their data by endpoint name
+async function fetchBatch(endpoints) {
+    const response = await fetch(`${API_BASE}/batch?endpoints=${endpoints.join(',')}`);
+    const batch = await response.json();
+    if (batch.error) {
+        throw new Error(batch.error);
+    }
+    return batch.results;
+}
+
+// Utility function to create charts from the page's batch
+async function createChart(batch, endpoint, chartId, chartFunction) {
     try {
-        const response = await fetch(`${API_BASE}/${endpoint}`);
-        const data = await response.json();
+        const data = (await batch)[endpoint];
         
         if (data.error) {
             document.getElementById(chartId).innerHTML = `<div class="error">Error: ${data.error}</div>`;
@@ -240,12 +249,13 @@ function createKpiData(data, chartId) {
 
 // Initialize all charts when page loads
 document.addEventListener('DOMContentLoaded', function() {
-    // Load all strategic KPIs using existing endpoints
-    createChart('sales_per_supplier', 'salesPerSupplier', createSalesPerSupplier);
-    createChart('sales_seasonality', 'salesSeasonality', createSalesSeasonality);
-    createChart('sales_mix', 'salesMix', createSalesMix);
-    createChart('sales_by_item_type', 'salesByItemType', createSalesByItemType);
-    createChart('kpi_data', 'kpiData', createKpiData);
+    // Load all strategic KPIs in one batch request
+    const batch = fetchBatch(['sales_per_supplier', 'sales_seasonality', 'sales_mix', 'sales_by_item_type', 'kpi_data']);
+    createChart(batch, 'sales_per_supplier', 'salesPerSupplier', createSalesPerSupplier);
+    createChart(batch, 'sales_seasonality', 'salesSeasonality', createSalesSeasonality);
+    createChart(batch, 'sales_mix', 'salesMix', createSalesMix);
+    createChart(batch, 'sales_by_item_type', 'salesByItemType', createSalesByItemType);
+    createChart(batch, 'kpi_data', 'kpiData', createKpiData);
 });
 
 // Add loading indicators